@@ -0,0 +1,91 @@
+"""
+Cache of Gemini responses to identical prompts.
+
+Users often repeat a request, e.g. clicking "enhance" again on the same text or regenerating a
+summary for the same applicant. Responses are stored in the 'ai_responses' cache under the model
+name and a hash of the whitespace-normalised prompt, for the time AI_RESPONSE_CACHE_TTLS allows
+for the calling feature. Hits and misses are counted per feature.
+"""
+import logging
+import re
+from django.conf import settings
+from django.core.cache import caches
+from .utils import compute_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Stands in for a Gemini response; callers only read its text."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _cache():
+    return caches['ai_responses']
+
+
+def _response_key(feature, model_name, prompt):
+    normalized = re.sub(r'\s+', ' ', str(prompt)).strip()
+    return f'response:{feature}:{model_name}:{compute_content_hash(normalized)}'
+
+
+def _count(feature, outcome):
+    key = f'stats:{feature}:{outcome}'
+    try:
+        cache = _cache()
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        logger.debug(f"Could not count AI response cache {outcome} for {feature}: {e}")
+
+
+def get_cached_response(feature, model_name, prompt):
+    """Returns a CachedResponse for an identical earlier prompt, or None."""
+    try:
+        text = _cache().get(_response_key(feature, model_name, prompt))
+    except Exception as e:
+        # An unreachable cache only costs the Gemini call
+        logger.warning(f"AI response cache lookup failed: {e}")
+        text = None
+    _count(feature, 'hits' if text is not None else 'misses')
+    return CachedResponse(text) if text is not None else None
+
+
+def cache_response(feature, model_name, prompt, response):
+    """Stores a response's text for the feature's TTL. Empty responses are not cached."""
+    try:
+        text = response.text
+    except Exception:
+        # Blocked responses have no text
+        return
+    if not isinstance(text, str) or not text.strip():
+        return
+    try:
+        _cache().set(_response_key(feature, model_name, prompt), text, timeout=settings.AI_RESPONSE_CACHE_TTLS[feature])
+    except Exception as e:
+        logger.warning(f"Could not cache AI response for {feature}: {e}")
+
+
+def forget_response(feature, model_name, prompt):
+    """Removes a cached response, e.g. one the caller couldn't use."""
+    try:
+        _cache().delete(_response_key(feature, model_name, prompt))
+    except Exception as e:
+        logger.warning(f"Could not remove cached AI response for {feature}: {e}")
+
+
+def get_cache_stats():
+    """Returns {feature: {'hits': n, 'misses': n}} for every cached feature."""
+    stats = {}
+    for feature in settings.AI_RESPONSE_CACHE_TTLS:
+        try:
+            counts = _cache().get_many([f'stats:{feature}:hits', f'stats:{feature}:misses'])
+        except Exception:
+            counts = {}
+        stats[feature] = {
+            'hits': counts.get(f'stats:{feature}:hits', 0),
+            'misses': counts.get(f'stats:{feature}:misses', 0),
+        }
+    return stats
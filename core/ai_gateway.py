@@ -0,0 +1,196 @@
+"""
+Shared access to the Gemini API for every AI feature.
+
+genai.configure() discards the library's cached service clients, so configuring it on every
+call opened a new gRPC channel (and TLS connection) per request. Here the library is configured
+once per process and API key, and GenerativeModel instances are cached per model name, so all
+calls share one pooled channel. Retries, backoff and per-call timeouts are also applied the
+same way for every caller, every call takes its quota from the cluster-wide rate limiter, and
+calls fail fast while the shared circuit breaker is open. Callers can opt in to reusing the
+response to an identical prompt (see core.ai_cache).
+"""
+from threading import Lock
+import logging
+import time
+import google.generativeai as genai
+from django.conf import settings
+from . import ai_cache, rate_limiter
+from .circuit_breaker import gemini_breaker
+
+logger = logging.getLogger(__name__)
+
+_lock = Lock()
+_configured_api_key = None
+_models = {}
+
+# Per-minute quotas refill within a minute, so that is how long to back off after ResourceExhausted
+QUOTA_EXHAUSTED_RETRY_SECONDS = 60
+
+
+class GeminiRateLimited(Exception):
+    """
+    Raised when the Gemini quota is used up for longer than GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS.
+    Celery tasks re-queue themselves with a countdown of `retry_after` seconds instead of
+    sleeping in the worker.
+    """
+
+    reason = "Gemini quota exhausted"
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"{self.reason}; retry in {self.retry_after}s")
+
+
+class GeminiUnavailable(GeminiRateLimited):
+    """
+    Raised without calling the API while the circuit breaker is open. It subclasses
+    GeminiRateLimited so Celery tasks re-queue until the circuit lets calls through again.
+    """
+    reason = "Gemini circuit is open"
+
+
+def _retriable_exceptions():
+    try:
+        from google.api_core.exceptions import DeadlineExceeded, ServiceUnavailable
+        return (DeadlineExceeded, ServiceUnavailable)
+    except ImportError:  # Fallback if google api core is unavailable
+        logger.debug("google.api_core.exceptions not available; using generic exception handling for Gemini retries.")
+        return tuple()
+
+
+def _quota_exceptions():
+    try:
+        from google.api_core.exceptions import ResourceExhausted
+        return (ResourceExhausted,)
+    except ImportError:
+        return tuple()
+
+
+def _model_name(model):
+    name = getattr(model, 'model_name', None)
+    return name if isinstance(name, str) else settings.GEMINI_MODEL
+
+
+def _wait_for_quota(model_name, tokens):
+    """Takes quota for one call, sleeping only for short waits; raises GeminiRateLimited otherwise."""
+    max_wait = settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS
+    waited = 0.0
+    while True:
+        wait = rate_limiter.acquire(model_name, tokens)
+        if not wait:
+            return
+        if waited + wait > max_wait:
+            raise GeminiRateLimited(wait)
+        time.sleep(wait)
+        waited += wait
+
+
+def _record_usage(model_name, response, estimated_tokens):
+    usage = getattr(response, 'usage_metadata', None)
+    total_tokens = getattr(usage, 'total_token_count', None)
+    if isinstance(total_tokens, int):
+        # The estimate only covered the prompt; charge the response and any underestimate too
+        rate_limiter.record_tokens(model_name, total_tokens - estimated_tokens)
+
+
+def get_gemini_model(model_name: str = None):
+    """
+    Returns the process-wide GenerativeModel for `model_name` (GEMINI_MODEL by default),
+    or None if Gemini is disabled or no API key is configured.
+    """
+    global _configured_api_key
+    if not settings.USE_GEMINI:
+        return None
+    api_key = settings.GOOGLE_AI_API_KEY
+    if not api_key:
+        logger.error("GOOGLE_AI_API_KEY not found.")
+        return None
+
+    model_name = model_name or settings.GEMINI_MODEL
+    with _lock:
+        try:
+            if api_key != _configured_api_key:
+                genai.configure(api_key=api_key)
+                _configured_api_key = api_key
+                _models.clear()
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = genai.GenerativeModel(model_name)
+            return model
+        except Exception as e:
+            logger.error(f"Failed to initialize Gemini model {model_name}: {e}")
+            return None
+
+
+def reset_gemini_clients():
+    """Forgets the configured client and cached models, e.g. after the API key changed."""
+    global _configured_api_key
+    with _lock:
+        _configured_api_key = None
+        _models.clear()
+
+
+def forget_cached_response(model, prompt, cache_as):
+    """Drops a response cached by call_gemini_with_retry(..., cache_as=...) that turned out unusable."""
+    ai_cache.forget_response(cache_as, _model_name(model), prompt)
+
+
+def call_gemini_with_retry(model, prompt, max_retries=None, base_delay=None, timeout_seconds=None, cache_as=None):
+    """
+    Calls the Gemini API with retries, exponential backoff and a timeout on every attempt,
+    so a hung request can't block a worker. Returns the response, or None once all attempts failed.
+    Raises GeminiRateLimited instead of sleeping when the quota is exhausted, either by the
+    cluster-wide rate limiter or by the API itself (ResourceExhausted), and GeminiUnavailable
+    while the circuit breaker is open. Every attempt's outcome is reported to the breaker.
+
+    Args:
+        model: The Gemini model instance
+        prompt: The prompt to send
+        max_retries: Maximum number of attempts (default: GEMINI_MAX_RETRIES)
+        base_delay: Base delay in seconds for exponential backoff (default: GEMINI_RETRY_BASE_DELAY)
+        timeout_seconds: Timeout for each attempt in seconds (default: GEMINI_TIMEOUT_SECONDS)
+        cache_as: Feature name from AI_RESPONSE_CACHE_TTLS; an identical earlier prompt to the same
+            model is then answered from the response cache, even while the circuit is open
+    """
+    max_retries = max_retries or settings.GEMINI_MAX_RETRIES
+    base_delay = settings.GEMINI_RETRY_BASE_DELAY if base_delay is None else base_delay
+    timeout_seconds = timeout_seconds or settings.GEMINI_TIMEOUT_SECONDS
+    retriable_exceptions = _retriable_exceptions()
+    quota_exceptions = _quota_exceptions()
+    model_name = _model_name(model)
+    if cache_as:
+        cached = ai_cache.get_cached_response(cache_as, model_name, prompt)
+        if cached:
+            return cached
+    estimated_tokens = rate_limiter.estimate_tokens(prompt)
+
+    for attempt in range(max_retries):
+        retry_in = gemini_breaker.allow_request()
+        if retry_in:
+            raise GeminiUnavailable(retry_in)
+        _wait_for_quota(model_name, estimated_tokens)
+        started = time.monotonic()
+        try:
+            response = model.generate_content(prompt, request_options={"timeout": timeout_seconds})
+            gemini_breaker.record_success(time.monotonic() - started)
+            _record_usage(model_name, response, estimated_tokens)
+            if cache_as:
+                ai_cache.cache_response(cache_as, model_name, prompt, response)
+            return response
+        except Exception as e:
+            if quota_exceptions and isinstance(e, quota_exceptions):
+                # Something outside the limiter used the quota; retrying right away would only thrash
+                logger.warning("Gemini API quota exhausted on attempt %s/%s: %s", attempt + 1, max_retries, e)
+                raise GeminiRateLimited(QUOTA_EXHAUSTED_RETRY_SECONDS) from e
+            gemini_breaker.record_failure()
+            if retriable_exceptions and isinstance(e, retriable_exceptions):
+                logger.warning("Gemini API timeout/unavailable error on attempt %s/%s: %s", attempt + 1, max_retries, e)
+            else:
+                logger.warning("Gemini API call failed on attempt %s/%s. Error: %s", attempt + 1, max_retries, e)
+
+        # Backoff before retrying if we have attempts left
+        if attempt < max_retries - 1:
+            time.sleep(base_delay * (2 ** attempt))
+
+    logger.error("Max retries reached. Gemini API call failed.")
+    return None
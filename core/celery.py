@@ -1,6 +1,7 @@
 # The monkey_patch call has been removed from here and is now handled conditionally in core/__init__.py
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_ready
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -19,3 +20,17 @@ app = Celery(
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_process_init.connect
+@worker_ready.connect
+def warm_up_pdf_renderer(**kwargs):
+    """
+    Preloads the PDF templates, stylesheets and fonts when a worker starts, so the first
+    render doesn't pay for them. worker_process_init fires in each prefork child;
+    worker_ready covers the solo and threads pools, which render in the main process.
+    """
+    if not getattr(settings, 'PDF_RENDER_PRELOAD', False):
+        return
+    from resumes.rendering import warm_up_renderer
+    warm_up_renderer()
+
@@ -0,0 +1,165 @@
+"""
+Circuit breaker for the Gemini API, shared by every web and worker process.
+
+When Gemini is down or slow, each call would otherwise spend its full retry budget inside a
+request worker. After GEMINI_BREAKER_FAILURE_THRESHOLD consecutive failures (a call slower than
+GEMINI_BREAKER_LATENCY_SLO_SECONDS counts as one) the circuit opens and calls fail immediately,
+so features fall back to local results. Once GEMINI_BREAKER_RESET_SECONDS have passed it is
+half-open: a single probe call is let through, and its outcome closes or re-opens the circuit.
+
+The state is kept in Redis (see core.redis_state); each process keeps its own state while
+Redis is unreachable.
+"""
+from threading import Lock
+import time
+from django.conf import settings
+from .redis_state import get_redis, mark_redis_unavailable
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _LocalState:
+    """Per-process circuit state, used while Redis is unavailable."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probe_until = 0.0
+
+
+class CircuitBreaker:
+    """A named circuit; see the module docstring for its states."""
+
+    def __init__(self, name):
+        self.name = name
+        self._key = f'circuit:{name}'
+        self._probe_key = f'circuit:{name}:probe'
+        self._local = _LocalState()
+
+    def _redis_call(self, operation):
+        """Runs operation(client) on the shared Redis client; returns None when Redis can't be used."""
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            return operation(client)
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None
+
+    @staticmethod
+    def _probe_seconds():
+        # A probe holds its slot for one attempt; the slot expires if the prober dies
+        return int(settings.GEMINI_TIMEOUT_SECONDS) + 5
+
+    def _read(self):
+        """Returns (failures, opened_until) from Redis, or None."""
+        def read(client):
+            failures, opened_until = client.hmget(self._key, 'failures', 'opened_until')
+            return int(failures or 0), float(opened_until or 0)
+        return self._redis_call(read)
+
+    def allow_request(self):
+        """
+        Returns 0 if a call may go ahead, otherwise the seconds until the circuit lets a probe through.
+        In the half-open state only the caller that claims the probe slot is allowed.
+        """
+        now = time.time()
+        shared = self._read()
+        if shared is not None:
+            opened_until = shared[1]
+            if not opened_until:
+                return 0
+            if now < opened_until:
+                return opened_until - now
+            claimed = self._redis_call(lambda client: client.set(self._probe_key, 1, nx=True, ex=self._probe_seconds()))
+            if claimed is not None:
+                return 0 if claimed else self._probe_seconds()
+
+        local = self._local
+        with local.lock:
+            if not local.opened_until:
+                return 0
+            if now < local.opened_until:
+                return local.opened_until - now
+            if now < local.probe_until:
+                return local.probe_until - now
+            local.probe_until = now + self._probe_seconds()
+            return 0
+
+    def record_success(self, latency=0.0):
+        """Records a completed call; one slower than the latency SLO counts as a failure."""
+        if latency > settings.GEMINI_BREAKER_LATENCY_SLO_SECONDS:
+            self.record_failure()
+            return
+        if self._redis_call(lambda client: client.delete(self._key, self._probe_key)) is None:
+            with self._local.lock:
+                self._local.failures = 0
+                self._local.opened_until = self._local.probe_until = 0.0
+
+    def record_failure(self):
+        """Records a failed call, opening the circuit once the failure threshold is reached."""
+        now = time.time()
+        threshold = settings.GEMINI_BREAKER_FAILURE_THRESHOLD
+        opened_until = now + settings.GEMINI_BREAKER_RESET_SECONDS
+
+        def record(client):
+            # Failures are consecutive within a few reset periods; older ones are forgotten
+            pipe = client.pipeline()
+            pipe.hincrby(self._key, 'failures', 1)
+            pipe.expire(self._key, max(300, settings.GEMINI_BREAKER_RESET_SECONDS * 4))
+            failures = pipe.execute()[0]
+            if failures >= threshold:
+                # Also re-opens a half-open circuit whose probe failed
+                client.hset(self._key, 'opened_until', opened_until)
+                client.delete(self._probe_key)
+            return failures
+
+        if self._redis_call(record) is None:
+            local = self._local
+            with local.lock:
+                local.failures += 1
+                if local.failures >= threshold:
+                    local.opened_until = opened_until
+                    local.probe_until = 0.0
+
+    def is_open(self):
+        """True while calls are being refused (a half-open circuit waiting for its probe is not open)."""
+        return self.get_state()['state'] == OPEN
+
+    def get_state(self):
+        """Returns the circuit's state for monitoring."""
+        now = time.time()
+        shared = self._read()
+        if shared is None:
+            with self._local.lock:
+                failures, opened_until = self._local.failures, self._local.opened_until
+        else:
+            failures, opened_until = shared
+
+        if not opened_until:
+            state = CLOSED
+        elif now < opened_until:
+            state = OPEN
+        else:
+            state = HALF_OPEN
+        return {
+            'name': self.name,
+            'state': state,
+            'consecutive_failures': failures,
+            'retry_in_seconds': max(0, int(opened_until - now + 0.999)) if state == OPEN else 0,
+            'shared': shared is not None,
+        }
+
+    def reset(self):
+        """Closes the circuit and forgets recorded failures."""
+        self._redis_call(lambda client: client.delete(self._key, self._probe_key))
+        with self._local.lock:
+            self._local.failures = 0
+            self._local.opened_until = self._local.probe_until = 0.0
+
+
+gemini_breaker = CircuitBreaker('gemini')
@@ -0,0 +1,155 @@
+"""
+Cluster-wide token buckets for Gemini requests and tokens per minute.
+
+Every web and worker process calls Gemini independently, so a per-process limit can't keep the
+cluster under the API quota. Each model gets two buckets (requests and tokens) stored in Redis
+and updated by a Lua script, so a check-and-consume is atomic across processes and uses the
+Redis server's clock. While Redis is unreachable, each process falls back to its own in-memory
+buckets rather than failing the call.
+"""
+from threading import Lock
+import time
+from django.conf import settings
+from .redis_state import get_redis, mark_redis_unavailable, reset_redis
+
+# Buckets refill continuously at capacity/60 per second and start full.
+# KEYS: request bucket, token bucket
+# ARGV: requests per minute, tokens per minute, requests to take, tokens to take, force (1 = take without waiting)
+# Returns the seconds to wait before the requested amounts are available ("0" once they were taken).
+_ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local requests, tokens, force = tonumber(ARGV[3]), tonumber(ARGV[4]), ARGV[5] == '1'
+
+local function level(key, capacity)
+    local state = redis.call('HMGET', key, 'level', 'updated')
+    local current = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    return math.min(capacity, current + math.max(0, now - updated) * capacity / 60)
+end
+
+local request_level = rpm > 0 and level(KEYS[1], rpm) or 0
+local token_level = tpm > 0 and level(KEYS[2], tpm) or 0
+local wait = 0
+if not force then
+    if rpm > 0 and request_level < requests then
+        wait = (requests - request_level) * 60 / rpm
+    end
+    -- A prompt larger than the whole bucket only waits for a full bucket
+    local needed = math.min(tokens, tpm)
+    if tpm > 0 and token_level < needed then
+        wait = math.max(wait, (needed - token_level) * 60 / tpm)
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+end
+
+if rpm > 0 then
+    redis.call('HSET', KEYS[1], 'level', request_level - requests, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], 120)
+end
+if tpm > 0 then
+    redis.call('HSET', KEYS[2], 'level', token_level - tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[2], 120)
+end
+return '0'
+"""
+
+
+class _LocalBuckets:
+    """In-process equivalent of _ACQUIRE_SCRIPT, used while Redis is unavailable."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._levels = {}
+
+    def acquire(self, key, rpm, tpm, requests, tokens, force=False):
+        with self._lock:
+            now = time.monotonic()
+            request_level = self._level((key, 'requests'), rpm, now)
+            token_level = self._level((key, 'tokens'), tpm, now)
+            if not force:
+                wait = 0.0
+                if rpm > 0 and request_level < requests:
+                    wait = (requests - request_level) * 60 / rpm
+                needed = min(tokens, tpm)
+                if tpm > 0 and token_level < needed:
+                    wait = max(wait, (needed - token_level) * 60 / tpm)
+                if wait > 0:
+                    return wait
+            if rpm > 0:
+                self._levels[(key, 'requests')] = (request_level - requests, now)
+            if tpm > 0:
+                self._levels[(key, 'tokens')] = (token_level - tokens, now)
+            return 0.0
+
+    def _level(self, bucket, capacity, now):
+        if capacity <= 0:
+            return 0.0
+        current, updated = self._levels.get(bucket, (capacity, now))
+        return min(capacity, current + (now - updated) * capacity / 60)
+
+    def clear(self):
+        with self._lock:
+            self._levels.clear()
+
+
+_local_buckets = _LocalBuckets()
+# (client, acquire script registered on it)
+_registered_script = None
+
+
+def _get_redis_script():
+    """Returns the acquire script registered on the shared Redis client, or None without Redis."""
+    global _registered_script
+    client = get_redis()
+    if client is None:
+        return None
+    if _registered_script is None or _registered_script[0] is not client:
+        _registered_script = (client, client.register_script(_ACQUIRE_SCRIPT))
+    return _registered_script[1]
+
+
+def _acquire(model_name, requests, tokens, force=False):
+    rpm = settings.GEMINI_REQUESTS_PER_MINUTE
+    tpm = settings.GEMINI_TOKENS_PER_MINUTE
+    if rpm <= 0 and tpm <= 0:
+        return 0.0
+
+    script = _get_redis_script()
+    if script is not None:
+        keys = [f'gemini-rate:{model_name}:requests', f'gemini-rate:{model_name}:tokens']
+        try:
+            return float(script(keys=keys, args=[rpm, tpm, requests, tokens, int(force)]))
+        except Exception as e:
+            mark_redis_unavailable(e)
+    return _local_buckets.acquire(model_name, rpm, tpm, requests, tokens, force)
+
+
+def estimate_tokens(prompt):
+    """Rough token count of a prompt (about four characters per token)."""
+    return len(str(prompt)) // 4 + 1
+
+
+def acquire(model_name, tokens):
+    """
+    Takes one request and `tokens` tokens from the model's buckets if they are available.
+    Returns 0 when they were taken, otherwise the seconds until they will be (nothing is taken).
+    """
+    return _acquire(model_name, 1, tokens)
+
+
+def record_tokens(model_name, tokens):
+    """Charges tokens used beyond the estimate, e.g. the response, without waiting for quota."""
+    if tokens > 0:
+        _acquire(model_name, 0, tokens, force=True)
+
+
+def reset_rate_limiter():
+    """Forgets the Redis connection and in-memory buckets, e.g. after settings changed."""
+    global _registered_script
+    reset_redis()
+    _registered_script = None
+    _local_buckets.clear()
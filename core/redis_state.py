@@ -0,0 +1,51 @@
+"""
+Redis connection for state that every web and worker process must share, such as the Gemini
+rate limits and circuit breaker. Callers fall back to per-process state whenever get_redis()
+returns None; after a connection error Redis is skipped for a while instead of adding a
+timeout to every call.
+"""
+from threading import Lock
+import logging
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds to keep using per-process state after Redis failed, before trying it again
+REDIS_RETRY_SECONDS = 30
+
+_lock = Lock()
+_client = None
+_retry_at = 0.0
+
+
+def get_redis():
+    """Returns the shared Redis client, or None while Redis is unconfigured or unreachable."""
+    global _client
+    url = settings.GEMINI_RATE_LIMIT_REDIS_URL
+    if not url or time.monotonic() < _retry_at:
+        return None
+    with _lock:
+        if _client is None:
+            try:
+                import redis
+            except ImportError:
+                logger.warning("redis is not installed; Gemini limits and circuit state apply per process.")
+                return None
+            _client = redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return _client
+
+
+def mark_redis_unavailable(error):
+    """Switches callers to per-process state for REDIS_RETRY_SECONDS after a Redis error."""
+    global _retry_at
+    logger.warning(f"Can't reach Redis for shared AI state, using per-process state for {REDIS_RETRY_SECONDS}s: {error}")
+    _retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+def reset_redis():
+    """Forgets the client and any recorded outage, e.g. after settings changed."""
+    global _client, _retry_at
+    with _lock:
+        _client = None
+        _retry_at = 0.0
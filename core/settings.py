@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 import logging.config
+from celery.schedules import crontab
 
 # Load environment variables from .env file
 load_dotenv()
@@ -159,12 +160,81 @@ USE_GEMINI = os.getenv('USE_GEMINI', 'True').lower() in ('true', '1', 't')
 # The specific model to use for Gemini API calls.
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'models/gemini-2.5-flash')
 
+# Defaults for every Gemini call made through core.ai_gateway; callers may pass their own.
+# The timeout applies to each attempt, so a hung request can't block a worker.
+GEMINI_TIMEOUT_SECONDS = int(os.getenv('GEMINI_TIMEOUT_SECONDS', '60'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '1'))
+# Cluster-wide quota per model, enforced by core.rate_limiter before every Gemini call (0 disables a limit).
+# The buckets, like the circuit breaker state below, live in Redis so all web and worker processes
+# share them; each process falls back to its own in-memory state while Redis is unreachable.
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv('GEMINI_TOKENS_PER_MINUTE', '250000'))
+_broker_url = os.getenv('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
+GEMINI_RATE_LIMIT_REDIS_URL = os.getenv(
+    'GEMINI_RATE_LIMIT_REDIS_URL', _broker_url if _broker_url.startswith(('redis://', 'rediss://')) else ''
+)
+# A call waits in-process for at most this long for quota; beyond that it raises GeminiRateLimited
+# and Celery tasks re-queue themselves with a countdown, up to GEMINI_RATE_LIMIT_MAX_REQUEUES times.
+GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv('GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS', '2'))
+GEMINI_RATE_LIMIT_MAX_REQUEUES = int(os.getenv('GEMINI_RATE_LIMIT_MAX_REQUEUES', '20'))
+# The circuit breaker opens after this many consecutive failed calls, where a call slower than the
+# latency SLO counts as a failure. While open, Gemini calls fail fast and features use local
+# fallbacks; after the reset timeout a single probe call decides whether it closes again.
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('GEMINI_BREAKER_FAILURE_THRESHOLD', '5'))
+GEMINI_BREAKER_LATENCY_SLO_SECONDS = float(os.getenv('GEMINI_BREAKER_LATENCY_SLO_SECONDS', '20'))
+GEMINI_BREAKER_RESET_SECONDS = int(os.getenv('GEMINI_BREAKER_RESET_SECONDS', '30'))
+# Seconds that responses to an identical prompt are reused from the 'ai_responses' cache, per feature.
+# Parsing and scoring results are not listed here; they have their own database caches.
+AI_RESPONSE_CACHE_TTLS = {
+    'job_description': 24 * 60 * 60,
+    'applicant_summary': 24 * 60 * 60,
+    'enhance_text': 60 * 60,
+}
+
 # --- Job Features Settings ---
 # A central switch to enable or disable job-related features.
 # When False (default): Shows "Coming Soon" banner and blocks all job feature access
 # When True: Removes "Coming Soon" banner and enables full job feature access
 JOBS_FEATURE_ENABLED = os.getenv('JOBS_FEATURE_ENABLED', 'False').lower() in ('true', '1', 't')
 
+# --- Job Matching Settings ---
+# Number of resumes scored against one job in a single Gemini request by the batched matcher.
+MATCH_SCORE_BATCH_SIZE = int(os.getenv('MATCH_SCORE_BATCH_SIZE', '15'))
+# Maximum number of batches one drain task processes before handing off to a fresh task.
+MATCH_SCORE_MAX_BATCHES_PER_RUN = int(os.getenv('MATCH_SCORE_MAX_BATCHES_PER_RUN', '20'))
+# Only this many of the best locally pre-scored resumes per job are sent to Gemini for scoring.
+MATCH_SCORE_AI_TOP_K = int(os.getenv('MATCH_SCORE_AI_TOP_K', '50'))
+# Seconds a resume must go without edits before its AI score and match scores are recalculated.
+RESUME_RESCORE_DEBOUNCE_SECONDS = int(os.getenv('RESUME_RESCORE_DEBOUNCE_SECONDS', '15'))
+
+# --- Resume PDF Settings ---
+# A pending or processing PDF generation older than this is treated as abandoned and no longer
+# reused for identical download requests.
+PDF_GENERATION_STALE_SECONDS = int(os.getenv('PDF_GENERATION_STALE_SECONDS', '600'))
+# Retention of generated PDFs, applied daily by cleanup_pdf_generations_task and the
+# cleanup_pdf_generations management command. Completed PDFs beyond the newest few per resume
+# and template, or older than the maximum age, are deleted along with failed generations.
+PDF_RETENTION_KEEP_PER_TEMPLATE = int(os.getenv('PDF_RETENTION_KEEP_PER_TEMPLATE', '2'))
+PDF_RETENTION_MAX_AGE_DAYS = int(os.getenv('PDF_RETENTION_MAX_AGE_DAYS', '30'))
+PDF_RETENTION_FAILED_HOURS = int(os.getenv('PDF_RETENTION_FAILED_HOURS', '24'))
+PDF_RETENTION_BATCH_SIZE = int(os.getenv('PDF_RETENTION_BATCH_SIZE', '500'))
+
+# --- Resume Upload Settings ---
+# Largest resume file accepted for upload and parsing.
+RESUME_UPLOAD_MAX_BYTES = int(os.getenv('RESUME_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+# Only the first pages of longer PDFs are read; resumes rarely run past a few pages.
+RESUME_PARSE_MAX_PAGES = int(os.getenv('RESUME_PARSE_MAX_PAGES', '10'))
+# Gemini parses of uploaded resumes are reused for identical re-uploads for this many days.
+# The least recently used parses beyond the maximum are evicted by cleanup_resume_parse_cache_task.
+RESUME_PARSE_CACHE_TTL_DAYS = int(os.getenv('RESUME_PARSE_CACHE_TTL_DAYS', '7'))
+RESUME_PARSE_CACHE_MAX_ENTRIES = int(os.getenv('RESUME_PARSE_CACHE_MAX_ENTRIES', '5000'))
+# Resume text longer than this is split by section and parsed in chunks of at most this size,
+# up to RESUME_PARSE_MAX_WORKERS Gemini calls at a time, each with a shorter timeout.
+RESUME_PARSE_CHUNK_CHARS = int(os.getenv('RESUME_PARSE_CHUNK_CHARS', '8000'))
+RESUME_PARSE_MAX_WORKERS = int(os.getenv('RESUME_PARSE_MAX_WORKERS', '4'))
+RESUME_PARSE_CHUNK_TIMEOUT_SECONDS = int(os.getenv('RESUME_PARSE_CHUNK_TIMEOUT_SECONDS', '30'))
+
 
 # --- LOGGING CONFIGURATION ---
 # Provides more detailed output in the console to help with debugging.
@@ -327,12 +397,49 @@ STATICFILES_DIRS = [
 # WhiteNoise configuration for serving static files
 # Using CompressedStaticFilesStorage instead of Manifest version for better compatibility
 # The Manifest version requires collectstatic to run successfully, which can fail in some environments
-if DEBUG:
-    # In development, use default storage
-    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
-else:
-    # In production, use WhiteNoise with compression (no manifest required)
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Generated resume PDFs. Kept separate from uploads so they can be stored privately.
+    'generated_pdfs': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Uploaded resumes waiting to be parsed. Only the stored name is sent to the Celery worker,
+    # so web and worker processes must share this storage (a common volume, or S3).
+    'resume_uploads': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        # In development use default storage; in production WhiteNoise with compression (no manifest required)
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedStaticFilesStorage'
+        ),
+    },
+}
+
+# Caches
+# 'ai_responses' holds Gemini responses reused by core.ai_cache. In memory, each process keeps at
+# most AI_RESPONSE_CACHE_MAX_ENTRIES and culls the least recently used ones; with
+# AI_RESPONSE_CACHE_URL set to a Redis URL all processes share it, and eviction follows the
+# Redis server's maxmemory-policy.
+AI_RESPONSE_CACHE_URL = os.getenv('AI_RESPONSE_CACHE_URL', '')
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ai_responses': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': AI_RESPONSE_CACHE_URL,
+        'KEY_PREFIX': 'ai-response',
+    } if AI_RESPONSE_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ai-responses',
+        'OPTIONS': {'MAX_ENTRIES': AI_RESPONSE_CACHE_MAX_ENTRIES},
+    },
+}
 
 # WhiteNoise additional configuration
 # Note: WhiteNoise serves files from STATIC_ROOT by default
@@ -604,7 +711,16 @@ if USE_S3:
     
     # Media files
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    STORAGES['default'] = {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'}
+    # Resumes contain personal details, so generated PDFs are private and only served through the app
+    STORAGES['generated_pdfs'] = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {'default_acl': 'private', 'querystring_auth': True, 'custom_domain': None},
+    }
+    STORAGES['resume_uploads'] = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {'default_acl': 'private', 'querystring_auth': True, 'custom_domain': None},
+    }
 
 
 # Celery Configuration
@@ -615,6 +731,29 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Periodic tasks, run by a separate `celery -A core beat` process
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-pdf-generations': {
+        'task': 'resumes.tasks.cleanup_pdf_generations_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'cleanup-resume-parse-cache': {
+        'task': 'resumes.tasks.cleanup_resume_parse_cache_task',
+        'schedule': crontab(hour=3, minute=45),
+    },
+}
+
+# Optional dedicated queue for PDF rendering. When set, generate_resume_pdf_task is routed to it
+# and must be consumed by a worker started with `-Q <queue>`, which keeps slow renders from
+# delaying AI tasks. Leave empty to render on the default queue.
+PDF_RENDER_QUEUE = os.getenv('PDF_RENDER_QUEUE', '')
+if PDF_RENDER_QUEUE:
+    CELERY_TASK_ROUTES = {
+        'resumes.tasks.generate_resume_pdf_task': {'queue': PDF_RENDER_QUEUE},
+    }
+# Preload PDF templates, stylesheets and fonts when a Celery worker process starts
+PDF_RENDER_PRELOAD = os.getenv('PDF_RENDER_PRELOAD', 'True').lower() in ('true', '1', 't')
+
 # Auto-configure pool based on platform
 # Celery Worker Pool Configuration
 # Note: Command-line -P flag overrides this setting
@@ -2,7 +2,13 @@
 Utility functions for the core app.
 """
 import os
+import re
+import html
+import hashlib
 import logging
+import bleach
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 
 logger = logging.getLogger(__name__)
 
@@ -71,3 +77,83 @@ def validate_oauth_config():
         result['github']['issues'].append('Client Secret is not set')
     
     return result
+
+
+def sanitize_text(text):
+    """
+    Strips HTML tags from user-submitted text, keeping the plain text.
+    Entities are decoded again so characters like '&' come back as typed.
+    """
+    if not isinstance(text, str):
+        return text
+    return html.unescape(bleach.clean(text, tags=[], attributes={}, strip=True)).strip()
+
+
+def compute_content_hash(*parts):
+    """
+    Returns a stable SHA-256 hex digest for the given text parts.
+    Used to detect whether AI inputs have changed since they were last processed.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or '').encode('utf-8'))
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+RANGE_HEADER_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _read_range(file, length):
+    try:
+        while length > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def ranged_file_response(request, file, filename, content_type='application/pdf', as_attachment=True):
+    """
+    Streams an open file in chunks instead of loading it into memory.
+    A single byte range in the Range header is answered with 206 Partial Content so
+    interrupted downloads can resume; other Range headers get the whole file.
+    """
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+
+    match = RANGE_HEADER_RE.match(request.headers.get('Range', '').strip())
+    if not match or not any(match.groups()):
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename, content_type=content_type)
+        response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file.seek(start)
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(file, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,70 @@
+"""
+Local stand-ins for the Gemini generators in matcher.py.
+
+They are used when a generator returns nothing, which is immediate while the Gemini circuit
+breaker is open. The results are built from the job and resume text alone, so they are simpler
+than the AI versions, but the page still gets something useful instead of an error.
+"""
+import re
+from .prescorer import match_required_skills, prescore_resumes
+
+STAR_ANSWER_GUIDE = (
+    "Answer with the STAR method: describe the Situation, the Task you were responsible for, "
+    "the Actions you took and the Result, using a concrete example from your resume."
+)
+
+
+def _split_terms(text):
+    """Splits a comma, semicolon or line separated list into unique, non-empty terms."""
+    terms = []
+    for term in re.split(r'[,;\n]+', text or ''):
+        term = term.strip(' -*•\t')
+        if term and term.lower() not in (existing.lower() for existing in terms):
+            terms.append(term)
+    return terms
+
+
+def local_job_description(job_title, keywords='', responsibilities='', experience_level='Mid-level'):
+    """Returns a plain job description and requirements in generate_job_description's format."""
+    skills = _split_terms(keywords)
+    duties = _split_terms(responsibilities)
+    experience_level = experience_level or 'Mid-level'
+
+    paragraphs = [f"We are looking for a {experience_level} {job_title} to join our team."]
+    if duties:
+        paragraphs.append("In this role you will:\n" + '\n'.join(f"- {duty}" for duty in duties))
+    if skills:
+        paragraphs.append(f"You will work with {', '.join(skills)} alongside a collaborative team.")
+
+    requirements = [f"- Experience appropriate for a {experience_level} {job_title} role"]
+    requirements += [f"- Hands-on experience with {skill}" for skill in skills]
+    requirements.append("- Strong communication and collaboration skills")
+    return {'description': '\n\n'.join(paragraphs), 'requirements': '\n'.join(requirements)}
+
+
+def local_applicant_summary(resume_text, job_text, job_details=None):
+    """Returns a short bullet summary of an applicant from the local pre-scorer."""
+    score = prescore_resumes(job_text, {0: resume_text}, job_details)[0]
+    found, missing = match_required_skills(resume_text, job_details)
+    bullets = [f"- Keyword match with the job: {score}/100"]
+    if found:
+        bullets.append(f"- Mentions required skills: {', '.join(found)}")
+    if missing:
+        bullets.append(f"- Required skills not found in the resume: {', '.join(missing)}")
+    if not found and not missing:
+        bullets.append("- The job's required skills haven't been analysed yet; review the resume directly")
+    return '\n'.join(bullets)
+
+
+def local_interview_prep(job_title, job_details=None):
+    """Returns common interview questions for the job in generate_interview_prep's format."""
+    skills = [skill for skill in (job_details or {}).get('required_skills') or [] if isinstance(skill, str)]
+    questions = [f"Walk me through a project you are proud of that is relevant to this {job_title} role."]
+    questions += [f"Tell me about a time you used {skill} to solve a real problem." for skill in skills[:2]]
+    questions += [
+        "Describe a situation where you had to learn something new quickly.",
+        "Tell me about a disagreement with a teammate and how you resolved it.",
+        "Describe a time you missed a deadline or made a mistake. What did you do next?",
+        f"What interests you about this {job_title} role, and what would you focus on first?",
+    ]
+    return {'questions': [{'question': question, 'answer': STAR_ANSWER_GUIDE} for question in questions[:5]]}
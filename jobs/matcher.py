@@ -1,9 +1,9 @@
 import os
-import google.generativeai as genai
 import logging
 import json
-import time
 import re
+# Module-level names kept so callers and tests can keep patching them here
+from core.ai_gateway import GeminiRateLimited, call_gemini_with_retry as _call_gemini_with_retry, forget_cached_response, get_gemini_model as _get_gemini_model
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO)
@@ -45,36 +45,6 @@ def sanitize_prompt_input(text: str) -> str:
 
 # --- Gemini API Functions ---
 
-def _get_gemini_model(model_name: str = 'models/gemini-2.5-flash'):
-    """Initializes and returns a Gemini model instance."""
-    try:
-        from django.conf import settings
-        api_key = settings.GOOGLE_AI_API_KEY
-        if not api_key:
-            logger.error("GOOGLE_AI_API_KEY not found for scoring.")
-            return None
-        
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel(model_name)
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini model: {e}")
-        return None
-
-def _call_gemini_with_retry(model, prompt, max_retries=3, base_delay=1):
-    """Calls the Gemini API with exponential backoff for retries."""
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            return response
-        except Exception as e:
-            logger.warning(f"Gemini API call failed on attempt {attempt + 1}/{max_retries}. Error: {e}")
-            if attempt < max_retries - 1:
-                # *** FIX: Corrected typo from 'i' to 'attempt' ***
-                time.sleep(base_delay * (2 ** attempt))
-            else:
-                logger.error("Max retries reached. Gemini API call failed.")
-                return None
-
 def _extract_job_details(job_text: str) -> dict:
     """Uses Gemini to parse a job description into a structured format."""
     model = _get_gemini_model()
@@ -104,10 +74,54 @@ def _extract_job_details(job_text: str) -> dict:
         
         json_string = response.text.strip().replace('```json', '').replace('```', '')
         return json.loads(json_string)
+    except GeminiRateLimited:
+        # Scoring tasks re-queue themselves; a failed extraction would be scored without details
+        raise
     except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Failed to extract job details with Gemini: {e}")
         return None
 
+def get_stored_job_details(job_posting) -> dict:
+    """
+    Returns the structured requirements stored on a JobPosting if they are still current,
+    without calling Gemini. Returns None when they are missing or out of date.
+    """
+    if job_posting.extracted_details and job_posting.extracted_details_hash == job_posting.get_content_hash():
+        return job_posting.extracted_details
+    return None
+
+def get_cached_job_details(job_posting) -> dict:
+    """
+    Returns the structured requirements for a JobPosting. Gemini is only called when the
+    posting's title/description/requirements have changed since the last extraction;
+    otherwise the details stored on the posting are reused for every resume.
+    """
+    stored_details = get_stored_job_details(job_posting)
+    if stored_details:
+        return stored_details
+
+    content_hash = job_posting.get_content_hash()
+    job_details = _extract_job_details(job_posting.get_match_text())
+    if not job_details:
+        # Don't cache failures so the next scoring attempt retries the extraction
+        return None
+
+    # Use a queryset update so the posting's updated_at (used for score staleness checks) is not bumped
+    type(job_posting).objects.filter(pk=job_posting.pk).update(
+        extracted_details=job_details,
+        extracted_details_hash=content_hash,
+    )
+    job_posting.extracted_details = job_details
+    job_posting.extracted_details_hash = content_hash
+    return job_details
+
+def _parse_score(score):
+    """Returns a JSON score as an int clamped to 0-99, or None if it isn't a number."""
+    # bool is an int subclass, but true/false aren't scores
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or score != score:
+        return None
+    return max(0, min(99, round(score)))
+
 def score_resume_with_gemini(resume_text: str, job_details: dict) -> int:
     """Calculates the match score using the Gemini API with structured data."""
     model = _get_gemini_model()
@@ -146,28 +160,99 @@ def score_resume_with_gemini(resume_text: str, job_details: dict) -> int:
         if match:
             json_string = match.group(0)
             data = json.loads(json_string)
-            score = data.get("score")
+            score = _parse_score(data.get("score"))
             
-            if isinstance(score, int):
-                return max(0, min(99, score))
+            if score is not None:
+                return score
         
         logger.warning(f"Gemini returned an unexpected format for score: {text_response}")
         return 0
+    except GeminiRateLimited:
+        raise
     except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Error scoring with Gemini: {e}")
         return 0
 
+def score_resumes_batch_with_gemini(resume_texts: dict, job_details: dict) -> dict:
+    """
+    Scores several resumes against one job's structured requirements in a single Gemini call.
+    Takes a mapping of resume id -> resume text and returns a mapping of resume id -> score.
+    Resumes the model did not return a valid score for are left out of the result.
+    """
+    model = _get_gemini_model()
+    if not model or not resume_texts:
+        return {}
+
+    # Keep each resume bounded so a full batch stays well inside the prompt limits
+    max_chars_per_resume = 8000
+    resume_sections = []
+    for resume_id, resume_text in resume_texts.items():
+        sanitized_resume_text = sanitize_prompt_input(resume_text)[:max_chars_per_resume]
+        resume_sections.append(f"--- RESUME {resume_id} ---\n{sanitized_resume_text}\n--- END RESUME {resume_id} ---")
+    resumes_block = "\n\n".join(resume_sections)
+
+    prompt = f"""
+    You are a very strict technical recruiter. Analyze EACH RESUME below independently against the same structured JOB REQUIREMENTS and produce a realistic match score from 0-100 for each one. Be very critical: a score of 95+ should be extremely rare.
+
+    **Scoring Guidelines:**
+      - **Experience (50%):** Compare the years of experience and job titles in the resume against the job requirements.
+      - **Required Skills (35%):** This is critical. Heavily penalize the score for each missing "required_skill".
+      - **Nice-to-Have Skills (15%):** Award bonus points for matching "nice_to_have_skills".
+
+    Do not compare the resumes with each other; score each one only against the job requirements.
+
+    --- JOB REQUIREMENTS ---
+    {json.dumps(job_details, indent=2)}
+    ---
+
+    {resumes_block}
+
+    CRITICAL: You MUST return ONLY a single raw JSON object with one key: "scores", mapping every RESUME ID above to its integer score. Example: {{"scores": {{"12": 78, "15": 41}}}}. Do not include any other text, markdown formatting, or explanatory comments.
+    """
+    try:
+        response = _call_gemini_with_retry(model, prompt)
+        if not response or not response.text:
+            return {}
+
+        text_response = response.text
+        match = re.search(r'\{.*\}', text_response, re.DOTALL)
+        if not match:
+            logger.warning(f"Gemini returned an unexpected format for batch scores: {text_response}")
+            return {}
+
+        data = json.loads(match.group(0))
+        raw_scores = data.get("scores")
+        if not isinstance(raw_scores, dict):
+            logger.warning(f"Gemini returned an unexpected format for batch scores: {text_response}")
+            return {}
+
+        requested_ids = {str(resume_id): resume_id for resume_id in resume_texts}
+        scores = {}
+        for key, score in raw_scores.items():
+            resume_id = requested_ids.get(str(key).strip())
+            score = _parse_score(score)
+            if resume_id is not None and score is not None:
+                scores[resume_id] = score
+        return scores
+    except GeminiRateLimited:
+        raise
+    except (json.JSONDecodeError, Exception) as e:
+        logger.error(f"Error batch scoring with Gemini: {e}")
+        return {}
+
 # --- Main Scorer Function ---
 
-def calculate_match_score(resume_text, job_description_text):
+def calculate_match_score(resume_text, job_description_text, job_details=None):
     """
     Primary function to calculate match score using a structured, two-step AI process.
+    Pass job_details (see get_cached_job_details) to skip the job analysis step.
     """
     if not resume_text or not job_description_text:
         return 0
         
-    # Step 1: Have the AI pre-analyze the job description.
-    job_details = _extract_job_details(job_description_text)
+    # Step 1: Have the AI pre-analyze the job description, unless the caller already has it.
+    if job_details is None:
+        job_details = _extract_job_details(job_description_text)
     if not job_details:
         logger.warning("Could not extract structured details from job description. Scoring may be less accurate.")
         # Fallback to a simpler prompt if extraction fails
@@ -229,7 +314,7 @@ def generate_job_description(job_title: str, keywords: str = "", responsibilitie
     """
 
     try:
-        response = _call_gemini_with_retry(model, prompt)
+        response = _call_gemini_with_retry(model, prompt, cache_as='job_description')
         if not response or not response.text:
             return {'description': '', 'requirements': ''}
 
@@ -248,9 +333,11 @@ def generate_job_description(job_title: str, keywords: str = "", responsibilitie
                 }
         
         logger.warning(f"Gemini returned improperly structured JSON for job generation: {text_response}")
+        forget_cached_response(model, prompt, 'job_description')
         return {'description': '', 'requirements': ''}
     except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Error generating job description with Gemini: {e}")
+        forget_cached_response(model, prompt, 'job_description')
         return {'description': '', 'requirements': ''}
 
 def generate_applicant_summary(resume_text: str, job_description: str) -> str:
@@ -293,7 +380,7 @@ def generate_applicant_summary(resume_text: str, job_description: str) -> str:
     """
 
     try:
-        response = _call_gemini_with_retry(model, prompt)
+        response = _call_gemini_with_retry(model, prompt, cache_as='applicant_summary')
         if not response or not response.text:
             return ""
 
@@ -309,9 +396,11 @@ def generate_applicant_summary(resume_text: str, job_description: str) -> str:
                 return data['summary'].strip()
         
         logger.warning(f"Gemini returned improperly structured JSON for applicant summary: {text_response}")
+        forget_cached_response(model, prompt, 'applicant_summary')
         return ""
     except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Error generating applicant summary with Gemini: {e}")
+        forget_cached_response(model, prompt, 'applicant_summary')
         return ""
 
 def generate_interview_prep(resume_text: str, job_description: str) -> dict:
@@ -381,6 +470,9 @@ def generate_interview_prep(resume_text: str, job_description: str) -> dict:
         
         logger.warning(f"Gemini returned improperly structured JSON for interview prep: {text_response}")
         return {'questions': []}
+    except GeminiRateLimited:
+        # The generation task re-queues itself or falls back to local questions
+        raise
     except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Error generating interview prep with Gemini: {e}")
         return {'questions': []}
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0013_migrate_salary_range_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='extracted_details',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='extracted_details_hash',
+            field=models.CharField(blank=True, help_text='Content hash the extracted details were computed from', max_length=64, null=True),
+        ),
+    ]
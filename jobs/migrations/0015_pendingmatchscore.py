@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0014_jobposting_extracted_details'),
+        ('resumes', '0014_resumepdfgeneration_pdf_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingMatchScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claim_token', models.CharField(blank=True, max_length=36, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('job_posting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='jobs.jobposting')),
+                ('resume', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='resumes.resume')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['claim_token', 'job_posting'], name='jobs_pendin_claim_t_1445a9_idx')],
+                'unique_together': {('resume', 'job_posting')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0015_pendingmatchscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobmatchscore',
+            name='is_provisional',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0016_jobmatchscore_is_provisional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobmatchscore',
+            name='job_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobmatchscore',
+            name='resume_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
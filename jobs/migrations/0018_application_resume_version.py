@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0017_jobmatchscore_content_hashes'),
+        ('resumes', '0018_resume_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='match_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='match_score_is_provisional',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='match_score_job_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='resume_version',
+            field=models.ForeignKey(blank=True, help_text='Frozen copy of the resume submitted with this application', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='applications', to='resumes.resumeversion'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0018_application_resume_version'),
+        ('resumes', '0021_resume_parse_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterviewPrep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('questions', models.JSONField(blank=True, default=list)),
+                ('is_fallback', models.BooleanField(default=False)),
+                ('task_id', models.CharField(blank=True, help_text='Celery task ID', max_length=255, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interview_preps', to='jobs.application')),
+                ('resume_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interview_preps', to='resumes.resumeversion')),
+            ],
+            options={
+                'unique_together': {('application', 'resume_version', 'job_hash')},
+            },
+        ),
+    ]
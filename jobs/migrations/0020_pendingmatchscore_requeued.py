@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0019_interviewprep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingmatchscore',
+            name='requeued',
+            field=models.BooleanField(default=False),
+        ),
+    ]
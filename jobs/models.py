@@ -1,7 +1,9 @@
 from django.db import models
 from users.models import CustomUser, JobSeekerProfile, EmployerProfile
 from django.utils import timezone
-from resumes.models import Resume
+from resumes.models import Resume, ResumeVersion
+from core.utils import compute_content_hash
+from resumes.documents import get_or_create_resume_version
 
 class JobPosting(models.Model):
     """
@@ -19,10 +21,25 @@ class JobPosting(models.Model):
     application_deadline = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True) # This field tracks the last update
+    # Structured requirements extracted by the AI matcher, reused for every resume scored against this job
+    extracted_details = models.JSONField(null=True, blank=True)
+    extracted_details_hash = models.CharField(max_length=64, null=True, blank=True, help_text="Content hash the extracted details were computed from")
 
     def __str__(self):
         return self.title
 
+    def get_match_text(self):
+        """
+        Returns the job text sent to the AI matcher.
+        """
+        return f"{self.title} {self.description} {self.requirements}"
+
+    def get_content_hash(self):
+        """
+        Returns a hash of the fields that feed the AI job analysis.
+        """
+        return compute_content_hash(self.title, self.description, self.requirements)
+
     @property
     def is_active(self):
         """
@@ -52,6 +69,11 @@ class Application(models.Model):
     job_posting = models.ForeignKey(JobPosting, on_delete=models.CASCADE)
     applicant = models.ForeignKey(JobSeekerProfile, on_delete=models.CASCADE)
     resume = models.ForeignKey(Resume, on_delete=models.SET_NULL, null=True, blank=True, help_text="The specific resume version used for this application")
+    resume_version = models.ForeignKey(ResumeVersion, on_delete=models.SET_NULL, null=True, blank=True, related_name='applications', help_text="Frozen copy of the resume submitted with this application")
+    # Match score of the pinned resume version; the version never changes, so only job edits make it stale
+    match_score = models.IntegerField(null=True, blank=True)
+    match_score_is_provisional = models.BooleanField(default=False)
+    match_score_job_hash = models.CharField(max_length=64, null=True, blank=True)
     applied_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Submitted')
     resume_template = models.CharField(max_length=20, choices=TEMPLATE_CHOICES, default='classic')
@@ -60,6 +82,21 @@ class Application(models.Model):
     def __str__(self):
         return f"{self.applicant.user.username}'s application for {self.job_posting.title}"
 
+    def get_resume_version(self):
+        """
+        Returns the frozen resume version submitted with this application.
+        Applications created before versions existed are pinned on first use to their
+        linked resume, or the applicant's newest one.
+        """
+        if self.resume_version_id:
+            return self.resume_version
+        resume = self.resume or Resume.objects.filter(profile_id=self.applicant_id).order_by('-created_at').first()
+        if not resume:
+            return None
+        self.resume_version = get_or_create_resume_version(resume)
+        Application.objects.filter(pk=self.pk).update(resume_version=self.resume_version)
+        return self.resume_version
+
 class Notification(models.Model):
     """
     A notification for users, typically for employers about new applications.
@@ -109,6 +146,11 @@ class JobMatchScore(models.Model):
     resume = models.ForeignKey(Resume, on_delete=models.CASCADE)
     job_posting = models.ForeignKey(JobPosting, on_delete=models.CASCADE)
     score = models.IntegerField()
+    # True while the score comes from the local pre-scorer and has not been refined by Gemini
+    is_provisional = models.BooleanField(default=False)
+    # Content hashes of the resume text and job posting the score was calculated from
+    resume_hash = models.CharField(max_length=64, null=True, blank=True)
+    job_hash = models.CharField(max_length=64, null=True, blank=True)
     last_calculated = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -117,3 +159,61 @@ class JobMatchScore(models.Model):
     def __str__(self):
         return f"{self.score}% match for {self.resume.profile.user.username} on {self.job_posting.title}"
 
+
+class PendingMatchScore(models.Model):
+    """
+    A (resume, job posting) pair queued for the batched matcher.
+    Pairs are drained grouped by job so one Gemini request can score several resumes.
+    """
+    resume = models.ForeignKey(Resume, on_delete=models.CASCADE)
+    job_posting = models.ForeignKey(JobPosting, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when a worker claims the pair so concurrent drains don't score it twice
+    claim_token = models.CharField(max_length=36, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # Set when the pair is queued again while claimed, so the batch keeps it queued for the newer content
+    requeued = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('resume', 'job_posting')
+        indexes = [
+            models.Index(fields=['claim_token', 'job_posting']),
+        ]
+
+    def __str__(self):
+        return f"Pending score for resume {self.resume_id} on job {self.job_posting_id}"
+
+
+class InterviewPrep(models.Model):
+    """
+    Interview questions generated for an application, stored per resume version and job content
+    so the prep page is rendered from the database instead of calling Gemini on every view.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='interview_preps')
+    resume_version = models.ForeignKey(ResumeVersion, on_delete=models.CASCADE, related_name='interview_preps')
+    # Content hash of the job posting the questions were generated from
+    job_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # List of {'question': ..., 'answer': ...} dicts
+    questions = models.JSONField(default=list, blank=True)
+    # True when the questions are the local fallback because Gemini was unavailable
+    is_fallback = models.BooleanField(default=False)
+    task_id = models.CharField(max_length=255, null=True, blank=True, help_text="Celery task ID")
+    error_message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When generation was last queued; used to restart generations whose task was lost
+    started_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('application', 'resume_version', 'job_hash')
+
+    def __str__(self):
+        return f"Interview prep for {self.application} - {self.status}"
@@ -0,0 +1,93 @@
+"""
+Local lexical pre-scorer for resume/job matches.
+
+Scores are computed in-process from TF-IDF similarity and required-skill overlap, so
+pages can show a provisional match score immediately and only the most promising
+candidates have to be scored by Gemini.
+"""
+import re
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+
+# Share of the score taken by required-skill overlap when the job's skills are known
+SKILL_OVERLAP_WEIGHT = 0.6
+# TF-IDF cosine similarity at or above this value counts as a full lexical match.
+# Resumes and job posts use different wording, so real-world similarities rarely exceed it.
+SIMILARITY_CEILING = 0.5
+MAX_SCORE = 99
+
+
+def _similarities(query_text: str, documents: list) -> list:
+    """
+    Returns the TF-IDF cosine similarity between the query and each document.
+    IDF weights are fitted on the query plus all documents, so terms shared by every
+    candidate count for less than distinctive ones.
+    """
+    vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+    try:
+        matrix = vectorizer.fit_transform([query_text or ''] + [doc or '' for doc in documents])
+    except ValueError:
+        # Every text was empty or consisted only of stop words
+        return [0.0] * len(documents)
+    # Rows are L2-normalised, so the linear kernel is the cosine similarity
+    return linear_kernel(matrix[0:1], matrix[1:]).ravel().tolist()
+
+
+def match_required_skills(resume_text: str, job_details: dict):
+    """Splits the job's required skills into (mentioned in the resume, missing from it)."""
+    skills = (job_details or {}).get('required_skills') or []
+    skills = [skill.strip() for skill in skills if isinstance(skill, str) and skill.strip()]
+    lowered = (resume_text or '').lower()
+    found, missing = [], []
+    for skill in skills:
+        mentioned = re.search(r'(?<!\w)' + re.escape(skill.lower()) + r'(?!\w)', lowered)
+        (found if mentioned else missing).append(skill)
+    return found, missing
+
+
+def _skill_overlap(resume_text: str, job_details: dict):
+    """Returns the fraction of the job's required skills mentioned in the resume, or None if unknown."""
+    found, missing = match_required_skills(resume_text, job_details)
+    if not found and not missing:
+        return None
+    return len(found) / (len(found) + len(missing))
+
+
+def _combine(similarity: float, overlap) -> int:
+    lexical = min(similarity / SIMILARITY_CEILING, 1.0)
+    if overlap is None:
+        combined = lexical
+    else:
+        combined = SKILL_OVERLAP_WEIGHT * overlap + (1 - SKILL_OVERLAP_WEIGHT) * lexical
+    return min(int(round(combined * 100)), MAX_SCORE)
+
+
+def prescore_resumes(job_text: str, resume_texts: dict, job_details: dict = None) -> dict:
+    """
+    Scores several resumes against one job.
+    Takes {resume_id: resume_text} and returns {resume_id: score} with scores from 0 to 99.
+    """
+    if not resume_texts:
+        return {}
+    resume_ids = list(resume_texts)
+    similarities = _similarities(job_text, [resume_texts[resume_id] for resume_id in resume_ids])
+    return {
+        resume_id: _combine(similarity, _skill_overlap(resume_texts[resume_id], job_details))
+        for resume_id, similarity in zip(resume_ids, similarities)
+    }
+
+
+def prescore_jobs(resume_text: str, job_texts: dict, job_details: dict = None) -> dict:
+    """
+    Scores one resume against several jobs.
+    Takes {job_id: job_text} and optional {job_id: extracted details}; returns {job_id: score}.
+    """
+    if not job_texts:
+        return {}
+    job_details = job_details or {}
+    job_ids = list(job_texts)
+    similarities = _similarities(resume_text, [job_texts[job_id] for job_id in job_ids])
+    return {
+        job_id: _combine(similarity, _skill_overlap(resume_text, job_details.get(job_id)))
+        for job_id, similarity in zip(job_ids, similarities)
+    }
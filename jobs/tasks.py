@@ -1,11 +1,32 @@
 from celery import shared_task
-from .models import JobPosting, JobMatchScore
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from datetime import timedelta
+import logging
+import uuid
+from .models import Application, InterviewPrep, JobPosting, JobMatchScore, PendingMatchScore
 from resumes.models import Resume
-from resumes.parser import get_full_resume_text
-from .matcher import calculate_match_score
+from resumes.parser import get_full_resume_text, get_resume_content_hash
+from resumes.documents import load_resume_documents, load_version_document
+from .matcher import calculate_match_score, generate_interview_prep, get_cached_job_details, get_stored_job_details, score_resume_with_gemini, score_resumes_batch_with_gemini
+from .prescorer import prescore_jobs, prescore_resumes
+from .fallbacks import local_interview_prep
+from core.ai_gateway import GeminiRateLimited, GeminiUnavailable
 
-@shared_task
-def calculate_and_save_match_score_task(resume_id, job_id):
+logger = logging.getLogger(__name__)
+
+# Claims older than this are assumed to belong to a worker that died mid-batch
+PENDING_CLAIM_TIMEOUT = timedelta(minutes=10)
+# Interview preps still generating after this are assumed lost, e.g. dropped by the broker, and restarted
+INTERVIEW_PREP_STALE_AFTER = timedelta(minutes=10)
+# Local fallback interview questions get another Gemini attempt once they are this old
+INTERVIEW_PREP_FALLBACK_REFRESH = timedelta(hours=1)
+
+@shared_task(bind=True)
+def calculate_and_save_match_score_task(self, resume_id, job_id):
     """
     Asynchronous task to calculate and save the match score between a resume and a job posting.
     """
@@ -14,16 +35,485 @@ def calculate_and_save_match_score_task(resume_id, job_id):
         job = JobPosting.objects.get(id=job_id)
 
         resume_text = get_full_resume_text(resume)
-        job_text = f"{job.title} {job.description} {job.requirements}"
-        
-        score = calculate_match_score(resume_text, job_text)
+        resume_hash = get_resume_content_hash(resume, resume_text)
+        job_hash = job.get_content_hash()
+        if JobMatchScore.objects.filter(
+            resume=resume, job_posting=job, is_provisional=False, resume_hash=resume_hash, job_hash=job_hash
+        ).exists():
+            logger.info(f"Resume {resume_id} and job {job_id} are unchanged since they were last scored.")
+            return
+
+        job_text = job.get_match_text()
+        # Structured requirements are extracted once per job content, not once per resume.
+        # An empty dict (failed extraction) makes the matcher fall back without retrying the extraction.
+        job_details = get_cached_job_details(job) or {}
+
+        score = calculate_match_score(resume_text, job_text, job_details=job_details)
 
         JobMatchScore.objects.update_or_create(
             resume=resume,
             job_posting=job,
-            defaults={'score': score}
+            defaults={'score': score, 'is_provisional': False, 'resume_hash': resume_hash, 'job_hash': job_hash}
         )
     except (Resume.DoesNotExist, JobPosting.DoesNotExist):
         print(f"Could not find Resume ({resume_id}) or JobPosting ({job_id}) for scoring.")
+    except GeminiRateLimited as e:
+        logger.warning(f"Gemini quota exhausted scoring resume {resume_id} for job {job_id}; retrying in {e.retry_after}s.")
+        raise self.retry(exc=e, countdown=e.retry_after, max_retries=settings.GEMINI_RATE_LIMIT_MAX_REQUEUES)
     except Exception as e:
         print(f"An error occurred while matching resume {resume_id} and job {job_id}: {e}")
+
+
+@shared_task(bind=True)
+def score_application_task(self, application_id):
+    """
+    Scores an application's pinned resume version against its job with Gemini.
+    The version never changes, so the score only needs recalculating after the job is edited.
+    """
+    try:
+        application = Application.objects.select_related('job_posting', 'resume_version').get(id=application_id)
+    except Application.DoesNotExist:
+        logger.warning(f"Application {application_id} no longer exists; skipping scoring.")
+        return
+
+    job = application.job_posting
+    version = application.resume_version
+    job_hash = job.get_content_hash()
+    if not version or (not application.match_score_is_provisional and application.match_score_job_hash == job_hash):
+        return
+
+    try:
+        job_details = get_cached_job_details(job) or {}
+        score = calculate_match_score(load_version_document(version).text, job.get_match_text(), job_details=job_details)
+        Application.objects.filter(pk=application.pk).update(
+            match_score=score, match_score_is_provisional=False, match_score_job_hash=job_hash
+        )
+    except GeminiRateLimited as e:
+        logger.warning(f"Gemini quota exhausted scoring application {application_id}; retrying in {e.retry_after}s.")
+        raise self.retry(exc=e, countdown=e.retry_after, max_retries=settings.GEMINI_RATE_LIMIT_MAX_REQUEUES)
+    except Exception as e:
+        logger.error(f"Error scoring application {application_id}: {e}", exc_info=True)
+
+
+def refresh_application_score(application, job_hash=None):
+    """
+    Makes sure an application has a match score for its pinned resume version against the
+    current job content. A live JobMatchScore calculated from identical text is reused;
+    otherwise an instant local score is stored and Gemini scoring is queued.
+    """
+    job = application.job_posting
+    version = application.resume_version
+    job_hash = job_hash or job.get_content_hash()
+    if not version or application.match_score_job_hash == job_hash:
+        return
+
+    live_score = JobMatchScore.objects.filter(
+        resume_id=version.resume_id, job_posting=job, is_provisional=False,
+        resume_hash=version.text_hash, job_hash=job_hash,
+    ).first()
+    if live_score:
+        score, is_provisional = live_score.score, False
+    else:
+        text = load_version_document(version).text
+        score = prescore_resumes(job.get_match_text(), {version.id: text}, get_stored_job_details(job))[version.id]
+        is_provisional = True
+        application_id = application.id
+        transaction.on_commit(lambda: score_application_task.delay(application_id))
+
+    Application.objects.filter(pk=application.pk).update(
+        match_score=score, match_score_is_provisional=is_provisional, match_score_job_hash=job_hash
+    )
+    application.match_score = score
+    application.match_score_is_provisional = is_provisional
+    application.match_score_job_hash = job_hash
+
+
+@shared_task
+def refresh_application_scores_task(application_ids):
+    """
+    Runs refresh_application_score for a batch of applications, pinning a resume version
+    first where an older application doesn't have one yet. Used where scoring inline would
+    slow a page down, such as the job stats dashboard.
+    """
+    job_hashes = {}
+    for application in Application.objects.filter(id__in=application_ids).select_related('job_posting', 'resume_version'):
+        if not application.get_resume_version():
+            continue
+        job = application.job_posting
+        if job.id not in job_hashes:
+            job_hashes[job.id] = job.get_content_hash()
+        try:
+            refresh_application_score(application, job_hashes[job.id])
+        except Exception as e:
+            logger.error(f"Error refreshing the score of application {application.id}: {e}", exc_info=True)
+
+
+def enqueue_match_scores(pairs):
+    """
+    Queues (resume_id, job_id) pairs for the batched matcher and starts a drain task.
+    Pairs that are already queued are ignored, except that a pair claimed by a batch in flight
+    is flagged to stay queued, since the batch may be scoring content from before this change.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return 0
+    # Flagged before inserting, so a batch finishing in between either keeps the row or has deleted it
+    for start in range(0, len(pairs), 200):
+        in_flight = Q()
+        for resume_id, job_id in pairs[start:start + 200]:
+            in_flight |= Q(resume_id=resume_id, job_posting_id=job_id)
+        PendingMatchScore.objects.filter(in_flight, claim_token__isnull=False).update(requeued=True)
+    pending = [PendingMatchScore(resume_id=resume_id, job_posting_id=job_id) for resume_id, job_id in pairs]
+    PendingMatchScore.objects.bulk_create(pending, batch_size=500, ignore_conflicts=True)
+    score_pending_matches_task.delay()
+    return len(pending)
+
+
+def save_provisional_scores(scores, resume_hashes=None, job_hashes=None):
+    """
+    Stores local pre-scores given as {(resume_id, job_id): score}, along with the optional
+    {resume_id: hash} and {job_id: hash} content hashes they were calculated from.
+    Existing scores are overwritten, so callers must leave out pairs that already have a current Gemini score.
+    """
+    resume_hashes = resume_hashes or {}
+    job_hashes = job_hashes or {}
+    rows = [
+        JobMatchScore(
+            resume_id=resume_id, job_posting_id=job_id, score=score, is_provisional=True,
+            resume_hash=resume_hashes.get(resume_id), job_hash=job_hashes.get(job_id),
+        )
+        for (resume_id, job_id), score in scores.items()
+    ]
+    if rows:
+        JobMatchScore.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['resume', 'job_posting'],
+            update_fields=['score', 'is_provisional', 'resume_hash', 'job_hash', 'last_calculated'],
+        )
+
+
+def get_shortlist_cutoffs(job_ids):
+    """
+    Returns {job_id: score} with the lowest score still inside each job's top MATCH_SCORE_AI_TOP_K,
+    in a single query. Jobs with fewer scores than that are left out, as any score makes their shortlist.
+    """
+    top_k = getattr(settings, 'MATCH_SCORE_AI_TOP_K', 50)
+    ranked = JobMatchScore.objects.filter(job_posting_id__in=job_ids).annotate(
+        rank=Window(RowNumber(), partition_by=[F('job_posting_id')], order_by=F('score').desc())
+    )
+    return dict(ranked.filter(rank=top_k).values_list('job_posting_id', 'score'))
+
+
+def is_ai_shortlisted(score, cutoff):
+    """Returns True if a pre-score would place a resume within a job's top MATCH_SCORE_AI_TOP_K, given the job's cutoff from get_shortlist_cutoffs."""
+    return cutoff is None or score >= cutoff
+
+
+@shared_task
+def rank_resumes_for_job_task(job_id):
+    """
+    Pre-scores every resume against a new or edited job with the local scorer, stores the
+    results as provisional scores and queues only the top MATCH_SCORE_AI_TOP_K resumes for Gemini.
+    """
+    try:
+        job = JobPosting.objects.get(id=job_id)
+    except JobPosting.DoesNotExist:
+        logger.warning(f"JobPosting {job_id} no longer exists; skipping ranking.")
+        return
+
+    # Scores calculated from the current resume and job content are kept as they are.
+    # Resumes with a stored hash can be matched in the database; edits clear the stored
+    # hash, so the others are hashed from their text and compared below.
+    job_hash = job.get_content_hash()
+    scored_hashes = dict(
+        JobMatchScore.objects.filter(job_posting=job, job_hash=job_hash).values_list('resume_id', 'resume_hash')
+    )
+    current_ids = set(
+        JobMatchScore.objects.filter(
+            job_posting=job, job_hash=job_hash, resume_hash=F('resume__content_hash')
+        ).values_list('resume_id', flat=True)
+    )
+    documents = load_resume_documents(Resume.objects.exclude(id__in=current_ids))
+    resume_texts = {}
+    resume_hashes = {}
+    for resume_id, document in documents.items():
+        resume_hash = get_resume_content_hash(document.resume, document.text)
+        if scored_hashes.get(resume_id) != resume_hash:
+            resume_texts[resume_id] = document.text
+            resume_hashes[resume_id] = resume_hash
+    if not resume_texts:
+        return
+
+    try:
+        job_details = get_cached_job_details(job)
+    except GeminiRateLimited:
+        # Local pre-scoring doesn't wait for quota; the batched matcher extracts the details later
+        job_details = get_stored_job_details(job)
+    scores = prescore_resumes(job.get_match_text(), resume_texts, job_details)
+    save_provisional_scores(
+        {(resume_id, job.id): score for resume_id, score in scores.items()},
+        resume_hashes=resume_hashes,
+        job_hashes={job.id: job_hash},
+    )
+
+    top_k = getattr(settings, 'MATCH_SCORE_AI_TOP_K', 50)
+    shortlisted = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    enqueue_match_scores((resume_id, job.id) for resume_id in shortlisted)
+    logger.info(f"Pre-scored {len(scores)} resumes for job {job_id}; queued {len(shortlisted)} for Gemini.")
+
+
+def refresh_resume_match_scores(resume):
+    """
+    Refreshes the match scores of an edited resume against active jobs it already has a score for.
+    Scores whose resume and job content are unchanged are left alone. Gemini scores are re-queued
+    for the batched matcher; provisional scores are recomputed locally and only go to Gemini if they
+    now make the job's shortlist. Jobs the resume has never been scored against are pre-scored on
+    demand by the job list.
+    """
+    resume_text = get_full_resume_text(resume)
+    resume_hash = get_resume_content_hash(resume, resume_text)
+    existing_scores = JobMatchScore.objects.filter(resume=resume).filter(
+        Q(job_posting__application_deadline__gte=timezone.now()) | Q(job_posting__application_deadline__isnull=True)
+    ).select_related('job_posting')
+
+    ai_pairs = []
+    provisional_jobs = []
+    for score_data in existing_scores:
+        if score_data.resume_hash == resume_hash and score_data.job_hash == score_data.job_posting.get_content_hash():
+            continue
+        if score_data.is_provisional:
+            provisional_jobs.append(score_data.job_posting)
+        else:
+            ai_pairs.append((resume.id, score_data.job_posting_id))
+
+    if provisional_jobs:
+        local_scores = prescore_jobs(
+            resume_text,
+            {job.id: job.get_match_text() for job in provisional_jobs},
+            {job.id: get_stored_job_details(job) for job in provisional_jobs},
+        )
+        save_provisional_scores(
+            {(resume.id, job_id): score for job_id, score in local_scores.items()},
+            resume_hashes={resume.id: resume_hash},
+            job_hashes={job.id: job.get_content_hash() for job in provisional_jobs},
+        )
+        cutoffs = get_shortlist_cutoffs(local_scores)
+        ai_pairs.extend(
+            (resume.id, job_id) for job_id, score in local_scores.items() if is_ai_shortlisted(score, cutoffs.get(job_id))
+        )
+
+    enqueue_match_scores(ai_pairs)
+    return len(ai_pairs)
+
+
+def _claim_pending_batch(batch_size):
+    """
+    Claims up to batch_size queued pairs that all belong to the same job.
+    Returns (job_id, claim_token) or (None, None) when the queue is empty.
+    """
+    # Release claims from workers that never finished their batch
+    PendingMatchScore.objects.filter(
+        claimed_at__lt=timezone.now() - PENDING_CLAIM_TIMEOUT
+    ).update(claim_token=None, claimed_at=None)
+
+    oldest = PendingMatchScore.objects.filter(claim_token__isnull=True).order_by('created_at').first()
+    if not oldest:
+        return None, None
+
+    claim_token = str(uuid.uuid4())
+    candidate_ids = list(
+        PendingMatchScore.objects.filter(
+            claim_token__isnull=True, job_posting_id=oldest.job_posting_id
+        ).order_by('created_at').values_list('id', flat=True)[:batch_size]
+    )
+    # The claim_token__isnull filter makes the claim atomic across concurrent drains
+    PendingMatchScore.objects.filter(id__in=candidate_ids, claim_token__isnull=True).update(
+        claim_token=claim_token, claimed_at=timezone.now(), requeued=False
+    )
+    return oldest.job_posting_id, claim_token
+
+
+def _score_claimed_batch(job_id, claim_token):
+    """
+    Scores every resume in a claimed batch against its job with a single Gemini call.
+    If the Gemini quota is exhausted, the batch is released back to the queue and
+    GeminiRateLimited is raised for the drain task to re-queue itself.
+    """
+    claimed = PendingMatchScore.objects.filter(claim_token=claim_token)
+    resume_ids = list(claimed.values_list('resume_id', flat=True))
+    rate_limited = False
+    try:
+        job = JobPosting.objects.get(id=job_id)
+        job_hash = job.get_content_hash()
+        documents = load_resume_documents(resume_ids)
+        resume_texts = {resume_id: document.text for resume_id, document in documents.items()}
+        resume_hashes = {
+            resume_id: get_resume_content_hash(document.resume, document.text) for resume_id, document in documents.items()
+        }
+
+        # Pairs whose Gemini score was calculated from the same content need no new call
+        current = set(
+            JobMatchScore.objects.filter(
+                job_posting=job, is_provisional=False, job_hash=job_hash, resume_id__in=resume_texts
+            ).values_list('resume_id', 'resume_hash')
+        )
+        resume_texts = {
+            resume_id: resume_text for resume_id, resume_text in resume_texts.items()
+            if (resume_id, resume_hashes[resume_id]) not in current
+        }
+        if not resume_texts:
+            return
+
+        job_details = get_cached_job_details(job) or {"requirements": job.get_match_text()}
+        scores = score_resumes_batch_with_gemini(resume_texts, job_details)
+
+        for resume_id, resume_text in resume_texts.items():
+            score = scores.get(resume_id)
+            if score is None:
+                # The batch response skipped this resume; score it on its own
+                score = score_resume_with_gemini(resume_text, job_details)
+            JobMatchScore.objects.update_or_create(
+                resume_id=resume_id,
+                job_posting=job,
+                defaults={
+                    'score': score, 'is_provisional': False,
+                    'resume_hash': resume_hashes[resume_id], 'job_hash': job_hash,
+                }
+            )
+        logger.info(f"Batch scored {len(resume_texts)} resumes for job {job_id}.")
+    except JobPosting.DoesNotExist:
+        logger.warning(f"JobPosting {job_id} no longer exists; dropping its queued scores.")
+    except GeminiRateLimited:
+        # Pairs already scored above are skipped next time by their content hashes
+        rate_limited = True
+        claimed.update(claim_token=None, claimed_at=None)
+        raise
+    except Exception as e:
+        logger.error(f"Error batch scoring job {job_id}: {e}", exc_info=True)
+    finally:
+        if not rate_limited:
+            claimed.filter(requeued=False).delete()
+            # Pairs queued again mid-batch are scored again from their current content
+            claimed.update(claim_token=None, claimed_at=None, requeued=False)
+
+
+@shared_task
+def score_pending_matches_task():
+    """
+    Drains queued (resume, job) pairs grouped by job, so each Gemini request scores up to
+    MATCH_SCORE_BATCH_SIZE resumes. Hands off to a fresh task if work remains after
+    MATCH_SCORE_MAX_BATCHES_PER_RUN batches, or after the Gemini quota's refill delay if it ran out.
+    """
+    batch_size = getattr(settings, 'MATCH_SCORE_BATCH_SIZE', 15)
+    max_batches = getattr(settings, 'MATCH_SCORE_MAX_BATCHES_PER_RUN', 20)
+
+    for _ in range(max_batches):
+        job_id, claim_token = _claim_pending_batch(batch_size)
+        if not claim_token:
+            return
+        try:
+            _score_claimed_batch(job_id, claim_token)
+        except GeminiRateLimited as e:
+            logger.warning(f"Gemini quota exhausted; draining queued match scores again in {e.retry_after}s.")
+            score_pending_matches_task.apply_async(countdown=e.retry_after)
+            return
+
+    if PendingMatchScore.objects.filter(claim_token__isnull=True).exists():
+        score_pending_matches_task.delay()
+
+
+def _normalize_interview_questions(questions):
+    """Returns questions as {'question': str, 'answer': str} dicts, whichever keys Gemini used."""
+    normalized = []
+    for item in questions:
+        if isinstance(item, dict):
+            question = item.get('question') or item.get('Question') or item.get('q') or item.get('Q') or ''
+            answer = item.get('answer') or item.get('Answer') or item.get('a') or item.get('A') or ''
+        else:
+            question, answer = item, ''
+        normalized.append({'question': str(question) if question else '', 'answer': str(answer) if answer else ''})
+    return normalized
+
+
+@shared_task(bind=True)
+def generate_interview_prep_task(self, prep_id):
+    """
+    Generates and stores the interview questions for an InterviewPrep. Local questions are stored
+    instead while the Gemini circuit is open, when Gemini returns nothing usable, or once the
+    quota has stayed exhausted for GEMINI_RATE_LIMIT_MAX_REQUEUES retries.
+    """
+    try:
+        prep = InterviewPrep.objects.select_related('application__job_posting', 'resume_version').get(id=prep_id)
+    except InterviewPrep.DoesNotExist:
+        logger.warning(f"Interview prep {prep_id} no longer exists; skipping generation.")
+        return
+    if prep.status == 'completed' and not prep.is_fallback:
+        return
+
+    # A fallback being refreshed keeps showing its questions until the new ones are stored
+    refreshing = prep.status == 'completed'
+    if not refreshing:
+        InterviewPrep.objects.filter(pk=prep.pk).update(status='processing')
+
+    job = prep.application.job_posting
+    questions = []
+    try:
+        resume_text = load_version_document(prep.resume_version).text
+        job_description = f"{job.title}\n\n{job.description}\n\n{job.requirements}"
+        questions = generate_interview_prep(resume_text, job_description).get('questions') or []
+    except GeminiUnavailable:
+        logger.warning(f"Gemini circuit is open; storing local questions for interview prep {prep_id}.")
+    except GeminiRateLimited as e:
+        if self.request.retries < settings.GEMINI_RATE_LIMIT_MAX_REQUEUES:
+            logger.warning(f"Gemini quota exhausted generating interview prep {prep_id}; retrying in {e.retry_after}s.")
+            InterviewPrep.objects.filter(pk=prep.pk).update(
+                status='completed' if refreshing else 'pending', started_at=timezone.now()
+            )
+            raise self.retry(exc=e, countdown=e.retry_after, max_retries=settings.GEMINI_RATE_LIMIT_MAX_REQUEUES)
+        logger.error(f"Gemini quota stayed exhausted; storing local questions for interview prep {prep_id}.")
+    except Exception as e:
+        logger.error(f"Error generating interview prep {prep_id}: {e}", exc_info=True)
+        if not refreshing:
+            InterviewPrep.objects.filter(pk=prep.pk).update(status='failed', error_message=str(e))
+        return
+
+    is_fallback = not questions
+    if is_fallback:
+        questions = local_interview_prep(job.title, get_stored_job_details(job))['questions']
+    InterviewPrep.objects.filter(pk=prep.pk).update(
+        status='completed', questions=_normalize_interview_questions(questions), is_fallback=is_fallback,
+        error_message=None, completed_at=timezone.now(),
+    )
+
+
+def _queue_interview_prep(prep_id):
+    task = generate_interview_prep_task.delay(prep_id)
+    InterviewPrep.objects.filter(pk=prep_id).update(task_id=task.id)
+
+
+def get_or_start_interview_prep(application, resume_version):
+    """
+    Returns the InterviewPrep for an application's resume version and the job's current content.
+    Generation is queued when the prep is new, when an earlier attempt failed or looks lost, and
+    when its local fallback questions are due for another Gemini attempt.
+    """
+    prep, created = InterviewPrep.objects.get_or_create(
+        application=application, resume_version=resume_version, job_hash=application.job_posting.get_content_hash(),
+    )
+    now = timezone.now()
+    due = created or prep.started_at < now - INTERVIEW_PREP_STALE_AFTER
+    if prep.status == 'completed':
+        due = due and prep.is_fallback and prep.completed_at < now - INTERVIEW_PREP_FALLBACK_REFRESH
+    if not due:
+        return prep
+
+    prep.started_at = now
+    if prep.status != 'completed':
+        prep.status = 'pending'
+        prep.error_message = None
+    prep.save(update_fields=['status', 'started_at', 'error_message'])
+    prep_id = prep.id
+    transaction.on_commit(lambda: _queue_interview_prep(prep_id))
+    return prep
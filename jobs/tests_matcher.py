@@ -0,0 +1,581 @@
+"""
+Tests for the AI matcher and scoring tasks with mocked Gemini calls.
+"""
+import time
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from unittest.mock import patch, MagicMock
+from .models import JobPosting, JobMatchScore, PendingMatchScore, Application, InterviewPrep
+from .matcher import get_cached_job_details, score_resumes_batch_with_gemini
+from .prescorer import prescore_resumes
+from .tasks import (
+    calculate_and_save_match_score_task, score_pending_matches_task, enqueue_match_scores,
+    rank_resumes_for_job_task, refresh_resume_match_scores, refresh_application_score, score_application_task,
+    generate_interview_prep_task, get_or_start_interview_prep, _claim_pending_batch, _score_claimed_batch,
+    get_shortlist_cutoffs, is_ai_shortlisted,
+)
+from users.models import EmployerProfile, JobSeekerProfile
+from resumes.models import Resume, Skill, Hobby
+from resumes.documents import get_or_create_resume_version, load_version_document
+from core import rate_limiter
+from core.ai_gateway import GeminiRateLimited, GeminiUnavailable, call_gemini_with_retry, get_gemini_model, reset_gemini_clients
+from core.ai_cache import get_cache_stats
+from core.circuit_breaker import gemini_breaker
+from django.core.cache import caches
+from celery.exceptions import Retry
+from google.api_core.exceptions import ResourceExhausted
+
+User = get_user_model()
+
+
+@override_settings(GOOGLE_AI_API_KEY='test-key', USE_GEMINI=True)
+class GeminiGatewayTests(TestCase):
+    """Test the shared Gemini client used by every AI feature."""
+
+    def setUp(self):
+        reset_gemini_clients()
+        gemini_breaker.reset()
+        self.addCleanup(reset_gemini_clients)
+        self.addCleanup(gemini_breaker.reset)
+
+    @patch('core.ai_gateway.genai')
+    def test_client_is_configured_once_and_models_are_reused(self, mock_genai):
+        mock_genai.GenerativeModel.side_effect = lambda name: MagicMock(name=name)
+        model = get_gemini_model()
+        self.assertIs(get_gemini_model(), model)
+        self.assertIsNot(get_gemini_model('models/other'), model)
+        mock_genai.configure.assert_called_once_with(api_key='test-key')
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+
+        with override_settings(GOOGLE_AI_API_KEY='rotated-key'):
+            self.assertIsNot(get_gemini_model(), model)
+        self.assertEqual(mock_genai.configure.call_count, 2)
+
+        with override_settings(USE_GEMINI=False):
+            self.assertIsNone(get_gemini_model())
+
+    @override_settings(GEMINI_TIMEOUT_SECONDS=12, GEMINI_MAX_RETRIES=3)
+    @patch('core.ai_gateway.time.sleep')
+    def test_calls_retry_with_backoff_and_a_timeout_per_attempt(self, mock_sleep):
+        model = MagicMock()
+        model.generate_content.side_effect = [Exception('unavailable'), 'response']
+        self.assertEqual(call_gemini_with_retry(model, 'prompt'), 'response')
+        model.generate_content.assert_called_with('prompt', request_options={'timeout': 12})
+        mock_sleep.assert_called_once()
+
+        model.generate_content.side_effect = Exception('down')
+        self.assertIsNone(call_gemini_with_retry(model, 'prompt', max_retries=2, timeout_seconds=5))
+        model.generate_content.assert_called_with('prompt', request_options={'timeout': 5})
+
+
+@override_settings(GEMINI_RATE_LIMIT_REDIS_URL='', GEMINI_REQUESTS_PER_MINUTE=2, GEMINI_TOKENS_PER_MINUTE=1000)
+class GeminiRateLimiterTests(TestCase):
+    """Test the token buckets shared by all Gemini calls (in-memory fallback)."""
+
+    def setUp(self):
+        rate_limiter.reset_rate_limiter()
+        gemini_breaker.reset()
+        self.addCleanup(rate_limiter.reset_rate_limiter)
+        self.addCleanup(gemini_breaker.reset)
+
+    @patch('core.rate_limiter.time.monotonic')
+    def test_buckets_limit_requests_and_tokens_per_minute(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        self.assertEqual(rate_limiter.acquire('model-a', 10), 0)
+        self.assertEqual(rate_limiter.acquire('model-a', 10), 0)
+        # Requests refill at 2 per minute, so the next one is available in 30s
+        self.assertAlmostEqual(rate_limiter.acquire('model-a', 10), 30.0)
+        mock_monotonic.return_value = 130.0
+        self.assertEqual(rate_limiter.acquire('model-a', 10), 0)
+
+        # A prompt larger than the bucket is let through once, leaving a token debt
+        self.assertEqual(rate_limiter.acquire('model-b', 1500), 0)
+        self.assertAlmostEqual(rate_limiter.acquire('model-b', 10), 30.6)
+        rate_limiter.record_tokens('model-b', 500)
+        self.assertAlmostEqual(rate_limiter.acquire('model-b', 10), 60.6)
+
+    @override_settings(GEMINI_REQUESTS_PER_MINUTE=1, GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS=2)
+    @patch('core.ai_gateway.time.sleep')
+    def test_exhausted_quota_raises_instead_of_sleeping(self, mock_sleep):
+        model = MagicMock(model_name='models/test')
+        model.generate_content.return_value = 'response'
+        self.assertEqual(call_gemini_with_retry(model, 'prompt'), 'response')
+        with self.assertRaises(GeminiRateLimited) as raised:
+            call_gemini_with_retry(model, 'prompt')
+        self.assertGreaterEqual(raised.exception.retry_after, 59)
+        self.assertEqual(model.generate_content.call_count, 1)
+        mock_sleep.assert_not_called()
+
+        # Quota used up outside the limiter isn't retried in the worker either
+        other = MagicMock(model_name='models/other')
+        other.generate_content.side_effect = ResourceExhausted('quota')
+        with self.assertRaises(GeminiRateLimited):
+            call_gemini_with_retry(other, 'prompt')
+        self.assertEqual(other.generate_content.call_count, 1)
+        mock_sleep.assert_not_called()
+
+
+@override_settings(
+    GEMINI_RATE_LIMIT_REDIS_URL='', GEMINI_BREAKER_FAILURE_THRESHOLD=2,
+    GEMINI_BREAKER_RESET_SECONDS=30, GEMINI_BREAKER_LATENCY_SLO_SECONDS=5,
+)
+class GeminiCircuitBreakerTests(TestCase):
+    """Test the circuit breaker in front of every Gemini call (per-process fallback state)."""
+
+    def setUp(self):
+        rate_limiter.reset_rate_limiter()
+        gemini_breaker.reset()
+        self.addCleanup(rate_limiter.reset_rate_limiter)
+        self.addCleanup(gemini_breaker.reset)
+
+    @patch('core.ai_gateway.time.sleep')
+    def test_circuit_opens_after_failures_and_probes_when_half_open(self, mock_sleep):
+        model = MagicMock(model_name='models/test')
+        model.generate_content.side_effect = Exception('down')
+        # The second failed attempt trips the circuit, so the third attempt is never made
+        with self.assertRaises(GeminiUnavailable):
+            call_gemini_with_retry(model, 'prompt', max_retries=3)
+        self.assertEqual(model.generate_content.call_count, 2)
+        self.assertEqual(gemini_breaker.get_state()['state'], 'open')
+
+        # While open, calls fail fast without reaching the API
+        with self.assertRaises(GeminiUnavailable) as raised:
+            call_gemini_with_retry(model, 'prompt')
+        self.assertEqual(model.generate_content.call_count, 2)
+        self.assertLessEqual(raised.exception.retry_after, 30)
+
+        with patch('core.circuit_breaker.time.time', return_value=time.time() + 31):
+            self.assertEqual(gemini_breaker.get_state()['state'], 'half_open')
+            # Only one caller gets the probe
+            self.assertEqual(gemini_breaker.allow_request(), 0)
+            self.assertGreater(gemini_breaker.allow_request(), 0)
+            gemini_breaker.record_success(latency=1.0)
+        self.assertEqual(gemini_breaker.get_state()['state'], 'closed')
+
+    def test_latency_slo_breaches_count_as_failures(self):
+        gemini_breaker.record_success(latency=6.0)
+        self.assertEqual(gemini_breaker.get_state()['consecutive_failures'], 1)
+        gemini_breaker.record_success(latency=1.0)
+        self.assertEqual(gemini_breaker.get_state()['consecutive_failures'], 0)
+        gemini_breaker.record_success(latency=6.0)
+        gemini_breaker.record_success(latency=7.0)
+        self.assertTrue(gemini_breaker.is_open())
+
+
+@override_settings(GEMINI_RATE_LIMIT_REDIS_URL='', GEMINI_BREAKER_FAILURE_THRESHOLD=1)
+class GeminiResponseCacheTests(TestCase):
+    """Test that identical prompts are answered from the response cache."""
+
+    def setUp(self):
+        caches['ai_responses'].clear()
+        rate_limiter.reset_rate_limiter()
+        gemini_breaker.reset()
+        self.addCleanup(caches['ai_responses'].clear)
+        self.addCleanup(gemini_breaker.reset)
+
+    def test_identical_prompts_reuse_the_response(self):
+        model = MagicMock(model_name='models/test')
+        model.generate_content.return_value = MagicMock(text='Enhanced text')
+
+        self.assertEqual(call_gemini_with_retry(model, 'Enhance:\n  my text', cache_as='enhance_text').text, 'Enhanced text')
+        # Whitespace differences don't change the cache key
+        self.assertEqual(call_gemini_with_retry(model, 'Enhance: my text', cache_as='enhance_text').text, 'Enhanced text')
+        call_gemini_with_retry(model, 'Enhance: other text', cache_as='enhance_text')
+        call_gemini_with_retry(model, 'Enhance: my text')
+        self.assertEqual(model.generate_content.call_count, 3)
+        self.assertEqual(get_cache_stats()['enhance_text'], {'hits': 1, 'misses': 2})
+
+        # Cached responses are still served while the circuit is open
+        gemini_breaker.record_failure()
+        self.assertTrue(gemini_breaker.is_open())
+        self.assertEqual(call_gemini_with_retry(model, 'Enhance: my text', cache_as='enhance_text').text, 'Enhanced text')
+
+    @patch('jobs.matcher._get_gemini_model')
+    def test_unusable_responses_are_not_reused(self, mock_model):
+        from .matcher import generate_job_description
+        mock_model.return_value = model = MagicMock(model_name='models/test')
+        model.generate_content.return_value = MagicMock(text='not json')
+        self.assertEqual(generate_job_description('Python Developer')['description'], '')
+
+        model.generate_content.return_value = MagicMock(text='{"description": "Build APIs", "requirements": "- Python"}')
+        self.assertEqual(generate_job_description('Python Developer')['description'], 'Build APIs')
+        self.assertEqual(generate_job_description('Python Developer')['description'], 'Build APIs')
+        self.assertEqual(model.generate_content.call_count, 2)
+
+
+class JobDetailsCacheTests(TestCase):
+    """Test that structured job requirements are extracted once per job content."""
+
+    def setUp(self):
+        employer_user = User.objects.create_user(username='employer', password='testpass', user_type='employer')
+        employer_profile = EmployerProfile.objects.create(user=employer_user, company_name='Test Corp')
+        self.job = JobPosting.objects.create(
+            employer=employer_profile,
+            title='Python Developer',
+            description='Build APIs',
+            requirements='Python, Django',
+            location='Remote'
+        )
+        seeker_user = User.objects.create_user(username='seeker', password='testpass', user_type='job_seeker')
+        seeker_profile = JobSeekerProfile.objects.create(user=seeker_user, full_name='Test Seeker')
+        self.resume = Resume.objects.create(profile=seeker_profile, title='Test Resume')
+        Skill.objects.create(resume=self.resume, name='Python', category='Backend')
+
+    @patch('jobs.matcher._extract_job_details')
+    def test_details_extracted_once_per_content(self, mock_extract):
+        mock_extract.return_value = {'required_skills': ['Python']}
+        updated_at = self.job.updated_at
+
+        self.assertEqual(get_cached_job_details(self.job), {'required_skills': ['Python']})
+        job = JobPosting.objects.get(id=self.job.id)
+        self.assertEqual(get_cached_job_details(job), {'required_skills': ['Python']})
+
+        self.assertEqual(mock_extract.call_count, 1)
+        # Caching the details must not make existing match scores look stale
+        self.assertEqual(job.updated_at, updated_at)
+
+    @patch('jobs.matcher._extract_job_details')
+    def test_details_invalidated_when_job_text_changes(self, mock_extract):
+        mock_extract.return_value = {'required_skills': ['Python']}
+        get_cached_job_details(self.job)
+
+        job = JobPosting.objects.get(id=self.job.id)
+        job.requirements = 'Python, Django, AWS'
+        job.save()
+        get_cached_job_details(job)
+
+        self.assertEqual(mock_extract.call_count, 2)
+
+    @patch('jobs.matcher._extract_job_details')
+    def test_failed_extraction_is_not_cached(self, mock_extract):
+        mock_extract.return_value = None
+        self.assertIsNone(get_cached_job_details(self.job))
+        self.assertIsNone(JobPosting.objects.get(id=self.job.id).extracted_details)
+
+    @patch('jobs.matcher.score_resume_with_gemini', return_value=72)
+    @patch('jobs.matcher._extract_job_details')
+    def test_match_score_task_reuses_cached_details(self, mock_extract, mock_score):
+        mock_extract.return_value = {'required_skills': ['Python']}
+
+        calculate_and_save_match_score_task(self.resume.id, self.job.id)
+        Skill.objects.create(resume=self.resume, name='Django', category='Backend')
+        calculate_and_save_match_score_task(self.resume.id, self.job.id)
+
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertEqual(mock_score.call_count, 2)
+        self.assertEqual(JobMatchScore.objects.get(resume=self.resume, job_posting=self.job).score, 72)
+
+    @patch('jobs.matcher.score_resume_with_gemini', return_value=72)
+    @patch('jobs.matcher._extract_job_details', return_value={'required_skills': ['Python']})
+    def test_unchanged_content_skips_rescoring(self, mock_extract, mock_score):
+        calculate_and_save_match_score_task(self.resume.id, self.job.id)
+        # Hobbies are not part of the matching text, so the stored score is still current
+        Hobby.objects.create(resume=self.resume, name='Chess')
+        calculate_and_save_match_score_task(self.resume.id, self.job.id)
+        self.assertEqual(mock_score.call_count, 1)
+
+        self.job.requirements = 'Python, Go'
+        self.job.save()
+        calculate_and_save_match_score_task(self.resume.id, self.job.id)
+        self.assertEqual(mock_score.call_count, 2)
+
+    @patch('jobs.matcher.score_resume_with_gemini', side_effect=GeminiRateLimited(25))
+    @patch('jobs.matcher._extract_job_details', return_value={'required_skills': ['Python']})
+    def test_rate_limited_task_is_requeued_with_countdown(self, mock_extract, mock_score):
+        with patch.object(calculate_and_save_match_score_task, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                calculate_and_save_match_score_task(self.resume.id, self.job.id)
+        self.assertEqual(mock_retry.call_args.kwargs['countdown'], 25)
+        self.assertFalse(JobMatchScore.objects.exists())
+
+
+class BatchScoringTests(TestCase):
+    """Test the batched multi-resume scoring mode."""
+
+    def setUp(self):
+        employer_user = User.objects.create_user(username='employer', password='testpass', user_type='employer')
+        employer_profile = EmployerProfile.objects.create(user=employer_user, company_name='Test Corp')
+        self.jobs = [
+            JobPosting.objects.create(
+                employer=employer_profile,
+                title=f'Job {i}',
+                description='Build APIs',
+                requirements='Python',
+                location='Remote',
+                extracted_details={'required_skills': ['Python']},
+            )
+            for i in range(2)
+        ]
+        for job in self.jobs:
+            job.extracted_details_hash = job.get_content_hash()
+            job.save()
+        self.resumes = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'seeker{i}', password='testpass', user_type='job_seeker')
+            profile = JobSeekerProfile.objects.create(user=user, full_name=f'Seeker {i}')
+            self.resumes.append(Resume.objects.create(profile=profile, title=f'Resume {i}'))
+
+    @patch('jobs.matcher._get_gemini_model', return_value=MagicMock())
+    @patch('jobs.matcher._call_gemini_with_retry')
+    def test_batch_response_is_mapped_to_requested_ids(self, mock_call, mock_model):
+        mock_call.return_value = MagicMock(
+            text='```json\n{"scores": {"1": 80, "2": 150, "99": 10, "3": "high", "4": 78.0, "5": true, "6": -3.4}}\n```'
+        )
+        scores = score_resumes_batch_with_gemini({i: 'text' for i in range(1, 7)}, {'required_skills': ['Python']})
+        self.assertEqual(scores, {1: 80, 2: 99, 4: 78, 6: 0})
+        self.assertEqual(mock_call.call_count, 1)
+
+    @patch('jobs.tasks.score_pending_matches_task.delay')
+    @patch('jobs.tasks.score_resume_with_gemini')
+    @patch('jobs.tasks.score_resumes_batch_with_gemini')
+    def test_pending_pairs_are_drained_one_call_per_job(self, mock_batch, mock_single, mock_delay):
+        mock_batch.side_effect = lambda texts, details: {resume_id: 50 for resume_id in texts}
+        enqueue_match_scores((resume.id, job.id) for job in self.jobs for resume in self.resumes)
+        # Re-queuing an already pending pair is a no-op
+        enqueue_match_scores([(self.resumes[0].id, self.jobs[0].id)])
+        self.assertEqual(PendingMatchScore.objects.count(), 6)
+
+        score_pending_matches_task()
+
+        self.assertEqual(mock_batch.call_count, 2)
+        mock_single.assert_not_called()
+        self.assertEqual(JobMatchScore.objects.filter(score=50).count(), 6)
+        self.assertFalse(PendingMatchScore.objects.exists())
+
+    @patch('jobs.tasks.score_pending_matches_task.delay')
+    @patch('jobs.tasks.score_resume_with_gemini', return_value=33)
+    @patch('jobs.tasks.score_resumes_batch_with_gemini', return_value={})
+    def test_resumes_missing_from_batch_fall_back_to_single_scoring(self, mock_batch, mock_single, mock_delay):
+        enqueue_match_scores([(self.resumes[0].id, self.jobs[0].id)])
+        score_pending_matches_task()
+        mock_single.assert_called_once()
+        self.assertEqual(JobMatchScore.objects.get(resume=self.resumes[0], job_posting=self.jobs[0]).score, 33)
+
+    @patch('jobs.tasks.score_pending_matches_task.delay')
+    @patch('jobs.tasks.score_resume_with_gemini')
+    @patch('jobs.tasks.score_resumes_batch_with_gemini')
+    def test_pair_requeued_while_its_batch_is_scored_stays_queued(self, mock_batch, mock_single, mock_delay):
+        pair = (self.resumes[0].id, self.jobs[0].id)
+
+        def score_while_resume_changes(texts, details):
+            # The resume is edited and re-queued while Gemini scores the old content
+            enqueue_match_scores([pair])
+            return {resume_id: 50 for resume_id in texts}
+
+        mock_batch.side_effect = score_while_resume_changes
+        enqueue_match_scores([pair])
+        _score_claimed_batch(*_claim_pending_batch(15))
+
+        # The batch doesn't remove the pair, so the edited resume is scored by a later drain
+        pending = PendingMatchScore.objects.get()
+        self.assertIsNone(pending.claim_token)
+        self.assertFalse(pending.requeued)
+
+    @patch('jobs.tasks.score_pending_matches_task.apply_async')
+    @patch('jobs.tasks.score_pending_matches_task.delay')
+    @patch('jobs.tasks.score_resumes_batch_with_gemini', side_effect=GeminiRateLimited(40))
+    def test_rate_limited_batch_is_released_and_drained_later(self, mock_batch, mock_delay, mock_apply_async):
+        enqueue_match_scores([(self.resumes[0].id, self.jobs[0].id)])
+        score_pending_matches_task()
+        mock_batch.assert_called_once()
+        mock_apply_async.assert_called_once_with(countdown=40)
+        self.assertTrue(PendingMatchScore.objects.filter(claim_token__isnull=True).exists())
+        self.assertFalse(JobMatchScore.objects.exists())
+
+
+class PreScorerTests(TestCase):
+    """Test the local pre-scorer and the two-stage ranking of new jobs."""
+
+    def setUp(self):
+        employer_user = User.objects.create_user(username='employer', password='testpass', user_type='employer')
+        employer_profile = EmployerProfile.objects.create(user=employer_user, company_name='Test Corp')
+        self.job = JobPosting.objects.create(
+            employer=employer_profile,
+            title='Python Developer',
+            description='Build Django REST APIs on PostgreSQL',
+            requirements='Python, Django, PostgreSQL',
+            location='Remote',
+            extracted_details={'required_skills': ['Python', 'Django', 'PostgreSQL']},
+        )
+        self.job.extracted_details_hash = self.job.get_content_hash()
+        self.job.save()
+        self.resumes = []
+        for i, skills in enumerate([['Python', 'Django', 'PostgreSQL'], ['Python'], ['Photoshop', 'Illustrator']]):
+            user = User.objects.create_user(username=f'seeker{i}', password='testpass', user_type='job_seeker')
+            profile = JobSeekerProfile.objects.create(user=user, full_name=f'Seeker {i}')
+            resume = Resume.objects.create(profile=profile, title=f'Resume {i}')
+            for skill in skills:
+                Skill.objects.create(resume=resume, name=skill, category='Tools')
+            self.resumes.append(resume)
+
+    def test_prescore_ranks_relevant_resumes_higher(self):
+        scores = prescore_resumes(
+            'Python Developer building Django APIs',
+            {1: 'Skills: Python, Django, PostgreSQL', 2: 'Skills: Python', 3: 'Skills: Photoshop, Illustrator'},
+            {'required_skills': ['Python', 'Django', 'PostgreSQL']},
+        )
+        self.assertGreater(scores[1], scores[2])
+        self.assertGreater(scores[2], scores[3])
+        self.assertEqual(scores[3], 0)
+        self.assertLessEqual(scores[1], 99)
+
+    def test_prescore_handles_empty_texts(self):
+        self.assertEqual(prescore_resumes('', {1: ''}), {1: 0})
+        self.assertEqual(prescore_resumes('Python', {}), {})
+
+    @override_settings(MATCH_SCORE_AI_TOP_K=1)
+    @patch('jobs.tasks.enqueue_match_scores')
+    def test_ranking_stores_provisional_scores_and_queues_top_k(self, mock_enqueue):
+        rank_resumes_for_job_task(self.job.id)
+
+        scores = JobMatchScore.objects.filter(job_posting=self.job)
+        self.assertEqual(scores.count(), 3)
+        self.assertTrue(all(score.is_provisional for score in scores))
+        queued = list(mock_enqueue.call_args[0][0])
+        self.assertEqual(queued, [(self.resumes[0].id, self.job.id)])
+
+    @patch('jobs.tasks.enqueue_match_scores')
+    @patch('jobs.matcher.score_resume_with_gemini', return_value=88)
+    def test_gemini_score_replaces_provisional_score(self, mock_score, mock_enqueue):
+        rank_resumes_for_job_task(self.job.id)
+        calculate_and_save_match_score_task(self.resumes[1].id, self.job.id)
+
+        score = JobMatchScore.objects.get(resume=self.resumes[1], job_posting=self.job)
+        self.assertEqual(score.score, 88)
+        self.assertFalse(score.is_provisional)
+
+        # Re-ranking keeps Gemini scores that are newer than the job
+        rank_resumes_for_job_task(self.job.id)
+        self.assertEqual(JobMatchScore.objects.get(resume=self.resumes[1], job_posting=self.job).score, 88)
+
+        # Section edits clear the stored resume hash; an unchanged resume still keeps its Gemini score
+        Resume.objects.filter(id=self.resumes[1].id).update(content_hash=None)
+        rank_resumes_for_job_task(self.job.id)
+        score = JobMatchScore.objects.get(resume=self.resumes[1], job_posting=self.job)
+        self.assertEqual(score.score, 88)
+        self.assertFalse(score.is_provisional)
+
+    @override_settings(MATCH_SCORE_AI_TOP_K=2)
+    def test_shortlist_cutoffs_are_computed_for_all_jobs_in_one_query(self):
+        other_job = JobPosting.objects.create(
+            employer=self.job.employer, title='Designer', description='Design', requirements='Figma', location='Remote'
+        )
+        for resume, score in zip(self.resumes, [70, 40, 55]):
+            JobMatchScore.objects.create(resume=resume, job_posting=self.job, score=score)
+        JobMatchScore.objects.create(resume=self.resumes[0], job_posting=other_job, score=10)
+
+        with self.assertNumQueries(1):
+            cutoffs = get_shortlist_cutoffs([self.job.id, other_job.id])
+        self.assertEqual(cutoffs, {self.job.id: 55})
+        self.assertTrue(is_ai_shortlisted(55, cutoffs.get(self.job.id)))
+        self.assertFalse(is_ai_shortlisted(54, cutoffs.get(self.job.id)))
+        self.assertTrue(is_ai_shortlisted(0, cutoffs.get(other_job.id)))
+
+    @patch('jobs.tasks.enqueue_match_scores')
+    def test_resume_refresh_only_touches_jobs_with_scores(self, mock_enqueue):
+        other_job = JobPosting.objects.create(
+            employer=self.job.employer, title='Designer', description='Design', requirements='Figma', location='Remote'
+        )
+        unscored_job = JobPosting.objects.create(
+            employer=self.job.employer, title='Tester', description='Test', requirements='QA', location='Remote'
+        )
+        resume = self.resumes[0]
+        JobMatchScore.objects.create(resume=resume, job_posting=self.job, score=90, is_provisional=False)
+        JobMatchScore.objects.create(resume=resume, job_posting=other_job, score=40, is_provisional=True)
+
+        refresh_resume_match_scores(resume)
+
+        queued = list(mock_enqueue.call_args[0][0])
+        self.assertIn((resume.id, self.job.id), queued)
+        self.assertNotIn((resume.id, unscored_job.id), queued)
+        self.assertFalse(JobMatchScore.objects.filter(job_posting=unscored_job).exists())
+        # The provisional score is recomputed locally
+        self.assertTrue(JobMatchScore.objects.get(resume=resume, job_posting=other_job).is_provisional)
+
+
+class ApplicationVersionTests(TestCase):
+    """Test that applications are pinned to immutable resume versions and scored against them."""
+
+    def setUp(self):
+        employer_user = User.objects.create_user(username='employer', password='testpass', user_type='employer')
+        employer_profile = EmployerProfile.objects.create(user=employer_user, company_name='Test Corp')
+        self.job = JobPosting.objects.create(
+            employer=employer_profile,
+            title='Python Developer',
+            description='Build Django APIs',
+            requirements='Python, Django',
+            location='Remote',
+        )
+        seeker_user = User.objects.create_user(username='seeker', password='testpass', user_type='job_seeker')
+        self.profile = JobSeekerProfile.objects.create(user=seeker_user, full_name='Test Seeker')
+        self.resume = Resume.objects.create(profile=self.profile, title='Test Resume')
+        Skill.objects.create(resume=self.resume, name='Python', category='Backend')
+
+    def test_version_is_reused_until_content_changes(self):
+        version = get_or_create_resume_version(self.resume)
+        self.assertEqual(get_or_create_resume_version(Resume.objects.get(id=self.resume.id)), version)
+
+        Skill.objects.create(resume=self.resume, name='Django', category='Backend')
+        new_version = get_or_create_resume_version(Resume.objects.get(id=self.resume.id))
+        self.assertNotEqual(new_version, version)
+        # The earlier version keeps the content it was created with
+        self.assertNotIn('Django', load_version_document(version).text)
+        self.assertIn('Django', load_version_document(new_version).text)
+
+    @patch('jobs.tasks.score_application_task.delay')
+    def test_application_score_ignores_later_resume_edits(self, mock_delay):
+        version = get_or_create_resume_version(self.resume)
+        application = Application.objects.create(
+            job_posting=self.job, applicant=self.profile, resume=self.resume, resume_version=version
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_application_score(application)
+        mock_delay.assert_called_once_with(application.id)
+        self.assertTrue(application.match_score_is_provisional)
+
+        with patch('jobs.matcher.score_resume_with_gemini', return_value=81):
+            score_application_task(application.id)
+        Skill.objects.create(resume=self.resume, name='Go', category='Backend')
+
+        application = Application.objects.get(id=application.id)
+        refresh_application_score(application)
+        self.assertEqual(application.match_score, 81)
+        self.assertFalse(application.match_score_is_provisional)
+        self.assertEqual(application.get_resume_version(), version)
+        mock_delay.assert_called_once()
+
+    def test_legacy_application_is_pinned_on_first_use(self):
+        application = Application.objects.create(job_posting=self.job, applicant=self.profile, resume=self.resume)
+        version = application.get_resume_version()
+        self.assertIsNotNone(version)
+        self.assertEqual(Application.objects.get(id=application.id).resume_version, version)
+
+    @patch('jobs.tasks.generate_interview_prep_task.delay')
+    @patch('jobs.tasks.generate_interview_prep', side_effect=GeminiRateLimited(45))
+    def test_interview_prep_is_requeued_then_falls_back_to_local_questions(self, mock_generate, mock_delay):
+        version = get_or_create_resume_version(self.resume)
+        application = Application.objects.create(
+            job_posting=self.job, applicant=self.profile, resume=self.resume, resume_version=version
+        )
+        mock_delay.return_value.id = 'task-1'
+        with self.captureOnCommitCallbacks(execute=True):
+            prep = get_or_start_interview_prep(application, version)
+        mock_delay.assert_called_once_with(prep.id)
+        self.assertEqual(InterviewPrep.objects.get(id=prep.id).task_id, 'task-1')
+        # Asking again while it is generating doesn't queue a second task
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(get_or_start_interview_prep(application, version), prep)
+        mock_delay.assert_called_once()
+
+        with patch.object(generate_interview_prep_task, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                generate_interview_prep_task(prep.id)
+        self.assertEqual(mock_retry.call_args.kwargs['countdown'], 45)
+        self.assertEqual(InterviewPrep.objects.get(id=prep.id).status, 'pending')
+
+        with override_settings(GEMINI_RATE_LIMIT_MAX_REQUEUES=0):
+            generate_interview_prep_task(prep.id)
+        prep.refresh_from_db()
+        self.assertEqual(prep.status, 'completed')
+        self.assertTrue(prep.is_fallback)
+        self.assertEqual(len(prep.questions), 5)
@@ -1,13 +1,19 @@
 """
 View tests for jobs app with mocked AI calls.
 """
-from django.test import TestCase, Client
+import json
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.http import HttpResponse
 from unittest.mock import patch, MagicMock
-from .models import JobPosting, Application, Interview, InterviewSlot
+from .models import JobPosting, Application, Interview, InterviewSlot, InterviewPrep
+from .tasks import generate_interview_prep_task, refresh_application_scores_task
 from users.models import EmployerProfile, JobSeekerProfile
-from resumes.models import Resume
+from resumes.models import Resume, Skill
+from core.ai_gateway import GeminiUnavailable
+from core.circuit_breaker import gemini_breaker
 
 User = get_user_model()
 
@@ -109,6 +115,69 @@ class AIAPITests(TestCase):
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertEqual(data['status'], 'success')
+
+    @override_settings(JOBS_FEATURE_ENABLED=True)
+    @patch('jobs.matcher._get_gemini_model', return_value=MagicMock())
+    @patch('jobs.matcher._call_gemini_with_retry', side_effect=GeminiUnavailable(30))
+    def test_ai_endpoints_fall_back_to_local_results_while_circuit_is_open(self, mock_gemini, mock_model):
+        """Test that AI endpoints answer with local results instead of errors when Gemini is unavailable."""
+        self.addCleanup(gemini_breaker.reset)
+        for _ in range(settings.GEMINI_BREAKER_FAILURE_THRESHOLD):
+            gemini_breaker.record_failure()
+        self.assertTrue(gemini_breaker.is_open())
+
+        self.client.login(username='employer', password='testpass')
+        response = self.client.post(
+            reverse('jobs:generate-job-description'),
+            data={'title': 'Python Developer', 'keywords': 'Django, AWS'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['degraded'])
+        self.assertIn('Python Developer', data['description'])
+        self.assertIn('Hands-on experience with AWS', data['requirements'])
+
+        resume = Resume.objects.create(profile=self.seeker_profile, title='Test Resume')
+        Skill.objects.create(resume=resume, name='Python', category='Backend')
+        application = Application.objects.create(job_posting=self.job, applicant=self.seeker_profile, status='Interview')
+        response = self.client.post(
+            reverse('jobs:generate-applicant-summary'),
+            data={'application_id': application.id},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['degraded'])
+        self.assertTrue(data['summary'])
+
+        self.client.login(username='seeker', password='testpass')
+        # Enhancement has no local fallback, so it is refused outright
+        response = self.client.post(
+            reverse('resumes:enhance-api'),
+            data={'text': 'Wrote code', 'context': 'experience_description'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()['degraded'])
+
+        response = self.client.post(
+            reverse('jobs:generate-interview-prep'),
+            data={'application_id': application.id},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['status'], 'pending')
+
+        generate_interview_prep_task(InterviewPrep.objects.get(application=application).id)
+        response = self.client.post(
+            reverse('jobs:generate-interview-prep'),
+            data={'application_id': application.id},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['degraded'])
+        self.assertEqual(len(data['questions']), 5)
     
     @patch('jobs.matcher._call_gemini_with_retry')
     def test_generate_applicant_summary_api(self, mock_gemini):
@@ -134,8 +203,10 @@ class AIAPITests(TestCase):
         data = response.json()
         self.assertEqual(data['status'], 'success')
     
+    @override_settings(JOBS_FEATURE_ENABLED=True)
+    @patch('jobs.matcher._get_gemini_model', return_value=MagicMock())
     @patch('jobs.matcher._call_gemini_with_retry')
-    def test_generate_interview_prep_api(self, mock_gemini):
+    def test_generate_interview_prep_api(self, mock_gemini, mock_model):
         """Test AI interview preparation endpoint."""
         resume = Resume.objects.create(profile=self.seeker_profile, title='Test Resume')
         application = Application.objects.create(
@@ -149,15 +220,54 @@ class AIAPITests(TestCase):
         mock_gemini.return_value = mock_response
         
         self.client.login(username='seeker', password='testpass')
-        response = self.client.post(
-            reverse('jobs:generate-interview-prep'),
-            data={'application_id': application.id},
-            content_type='application/json'
-        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse('jobs:generate-interview-prep'),
+                data={'application_id': application.id},
+                content_type='application/json'
+            )
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(len(callbacks), 1)
+        
+        generate_interview_prep_task(InterviewPrep.objects.get(application=application).id)
+        response = self.client.get(reverse('jobs:interview-prep-status', args=[application.id]))
         
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['questions'][1], {'question': 'Q2', 'answer': 'A2'})
+        self.assertFalse(data['degraded'])
+
+    @override_settings(JOBS_FEATURE_ENABLED=True)
+    @patch('jobs.matcher._get_gemini_model', return_value=MagicMock())
+    @patch('jobs.matcher._call_gemini_with_retry')
+    def test_interview_prep_page_is_rendered_from_stored_questions(self, mock_gemini, mock_model):
+        """Test that the interview prep page shows progress, then stored questions without calling Gemini again."""
+        Resume.objects.create(profile=self.seeker_profile, title='Test Resume')
+        application = Application.objects.create(job_posting=self.job, applicant=self.seeker_profile, status='Interview')
+        mock_response = MagicMock()
+        mock_response.text = '{"questions": [{"question": "Why Django?", "answer": "Situation: ..."}]}'
+        mock_gemini.return_value = mock_response
+
+        self.client.login(username='seeker', password='testpass')
+        response = self.client.get(reverse('jobs:interview-prep', args=[application.id]))
+        self.assertContains(response, 'Preparing Your Interview Questions')
+        self.assertContains(response, reverse('jobs:interview-prep-status', args=[application.id]))
+        mock_gemini.assert_not_called()
+
+        generate_interview_prep_task(InterviewPrep.objects.get(application=application).id)
+        for _ in range(2):
+            response = self.client.get(reverse('jobs:interview-prep', args=[application.id]))
+            self.assertContains(response, 'Why Django?')
+        self.assertEqual(mock_gemini.call_count, 1)
+        self.assertEqual(InterviewPrep.objects.count(), 1)
+
+        # Editing the job gives the application a new prep
+        self.job.requirements = 'Python, Django, PostgreSQL'
+        self.job.save()
+        response = self.client.get(reverse('jobs:interview-prep', args=[application.id]))
+        self.assertContains(response, 'Preparing Your Interview Questions')
+        self.assertEqual(InterviewPrep.objects.count(), 2)
 
 
 class AJAXEndpointTests(TestCase):
@@ -333,6 +443,39 @@ class JobStatsViewTests(TestCase):
         response = self.client.get(reverse('jobs:job-stats', args=[self.job.id]))
         self.assertEqual(response.status_code, 200)
     
+    @override_settings(JOBS_FEATURE_ENABLED=True)
+    @patch('jobs.views.refresh_application_scores_task.delay')
+    @patch('jobs.views.render', return_value=HttpResponse())
+    def test_job_stats_score_distribution_covers_unscored_applications(self, mock_render, mock_delay):
+        """Test that current scores are counted and the other applications are scored in one background task."""
+        Resume.objects.create(profile=self.seeker_profile, title='Test Resume')
+        no_resume_user = User.objects.create_user(username='noresume', email='noresume@test.com', password='testpass', user_type='job_seeker')
+        no_resume_application = Application.objects.create(
+            job_posting=self.job,
+            applicant=JobSeekerProfile.objects.create(user=no_resume_user),
+            status='Submitted'
+        )
+        self.client.login(username='employer', password='testpass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('jobs:job-stats', args=[self.job.id]))
+
+        distribution = json.loads(mock_render.call_args[0][2]['score_distribution'])
+        self.assertEqual(sum(distribution.values()), 0)
+        mock_delay.assert_called_once()
+        self.assertCountEqual(mock_delay.call_args[0][0], [self.application.id, no_resume_application.id])
+
+        # The task pins and scores the application with a resume; the one without stays unscored
+        refresh_application_scores_task(mock_delay.call_args[0][0])
+        self.assertIsNotNone(Application.objects.get(id=self.application.id).match_score)
+        self.assertIsNone(Application.objects.get(id=no_resume_application.id).match_score)
+
+        mock_delay.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('jobs:job-stats', args=[self.job.id]))
+        distribution = json.loads(mock_render.call_args[0][2]['score_distribution'])
+        self.assertEqual(sum(distribution.values()), 1)
+        self.assertEqual(mock_delay.call_args[0][0], [no_resume_application.id])
+
     def test_job_stats_only_shows_own_job(self):
         """Test that employers can only view stats for their own jobs."""
         other_employer = User.objects.create_user(username='other', email='other@test.com', password='testpass', user_type='employer')
@@ -16,6 +16,7 @@ from .views import (
     generate_job_description_api,
     generate_applicant_summary_api,
     generate_interview_prep_api,
+    interview_prep_status_api,
     interview_prep_view,
     company_profile_view,
     download_interview_calendar,
@@ -41,6 +42,7 @@ urlpatterns = [
     path('api/generate-job-description/', generate_job_description_api, name='generate-job-description'),
     path('api/generate-applicant-summary/', generate_applicant_summary_api, name='generate-applicant-summary'),
     path('api/generate-interview-prep/', generate_interview_prep_api, name='generate-interview-prep'),
+    path('api/interview-prep/<int:application_id>/status/', interview_prep_status_api, name='interview-prep-status'),
     path('application/<int:application_id>/interview-prep/', interview_prep_view, name='interview-prep'),
     path('company/<int:employer_id>/', company_profile_view, name='company-profile'),
     path('interview/<int:interview_id>/download-calendar/', download_interview_calendar, name='download-interview-calendar'),
@@ -4,19 +4,21 @@ from django.contrib import messages
 from django.utils import timezone
 from django import forms
 from django.urls import reverse
+from django.db import transaction
 from django.db.models import Q, Prefetch
 from django.http import HttpResponse, JsonResponse
 from icalendar import Calendar, Event
 from datetime import timedelta
-from django.conf import settings
-from django.template.loader import get_template
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Celery Task
-from .tasks import calculate_and_save_match_score_task
+from .tasks import enqueue_match_scores, rank_resumes_for_job_task, save_provisional_scores, get_shortlist_cutoffs, is_ai_shortlisted, refresh_application_score, refresh_application_scores_task, get_or_start_interview_prep
+from .matcher import get_stored_job_details
+from .fallbacks import local_applicant_summary, local_job_description
+from .prescorer import prescore_jobs
 
 WEASY_AVAILABLE = False
 try:
@@ -30,8 +32,11 @@ except (ImportError, OSError):
 # Models
 from .models import JobPosting, Application, Notification, Interview, InterviewSlot, JobMatchScore
 from users.models import EmployerProfile, JobSeekerProfile
-from resumes.models import Resume, Experience, Education, Skill, Project, Certification, Achievement, Language, Hobby
-from resumes.parser import get_full_resume_text
+from resumes.models import Resume, ResumePDFGeneration
+from core.utils import ranged_file_response
+from resumes.parser import get_full_resume_text, get_resume_content_hash
+from resumes.documents import get_or_create_resume_version, load_version_document, build_resume_context
+from resumes.rendering import render_resume_html, write_resume_pdf
 # --- THE FIX IS HERE ---
 from resumes.templatetags.resume_extras import get_resume_completeness_errors
 
@@ -61,11 +66,8 @@ def post_job_view(request):
             job_posting = form.save(commit=False)
             job_posting.employer = employer_profile
             job_posting.save()
-            # Trigger match score calculation for all existing resumes
-            from resumes.models import Resume
-            resume_ids = Resume.objects.values_list('id', flat=True)
-            for resume_id in resume_ids:
-                calculate_and_save_match_score_task.delay(resume_id, job_posting.id)
+            # Pre-score all existing resumes locally; only the best candidates are scored by Gemini
+            rank_resumes_for_job_task.delay(job_posting.id)
             messages.success(request, "Your job has been posted successfully!")
             return redirect('jobs:my-jobs')
     else:
@@ -100,14 +102,16 @@ def generate_job_description_api(request):
                 company_tone
             )
             
-            if result.get('description') and result.get('requirements'):
-                return JsonResponse({
-                    'status': 'success',
-                    'description': result['description'],
-                    'requirements': result['requirements']
-                })
-            else:
-                return JsonResponse({'error': 'Failed to generate job description.'}, status=500)
+            # Gemini returns nothing straight away while its circuit is open; use the local template
+            degraded = not (result.get('description') and result.get('requirements'))
+            if degraded:
+                result = local_job_description(job_title, keywords, responsibilities, experience_level)
+            return JsonResponse({
+                'status': 'success',
+                'description': result['description'],
+                'requirements': result['requirements'],
+                'degraded': degraded,
+            })
                 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON data.'}, status=400)
@@ -138,15 +142,13 @@ def generate_applicant_summary_api(request):
             if application.job_posting.employer.user != request.user:
                 return JsonResponse({'error': 'Unauthorized'}, status=403)
             
-            # Get applicant's latest resume
-            try:
-                applicant_resume = Resume.objects.filter(profile=application.applicant).latest('created_at')
-            except Resume.DoesNotExist:
+            # Get the resume version submitted with the application
+            resume_version = application.get_resume_version()
+            if not resume_version:
                 return JsonResponse({'error': 'Applicant has no resume.'}, status=404)
             
             # Get resume text and job description
-            from resumes.parser import get_full_resume_text
-            resume_text = get_full_resume_text(applicant_resume)
+            resume_text = load_version_document(resume_version).text
             job_description = f"{application.job_posting.title}\n\n{application.job_posting.description}\n\n{application.job_posting.requirements}"
             
             if not resume_text.strip():
@@ -154,14 +156,16 @@ def generate_applicant_summary_api(request):
             
             from .matcher import generate_applicant_summary
             summary = generate_applicant_summary(resume_text, job_description)
-            
-            if summary:
-                return JsonResponse({
-                    'status': 'success',
-                    'summary': summary
-                })
-            else:
-                return JsonResponse({'error': 'Failed to generate summary.'}, status=500)
+            degraded = not summary
+            if degraded:
+                summary = local_applicant_summary(
+                    resume_text, application.job_posting.get_match_text(), get_stored_job_details(application.job_posting)
+                )
+            return JsonResponse({
+                'status': 'success',
+                'summary': summary,
+                'degraded': degraded,
+            })
                 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON data.'}, status=400)
@@ -171,10 +175,25 @@ def generate_applicant_summary_api(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
+def _interview_prep_payload(application, prep):
+    """JSON body describing an InterviewPrep for the interview prep API and its status endpoint."""
+    if prep.status == 'completed':
+        return {'status': 'success', 'questions': prep.questions, 'degraded': prep.is_fallback}
+    if prep.status == 'failed':
+        return {'status': 'failed', 'error': "We couldn't generate interview questions at this time. Please try again later."}
+    return {
+        'status': 'pending',
+        'status_url': reverse('jobs:interview-prep-status', args=[application.id]),
+    }
+
 @job_feature_disabled
 @login_required
 def generate_interview_prep_api(request):
-    """AJAX endpoint to generate AI interview preparation questions."""
+    """
+    AJAX endpoint returning an application's interview preparation questions. Questions are
+    generated in the background on first request; until then the response has status 'pending'
+    and a status_url to poll.
+    """
     if request.user.user_type != 'job_seeker':
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
@@ -188,30 +207,16 @@ def generate_interview_prep_api(request):
             
             application = get_object_or_404(Application, id=application_id, applicant__user=request.user)
             
-            # Get applicant's latest resume
-            try:
-                applicant_resume = Resume.objects.filter(profile=application.applicant).latest('created_at')
-            except Resume.DoesNotExist:
+            # Get the resume version submitted with the application
+            resume_version = application.get_resume_version()
+            if not resume_version:
                 return JsonResponse({'error': 'You have no resume. Please create one first.'}, status=404)
             
-            # Get resume text and job description
-            from resumes.parser import get_full_resume_text
-            resume_text = get_full_resume_text(applicant_resume)
-            job_description = f"{application.job_posting.title}\n\n{application.job_posting.description}\n\n{application.job_posting.requirements}"
-            
-            if not resume_text.strip():
+            if not load_version_document(resume_version).text.strip():
                 return JsonResponse({'error': 'Resume is empty.'}, status=400)
             
-            from .matcher import generate_interview_prep
-            result = generate_interview_prep(resume_text, job_description)
-            
-            if result.get('questions') and len(result['questions']) > 0:
-                return JsonResponse({
-                    'status': 'success',
-                    'questions': result['questions']
-                })
-            else:
-                return JsonResponse({'error': 'Failed to generate interview prep questions.'}, status=500)
+            prep = get_or_start_interview_prep(application, resume_version)
+            return JsonResponse(_interview_prep_payload(application, prep))
                 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON data.'}, status=400)
@@ -221,75 +226,57 @@ def generate_interview_prep_api(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
+@job_feature_disabled
+@login_required
+def interview_prep_status_api(request, application_id):
+    """Polled while an application's interview prep questions are being generated."""
+    if request.user.user_type != 'job_seeker':
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    application = get_object_or_404(Application, id=application_id, applicant__user=request.user)
+    resume_version = application.get_resume_version()
+    if not resume_version:
+        return JsonResponse({'error': 'You have no resume. Please create one first.'}, status=404)
+
+    prep = get_or_start_interview_prep(application, resume_version)
+    return JsonResponse(_interview_prep_payload(application, prep))
+
 @job_feature_disabled
 @login_required
 def interview_prep_view(request, application_id):
-    """Dedicated page to display AI-generated interview preparation questions."""
+    """
+    Dedicated page to display AI-generated interview preparation questions. The questions are
+    stored per resume version and job content; while they are generated in the background the
+    page shows progress and reloads itself once they are ready.
+    """
     if request.user.user_type != 'job_seeker':
         messages.error(request, "This page is for job seekers only.")
         return redirect('home')
     
     application = get_object_or_404(Application, id=application_id, applicant__user=request.user)
     
-    # Get applicant's latest resume
-    try:
-        applicant_resume = Resume.objects.filter(profile=application.applicant).latest('created_at')
-    except Resume.DoesNotExist:
+    # Get the resume version submitted with the application
+    resume_version = application.get_resume_version()
+    if not resume_version:
         messages.error(request, "You have no resume. Please create one first.")
         return redirect('resumes:resume-dashboard')
     
-    # Get resume text and job description
-    resume_text = get_full_resume_text(applicant_resume)
-    job_description = f"{application.job_posting.title}\n\n{application.job_posting.description}\n\n{application.job_posting.requirements}"
-    
-    if not resume_text.strip():
+    if not load_version_document(resume_version).text.strip():
         messages.error(request, "Resume is empty.")
         return redirect('resumes:resume-dashboard')
     
-    # Generate interview prep questions
-    # This may take a few seconds, so we show a loading state via button disable
-    try:
-        from .matcher import generate_interview_prep
-        result = generate_interview_prep(resume_text, job_description)
-        questions = result.get('questions', []) if result else []
-        
-        # Ensure questions are properly formatted (list of dicts)
-        if questions:
-            # Convert to list of dicts if needed
-            formatted_questions = []
-            for q in questions:
-                if isinstance(q, dict):
-                    # Ensure both question and answer keys exist - try multiple key variations
-                    question_text = (q.get('question') or q.get('Question') or 
-                                   q.get('q') or q.get('Q') or '')
-                    answer_text = (q.get('answer') or q.get('Answer') or 
-                                 q.get('a') or q.get('A') or '')
-                    formatted_questions.append({
-                        'question': str(question_text) if question_text else '',
-                        'answer': str(answer_text) if answer_text else ''
-                    })
-                else:
-                    # Handle case where it might be a different structure
-                    formatted_questions.append({
-                        'question': str(q) if q else '',
-                        'answer': ''
-                    })
-            questions = formatted_questions
-            logger.info(f"Formatted {len(questions)} questions for interview prep")
-            # Debug: Log first question structure
-            if questions:
-                logger.info(f"First question structure: {questions[0]}")
-                logger.info(f"First question keys: {questions[0].keys() if isinstance(questions[0], dict) else 'Not a dict'}")
-    except Exception as e:
-        logger.error(f"Error generating interview prep: {e}")
-        questions = []
-        messages.warning(request, "There was an issue generating interview questions. Please try again.")
+    prep = get_or_start_interview_prep(application, resume_version)
+    questions = prep.questions if prep.status == 'completed' else []
+    if prep.status == 'completed' and prep.is_fallback:
+        messages.info(request, "AI interview prep is temporarily unavailable, so these are common questions for this role.")
     
     context = {
         'application': application,
         'job_posting': application.job_posting,
         'questions': questions,
-        'resume': applicant_resume,
+        'generating': prep.status in ('pending', 'processing'),
+        'status_url': reverse('jobs:interview-prep-status', args=[application.id]),
+        'resume': resume_version,
     }
     
     return render(request, 'jobs/interview_prep.html', context)
@@ -321,6 +308,8 @@ def edit_job_view(request, job_id):
         form = JobPostingForm(request.POST, instance=job)
         if form.is_valid():
             form.save()
+            if {'title', 'description', 'requirements'} & set(form.changed_data):
+                rank_resumes_for_job_task.delay(job.id)
             messages.success(request, "Job posting updated successfully.")
             return redirect('jobs:my-jobs')
     else:
@@ -398,23 +387,56 @@ def job_list_view(request):
             existing_scores = JobMatchScore.objects.filter(
                 resume=applicant_resume, 
                 job_posting_id__in=job_ids
-            ).values('job_posting_id', 'score', 'last_calculated')
+            ).values('job_posting_id', 'score', 'is_provisional', 'resume_hash', 'job_hash')
             
             scores_map = {item['job_posting_id']: item for item in existing_scores}
 
+            # A score is stale when the content it was calculated from has changed
+            resume_hash = get_resume_content_hash(applicant_resume)
+            job_hashes = {job.id: job.get_content_hash() for job in jobs}
+
+            def is_stale(job):
+                cached_score_data = scores_map.get(job.id)
+                return (not cached_score_data or 
+                        cached_score_data['resume_hash'] != resume_hash or 
+                        cached_score_data['job_hash'] != job_hashes[job.id])
+
+            # Missing and outdated provisional scores are recomputed locally right away
+            local_jobs = [
+                job for job in jobs
+                if is_stale(job) and (job.id not in scores_map or scores_map[job.id]['is_provisional'])
+            ]
+            local_scores = {}
+            cutoffs = {}
+            if local_jobs:
+                local_scores = prescore_jobs(
+                    get_full_resume_text(applicant_resume),
+                    {job.id: job.get_match_text() for job in local_jobs},
+                    {job.id: get_stored_job_details(job) for job in local_jobs},
+                )
+                save_provisional_scores(
+                    {(applicant_resume.id, job_id): score for job_id, score in local_scores.items()},
+                    resume_hashes={applicant_resume.id: resume_hash},
+                    job_hashes=job_hashes,
+                )
+                cutoffs = get_shortlist_cutoffs(local_scores)
+
+            ai_pairs = []
             for job in jobs:
                 cached_score_data = scores_map.get(job.id)
-                
-                is_stale = (not cached_score_data or 
-                            applicant_resume.updated_at > cached_score_data['last_calculated'] or 
-                            job.updated_at > cached_score_data['last_calculated'])
+                if job.id in local_scores:
+                    score, is_provisional = local_scores[job.id], True
+                    # New pairs go to Gemini only if they would rank among the job's best candidates
+                    if not cached_score_data and is_ai_shortlisted(score, cutoffs.get(job.id)):
+                        ai_pairs.append((applicant_resume.id, job.id))
+                else:
+                    score, is_provisional = cached_score_data['score'], cached_score_data['is_provisional']
+                    if is_stale(job):
+                        ai_pairs.append((applicant_resume.id, job.id))
+                jobs_with_scores.append({'job': job, 'score': score, 'is_provisional': is_provisional})
 
-                if is_stale:
-                    # Trigger background task instead of calculating here
-                    calculate_and_save_match_score_task.delay(applicant_resume.id, job.id)
-                
-                score = cached_score_data['score'] if cached_score_data else 0
-                jobs_with_scores.append({'job': job, 'score': score})
+            # Trigger background scoring instead of calculating here
+            enqueue_match_scores(ai_pairs)
 
             return render(request, 'jobs/job_list.html', {
                 'jobs_with_scores': jobs_with_scores,
@@ -484,12 +506,15 @@ def apply_for_job_view(request, job_id):
 
     if request.method == 'POST':
         template_choice = request.POST.get('template_choice', 'classic')
-        Application.objects.create(
+        application = Application.objects.create(
             job_posting=job, 
             applicant=applicant_profile,
-            resume=applicant_resume,  # Save the specific resume version
+            resume=applicant_resume,
+            # Pin a frozen copy so later edits don't change what the employer sees or how it was scored
+            resume_version=get_or_create_resume_version(applicant_resume),
             resume_template=template_choice
         )
+        refresh_application_score(application)
         
         notification_link = reverse('jobs:view-applicants', args=[job.id])
         Notification.objects.create(
@@ -527,31 +552,27 @@ def view_applicants_view(request, job_id):
     job = get_object_or_404(JobPosting, id=job_id, employer=request.user.employerprofile)
     
     applications = Application.objects.filter(job_posting=job).select_related(
-        'applicant__user'
+        'applicant__user', 'job_posting', 'resume_version'
     ).prefetch_related(
         Prefetch('interview', queryset=Interview.objects.all())
     )
     
+    job_hash = job.get_content_hash()
     ranked_applicants = []
     for app in applications:
-        try:
-            applicant_resume = Resume.objects.filter(profile=app.applicant).latest('created_at')
-            
-            cached_score_data = JobMatchScore.objects.filter(resume=applicant_resume, job_posting=job).first()
-            
-            is_stale = (not cached_score_data or 
-                        applicant_resume.updated_at > cached_score_data.last_calculated or 
-                        job.updated_at > cached_score_data.last_calculated)
-
-            if is_stale:
-                calculate_and_save_match_score_task.delay(applicant_resume.id, job.id)
-
-            score = cached_score_data.score if cached_score_data else 0
-            interview = getattr(app, 'interview', None)
-            
-            ranked_applicants.append({'application': app, 'score': score, 'interview': interview})
-        except Resume.DoesNotExist:
-            ranked_applicants.append({'application': app, 'score': 0, 'interview': None})
+        if not app.get_resume_version():
+            ranked_applicants.append({'application': app, 'score': 0, 'is_provisional': False, 'interview': None})
+            continue
+
+        # Scores belong to the submitted resume version, so later resume edits never make them stale
+        refresh_application_score(app, job_hash)
+        interview = getattr(app, 'interview', None)
+        ranked_applicants.append({
+            'application': app,
+            'score': app.match_score or 0,
+            'is_provisional': app.match_score_is_provisional,
+            'interview': interview,
+        })
 
     ranked_applicants.sort(key=lambda x: x['score'], reverse=True)
 
@@ -592,55 +613,54 @@ def view_applicant_resume(request, application_id):
         messages.error(request, "You are not authorized to view this resume.")
         return redirect('home')
     
-    # Use the specific resume from the application, or fallback to latest if not set
-    if application.resume:
-        resume = application.resume
-    else:
-        # Fallback for old applications that don't have resume linked
-        try:
-            resume = Resume.objects.filter(profile=application.applicant).latest('created_at')
-        except Resume.DoesNotExist:
-            messages.error(request, "The applicant does not have a resume to display.")
-            return redirect('jobs:view-applicants', job_id=application.job_posting.id)
+    resume_version = application.get_resume_version()
+    if not resume_version:
+        messages.error(request, "The applicant does not have a resume to display.")
+        return redirect('jobs:view-applicants', job_id=application.job_posting.id)
 
     template_name = application.resume_template
-    
-    skills_by_category = {}
-    skills_qs = Skill.objects.filter(resume=resume).order_by('category')
-    for skill in skills_qs:
-        category = skill.get_category_display()
-        if category not in skills_by_category:
-            skills_by_category[category] = []
-        skills_by_category[category].append(skill.name)
+    document = load_version_document(resume_version)
+    filename = f"{document.profile.full_name}_resume.pdf"
+
+    # Versions never change, so a PDF rendered once for this version and template can be served again
+    cached = ResumePDFGeneration.objects.filter(
+        resume_version=resume_version, template_name=template_name, status='completed'
+    ).first()
+    if cached and cached.has_pdf:
+        try:
+            return ranged_file_response(request, cached.open_pdf(), filename, as_attachment=False)
+        except FileNotFoundError:
+            logger.warning(f"Cached PDF for resume version {resume_version.id} is missing from storage; regenerating.")
 
-    context = {
-        'resume': resume,
-        'experiences': Experience.objects.filter(resume=resume).order_by('-start_date'),
-        'educations': Education.objects.filter(resume=resume).order_by('-start_date'),
-        'skills_by_category': skills_by_category,
-        'projects': Project.objects.filter(resume=resume),
-        'certifications': Certification.objects.filter(resume=resume),
-        'achievements': Achievement.objects.filter(resume=resume),
-        'languages': Language.objects.filter(resume=resume),
-        'hobbies': [hobby.name for hobby in Hobby.objects.filter(resume=resume)],
-        'settings': settings,
-    }
+    context = build_resume_context(document)
     
-    template_path = f'resumes/resume_pdf_{template_name}.html'
-    template = get_template(template_path)
-    html = template.render(context)
+    html = render_resume_html(template_name, context)
 
     if not WEASY_AVAILABLE:
         return HttpResponse('PDF generation failed: WeasyPrint is not installed or configured correctly.')
 
     try:
-        html_obj = HTML(string=html, base_url=request.build_absolute_uri('/'))
-        pdf_bytes = html_obj.write_pdf(stylesheets=[CSS(string='@page { size: A4; margin: 1.5cm }')])
+        pdf_bytes = write_resume_pdf(html, template_name, request.build_absolute_uri('/'))
     except Exception as e:
         return HttpResponse('PDF generation (WeasyPrint) failed: ' + str(e) + '<pre>' + html + '</pre>')
 
+    if resume_version.resume_id:
+        pdf_gen = ResumePDFGeneration(
+            resume_id=resume_version.resume_id,
+            resume_version=resume_version,
+            template_name=template_name,
+            accent_color='default',
+            status='completed',
+            completed_at=timezone.now(),
+        )
+        try:
+            pdf_gen.store_pdf(pdf_bytes)
+            pdf_gen.save()
+        except Exception as e:
+            logger.warning(f"Could not cache PDF for resume version {resume_version.id}: {e}")
+
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="{resume.profile.full_name}_resume.pdf"'
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
     return response
 
 
@@ -790,26 +810,34 @@ def job_stats_view(request, job_id):
         '0-49': 0
     }
     
-    for app in applications:
-        try:
-            resume = Resume.objects.filter(profile=app.applicant).latest('created_at')
-            score_data = JobMatchScore.objects.filter(resume=resume, job_posting=job).first()
-            if score_data:
-                score = score_data.score
-                if score >= 90:
-                    score_ranges['90-100'] += 1
-                elif score >= 80:
-                    score_ranges['80-89'] += 1
-                elif score >= 70:
-                    score_ranges['70-79'] += 1
-                elif score >= 60:
-                    score_ranges['60-69'] += 1
-                elif score >= 50:
-                    score_ranges['50-59'] += 1
-                else:
-                    score_ranges['0-49'] += 1
-        except Resume.DoesNotExist:
-            pass
+    # Only scores calculated against the current job content are counted. Applications without
+    # one are pinned and scored in a single background task rather than inline on this request.
+    job_hash = job.get_content_hash()
+    scores = []
+    unscored_ids = []
+    for app_id, version_id, score, score_job_hash in applications.values_list(
+        'id', 'resume_version_id', 'match_score', 'match_score_job_hash'
+    ):
+        if version_id and score is not None and score_job_hash == job_hash:
+            scores.append(score)
+        else:
+            unscored_ids.append(app_id)
+    if unscored_ids:
+        transaction.on_commit(lambda: refresh_application_scores_task.delay(unscored_ids))
+
+    for score in scores:
+        if score >= 90:
+            score_ranges['90-100'] += 1
+        elif score >= 80:
+            score_ranges['80-89'] += 1
+        elif score >= 70:
+            score_ranges['70-79'] += 1
+        elif score >= 60:
+            score_ranges['60-69'] += 1
+        elif score >= 50:
+            score_ranges['50-59'] += 1
+        else:
+            score_ranges['0-49'] += 1
     
     # Status distribution
     status_counts = applications.values('status').annotate(count=Count('status'))
@@ -0,0 +1,409 @@
+"""
+Read-only resume documents.
+
+A ResumeDocument holds a resume and all of its sections as immutable entries. The
+matcher text, the live preview and PDF rendering are all built from it, so they see
+the same data and share one load instead of each querying every section table.
+
+Documents are built from Resume.snapshot, a JSON copy of the sections kept on the
+resume row, so a load is a single query. When the snapshot has been invalidated by
+an edit, the sections are prefetched once and the snapshot is stored again.
+"""
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property
+from typing import Optional, Tuple
+import json
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
+from core.utils import compute_content_hash
+from .models import Resume, ResumeVersion, Skill, Language
+
+# Bump when the snapshot layout changes; snapshots in another format are rebuilt on read
+SNAPSHOT_FORMAT = 1
+
+# Snapshot key -> (reverse relation, stored fields)
+SNAPSHOT_SECTIONS = {
+    'experiences': ('experience_set', ('job_title', 'company', 'start_date', 'end_date', 'description')),
+    'educations': ('education_set', ('institution', 'degree', 'field_of_study', 'start_date', 'end_date', 'percentage', 'address')),
+    'skills': ('skill_set', ('name', 'category')),
+    'projects': ('project_set', ('title', 'description', 'aim', 'frontend', 'backend', 'database', 'link')),
+    'certifications': ('certification_set', ('name', 'issuing_organization', 'date_issued')),
+    'achievements': ('achievement_set', ('name', 'description')),
+    'languages': ('language_set', ('name', 'proficiency')),
+    'hobbies': ('hobby_set', ('name',)),
+}
+DATE_FIELDS = {'start_date', 'end_date', 'date_issued'}
+
+# Reverse relations loaded when a snapshot has to be rebuilt, one prefetch query each
+SECTION_PREFETCHES = tuple(related_name for related_name, _ in SNAPSHOT_SECTIONS.values())
+
+SKILL_CATEGORY_LABELS = dict(Skill.SKILL_CATEGORY_CHOICES)
+LANGUAGE_PROFICIENCY_LABELS = dict(Language.PROFICIENCY_CHOICES)
+
+
+def _description_points(description):
+    """Splits a description into bullet points, dropping leading bullet characters."""
+    if not description:
+        return ()
+    clean_desc = '\n'.join(line.lstrip('*-• ') for line in description.splitlines())
+    return tuple(point.strip() for point in clean_desc.splitlines() if point.strip())
+
+
+@dataclass(frozen=True)
+class ExperienceEntry:
+    job_title: str
+    company: str
+    start_date: Optional[date]
+    end_date: Optional[date]
+    description: Optional[str]
+    description_points: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class EducationEntry:
+    institution: str
+    degree: str
+    field_of_study: Optional[str]
+    start_date: Optional[date]
+    end_date: Optional[date]
+    percentage: Optional[str]
+    address: Optional[str]
+
+
+@dataclass(frozen=True)
+class SkillEntry:
+    name: str
+    category: str
+    category_display: str
+
+
+@dataclass(frozen=True)
+class ProjectEntry:
+    title: str
+    description: Optional[str]
+    description_points: Tuple[str, ...]
+    aim: Optional[str]
+    frontend: Optional[str]
+    backend: Optional[str]
+    database: Optional[str]
+    link: Optional[str]
+
+
+@dataclass(frozen=True)
+class CertificationEntry:
+    name: str
+    issuing_organization: Optional[str]
+    date_issued: Optional[date]
+
+
+@dataclass(frozen=True)
+class AchievementEntry:
+    name: Optional[str]
+    description: str
+
+
+@dataclass(frozen=True)
+class LanguageEntry:
+    name: str
+    proficiency: Optional[str]
+    proficiency_display: Optional[str]
+
+    def get_proficiency_display(self):
+        # Mirrors the model method the resume templates call
+        return self.proficiency_display
+
+
+@dataclass(frozen=True)
+class UserEntry:
+    username: str
+    email: str
+
+
+@dataclass(frozen=True)
+class PhotoEntry:
+    name: str
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+@dataclass(frozen=True)
+class ProfileEntry:
+    """Frozen profile details of a resume version, shaped like JobSeekerProfile for the templates."""
+    full_name: Optional[str]
+    professional_summary: Optional[str]
+    phone_number: Optional[str]
+    address: Optional[str]
+    portfolio_url: Optional[str]
+    linkedin_url: Optional[str]
+    user: UserEntry
+    profile_photo: Optional[PhotoEntry]
+
+
+@dataclass(frozen=True)
+class ResumeEntry:
+    """Stands in for the Resume model when a document is built from a frozen version."""
+    id: Optional[int]
+    title: str
+    profile: ProfileEntry
+
+
+@dataclass(frozen=True)
+class ResumeDocument:
+    """
+    A resume with all of its sections. Sections keep their creation order;
+    build_resume_context() applies the ordering the templates expect.
+    `resume` is the live Resume, or a ResumeEntry for documents of a frozen version.
+    """
+    resume: object
+    experiences: Tuple[ExperienceEntry, ...]
+    educations: Tuple[EducationEntry, ...]
+    skills: Tuple[SkillEntry, ...]
+    projects: Tuple[ProjectEntry, ...]
+    certifications: Tuple[CertificationEntry, ...]
+    achievements: Tuple[AchievementEntry, ...]
+    languages: Tuple[LanguageEntry, ...]
+    hobbies: Tuple[str, ...]
+
+    @property
+    def profile(self):
+        return self.resume.profile
+
+    @cached_property
+    def text(self):
+        """The plain-text resume sent to the AI matcher and critique."""
+        profile = self.profile
+        full_text = f"Name: {profile.full_name}\n"
+        full_text += f"Summary: {profile.professional_summary or ''}\n\n"
+
+        if self.experiences:
+            full_text += "Experience:\n" + "\n".join([f"- {e.job_title} at {e.company}: {e.description}" for e in self.experiences]) + "\n\n"
+
+        if self.educations:
+            full_text += "Education:\n" + "\n".join([f"- {e.degree} from {e.institution}" for e in self.educations]) + "\n\n"
+
+        if self.projects:
+            full_text += "Projects:\n" + "\n".join([f"- {p.title}: {p.description or ''}" for p in self.projects]) + "\n\n"
+
+        if self.skills:
+            full_text += "Skills: " + ", ".join([s.name for s in self.skills]) + "\n\n"
+
+        if self.certifications:
+            full_text += "Certifications:\n" + "\n".join([f"- {c.name} from {c.issuing_organization}" for c in self.certifications]) + "\n\n"
+
+        if self.achievements:
+            full_text += "Achievements:\n" + "\n".join([f"- {a.description}" for a in self.achievements]) + "\n\n"
+
+        if self.languages:
+            full_text += "Languages: " + ", ".join([f"{l.name} ({l.get_proficiency_display()})" for l in self.languages]) + "\n"
+
+        return full_text
+
+
+def _parse_row(row):
+    return {
+        field: date.fromisoformat(value) if field in DATE_FIELDS and value else value
+        for field, value in row.items()
+    }
+
+
+def build_snapshot(resume):
+    """Returns the JSON snapshot of a resume's sections. Expects the sections to be prefetched."""
+    snapshot = {'format': SNAPSHOT_FORMAT}
+    for key, (related_name, fields) in SNAPSHOT_SECTIONS.items():
+        snapshot[key] = [
+            {
+                field: value.isoformat() if field in DATE_FIELDS and value else value
+                for field, value in ((field, getattr(item, field)) for field in fields)
+            }
+            for item in getattr(resume, related_name).all()
+        ]
+    return snapshot
+
+
+def _document_from_snapshot(resume, snapshot):
+    sections = {key: [_parse_row(row) for row in snapshot.get(key, [])] for key in SNAPSHOT_SECTIONS}
+    return ResumeDocument(
+        resume=resume,
+        experiences=tuple(
+            ExperienceEntry(**row, description_points=_description_points(row['description']))
+            for row in sections['experiences']
+        ),
+        educations=tuple(EducationEntry(**row) for row in sections['educations']),
+        skills=tuple(
+            SkillEntry(**row, category_display=SKILL_CATEGORY_LABELS.get(row['category'], row['category']))
+            for row in sections['skills']
+        ),
+        projects=tuple(
+            ProjectEntry(**row, description_points=_description_points(row['description']))
+            for row in sections['projects']
+        ),
+        certifications=tuple(CertificationEntry(**row) for row in sections['certifications']),
+        achievements=tuple(AchievementEntry(**row) for row in sections['achievements']),
+        languages=tuple(
+            LanguageEntry(**row, proficiency_display=LANGUAGE_PROFICIENCY_LABELS.get(row['proficiency'], row['proficiency']))
+            for row in sections['languages']
+        ),
+        hobbies=tuple(row['name'] for row in sections['hobbies']),
+    )
+
+
+def _has_current_snapshot(resume):
+    return bool(resume.snapshot) and resume.snapshot.get('format') == SNAPSHOT_FORMAT
+
+
+def _store_snapshots(resumes):
+    """
+    Prefetches the sections of resumes without a current snapshot and stores a fresh one.
+    The write only applies if no edit has invalidated the snapshot since the row was read.
+    """
+    if not resumes:
+        return
+    prefetch_related_objects(resumes, *SECTION_PREFETCHES)
+    for resume in resumes:
+        resume.snapshot = build_snapshot(resume)
+        # A queryset update keeps updated_at unchanged
+        Resume.objects.filter(pk=resume.pk, snapshot_version=resume.snapshot_version).update(snapshot=resume.snapshot)
+
+
+def refresh_resume_snapshot(resume_id):
+    """Rebuilds the snapshot of a resume after a section change has been committed."""
+    resume = Resume.objects.filter(pk=resume_id).first()
+    if resume and not _has_current_snapshot(resume):
+        _store_snapshots([resume])
+
+
+def load_resume_document(resume):
+    """
+    Returns the ResumeDocument for a Resume instance or id.
+    The resume, profile, user and section snapshot come from a single query; sections are only
+    queried when the snapshot has to be rebuilt. The document is memoized on the instance, so
+    the text, preview and PDF code paths share a single load within a request or task.
+    """
+    if not isinstance(resume, Resume):
+        documents = load_resume_documents([resume])
+        if resume not in documents:
+            raise Resume.DoesNotExist(f"Resume {resume} does not exist.")
+        return documents[resume]
+
+    document = getattr(resume, '_resume_document', None)
+    if document is None:
+        # Re-read the row so an instance loaded before an edit never yields an outdated document
+        document = load_resume_documents([resume.pk])[resume.pk]
+        resume._resume_document = document
+    return document
+
+
+def load_resume_documents(resumes):
+    """
+    Returns {resume_id: ResumeDocument} for a queryset or list of resume ids,
+    using the same number of queries regardless of how many resumes are loaded.
+    """
+    if isinstance(resumes, (list, tuple, set)):
+        resumes = Resume.objects.filter(pk__in=resumes)
+    loaded = list(resumes.select_related('profile__user'))
+    _store_snapshots([resume for resume in loaded if not _has_current_snapshot(resume)])
+    return {resume.id: _document_from_snapshot(resume, resume.snapshot) for resume in loaded}
+
+
+def build_profile_data(profile):
+    """Returns the JSON copy of the profile details stored on a resume version."""
+    return {
+        'full_name': profile.full_name,
+        'professional_summary': profile.professional_summary,
+        'phone_number': profile.phone_number,
+        'address': profile.address,
+        'portfolio_url': profile.portfolio_url,
+        'linkedin_url': profile.linkedin_url,
+        'username': profile.user.username,
+        'email': profile.user.email,
+        'profile_photo': profile.profile_photo.name if profile.profile_photo else None,
+    }
+
+
+def get_document_fingerprint(document, profile_data=None):
+    """
+    Returns a hash of everything a rendered resume shows, so identical content maps to
+    the same resume version and the same cached PDFs.
+    """
+    if profile_data is None:
+        profile_data = build_profile_data(document.profile)
+    return compute_content_hash(json.dumps([profile_data, document.resume.snapshot, document.resume.title], sort_keys=True))
+
+
+def get_or_create_resume_version(resume):
+    """
+    Returns a frozen version of the resume's current content, creating it only if the
+    content differs from every version saved before.
+    """
+    document = load_resume_document(resume)
+    profile_data = build_profile_data(document.profile)
+    snapshot = document.resume.snapshot
+    content_hash = get_document_fingerprint(document, profile_data)
+
+    version = ResumeVersion.objects.filter(resume_id=resume.pk, content_hash=content_hash).first()
+    if version:
+        return version
+    try:
+        with transaction.atomic():
+            return ResumeVersion.objects.create(
+                resume_id=resume.pk,
+                profile_id=document.resume.profile_id,
+                title=document.resume.title,
+                profile_data=profile_data,
+                snapshot=snapshot,
+                content_hash=content_hash,
+                text_hash=compute_content_hash(document.text),
+            )
+    except IntegrityError:
+        # Created concurrently by another request
+        return ResumeVersion.objects.get(resume_id=resume.pk, content_hash=content_hash)
+
+
+def load_version_document(version):
+    """Returns the ResumeDocument of a frozen resume version without touching the live resume."""
+    data = version.profile_data
+    profile = ProfileEntry(
+        full_name=data.get('full_name'),
+        professional_summary=data.get('professional_summary'),
+        phone_number=data.get('phone_number'),
+        address=data.get('address'),
+        portfolio_url=data.get('portfolio_url'),
+        linkedin_url=data.get('linkedin_url'),
+        user=UserEntry(username=data.get('username', ''), email=data.get('email', '')),
+        profile_photo=PhotoEntry(data['profile_photo']) if data.get('profile_photo') else None,
+    )
+    resume = ResumeEntry(id=version.resume_id, title=version.title, profile=profile)
+    return _document_from_snapshot(resume, version.snapshot)
+
+
+def _newest_first(entries):
+    # Undated entries go last, matching the ordering of the resume templates
+    return sorted(entries, key=lambda entry: entry.start_date or date.min, reverse=True)
+
+
+def build_resume_context(document, accent_color=None):
+    """Returns the template context used by the resume preview and PDF templates."""
+    skills_by_category = {}
+    for skill in sorted(document.skills, key=lambda skill: skill.category):
+        skills_by_category.setdefault(skill.category_display, []).append(skill.name)
+
+    context = {
+        'resume': document.resume,
+        'experiences': _newest_first(document.experiences),
+        'projects': list(document.projects),
+        'educations': _newest_first(document.educations),
+        'skills_by_category': skills_by_category,
+        'certifications': list(document.certifications),
+        'achievements': list(document.achievements),
+        'languages': list(document.languages),
+        'hobbies': list(document.hobbies),
+        'settings': settings,
+    }
+    if accent_color:
+        context['accent_color'] = accent_color
+    return context
@@ -0,0 +1,61 @@
+"""
+Django management command to compare cold and warm resume PDF render times.
+A cold render starts with the renderer caches cleared (templates, @page stylesheets, font
+configuration and fetched assets); a warm render reuses them as a preloaded worker does.
+"""
+from statistics import mean, median
+import time
+from django.core.management.base import BaseCommand, CommandError
+from resumes.documents import build_resume_context, load_resume_document
+from resumes.models import Resume
+from resumes.rendering import PDF_TEMPLATES, render_resume_pdf, reset_renderer, warm_up_renderer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cold vs warm WeasyPrint rendering of a resume'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume-id', type=int, help='Resume to render (default: the most recently created one)')
+        parser.add_argument('--template', choices=PDF_TEMPLATES, action='append', help='Template to benchmark; repeatable (default: all)')
+        parser.add_argument('--iterations', type=int, default=5, help='Renders per template and mode (default: 5)')
+        parser.add_argument('--accent-color', default='#3498db', help='Accent color passed to the templates')
+        parser.add_argument('--base-url', default='http://localhost/', help='Base URL used to resolve relative links')
+
+    def handle(self, *args, **options):
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError) as e:
+            raise CommandError(f'WeasyPrint is not available: {e}')
+
+        resumes = Resume.objects.order_by('-created_at')
+        if options['resume_id']:
+            resumes = resumes.filter(id=options['resume_id'])
+        resume = resumes.first()
+        if not resume:
+            raise CommandError('No resume found to render.')
+
+        context = build_resume_context(load_resume_document(resume), accent_color=options['accent_color'])
+        iterations = max(options['iterations'], 1)
+        base_url = options['base_url']
+        self.stdout.write(f'Rendering resume {resume.id} ("{resume.title}"), {iterations} iterations per mode\n')
+
+        for template_name in options['template'] or PDF_TEMPLATES:
+            cold = []
+            for _ in range(iterations):
+                reset_renderer()
+                cold.append(self._time_render(template_name, context, base_url))
+
+            warm_up_renderer()
+            render_resume_pdf(template_name, context, base_url)
+            warm = [self._time_render(template_name, context, base_url) for _ in range(iterations)]
+
+            self.stdout.write(
+                f'{template_name:<13} cold: median {median(cold):7.1f} ms, mean {mean(cold):7.1f} ms | '
+                f'warm: median {median(warm):7.1f} ms, mean {mean(warm):7.1f} ms | '
+                f'saved {median(cold) - median(warm):6.1f} ms per render'
+            )
+
+    def _time_render(self, template_name, context, base_url):
+        start = time.perf_counter()
+        render_resume_pdf(template_name, context, base_url)
+        return (time.perf_counter() - start) * 1000
@@ -0,0 +1,69 @@
+"""
+Django management command to compare resume text extraction through a temporary file
+(how uploads used to be parsed) with in-memory extraction, over a directory of sample resumes.
+"""
+from io import BytesIO
+from pathlib import Path
+from statistics import median
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from resumes.parser import extract_text_from_docx, extract_text_from_file, extract_text_from_pdf
+
+
+def _extract_via_temp_file(content, filename):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
+        temp_file.write(content)
+        temp_file_path = temp_file.name
+    try:
+        if filename.lower().endswith('.pdf'):
+            return extract_text_from_pdf(temp_file_path)
+        return extract_text_from_docx(temp_file_path)
+    finally:
+        os.unlink(temp_file_path)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark temp-file vs in-memory text extraction over a corpus of PDF/DOCX resumes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Directory of sample .pdf and .docx resumes (searched recursively)')
+        parser.add_argument('--iterations', type=int, default=5, help='Extractions per file and mode (default: 5)')
+
+    def handle(self, *args, **options):
+        corpus = Path(options['corpus'])
+        if not corpus.is_dir():
+            raise CommandError(f'Corpus directory not found: {corpus}')
+        files = sorted(path for path in corpus.rglob('*') if path.suffix.lower() in ('.pdf', '.docx'))
+        if not files:
+            raise CommandError(f'No .pdf or .docx files found in {corpus}')
+
+        iterations = max(options['iterations'], 1)
+        self.stdout.write(f'Extracting {len(files)} files, {iterations} iterations per mode\n')
+
+        totals = {'temp_file': 0.0, 'in_memory': 0.0}
+        for path in files:
+            content = path.read_bytes()
+            temp_file = self._time(lambda: _extract_via_temp_file(content, path.name), iterations)
+            # A fresh stream per run, like the upload opened by the parse task
+            in_memory = self._time(lambda: extract_text_from_file(BytesIO(content), path.name), iterations)
+            totals['temp_file'] += temp_file
+            totals['in_memory'] += in_memory
+            self.stdout.write(
+                f'{path.name[:40]:<40} {len(content) / 1024:8.1f} KB | '
+                f'temp file: {temp_file:7.2f} ms | in memory: {in_memory:7.2f} ms'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sum of per-file medians: temp file {totals["temp_file"]:.1f} ms, '
+            f'in memory {totals["in_memory"]:.1f} ms, saved {totals["temp_file"] - totals["in_memory"]:.1f} ms'
+        ))
+
+    def _time(self, extract, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            extract()
+            timings.append((time.perf_counter() - start) * 1000)
+        return median(timings)
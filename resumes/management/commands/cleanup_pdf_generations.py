@@ -0,0 +1,31 @@
+"""
+Django management command to delete expired generated resume PDFs.
+The same cleanup runs daily through Celery beat; this command allows running it by hand.
+"""
+from django.core.management.base import BaseCommand
+from resumes.retention import cleanup_pdf_generations
+
+
+class Command(BaseCommand):
+    help = 'Delete old, superseded and failed resume PDF generations and their stored files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, help='Completed PDFs to keep per resume and template (default: PDF_RETENTION_KEEP_PER_TEMPLATE)')
+        parser.add_argument('--max-age-days', type=int, help='Delete completed PDFs older than this (default: PDF_RETENTION_MAX_AGE_DAYS)')
+        parser.add_argument('--failed-hours', type=int, help='Delete failed or abandoned generations older than this (default: PDF_RETENTION_FAILED_HOURS)')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per statement (default: PDF_RETENTION_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting anything')
+
+    def handle(self, *args, **options):
+        totals = cleanup_pdf_generations(
+            keep=options['keep'],
+            max_age_days=options['max_age_days'],
+            failed_hours=options['failed_hours'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['rows']} PDF generations and {totals['files']} files, "
+            f"reclaiming {totals['bytes'] / (1024 * 1024):.2f} MB ({totals['bytes']} bytes)"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0014_resumepdfgeneration_pdf_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resume',
+            name='rescore_pending',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0016_resume_content_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resume',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resume',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0017_resume_snapshot'),
+        ('users', '0007_employerprofile_company_bio_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('profile_data', models.JSONField()),
+                ('snapshot', models.JSONField()),
+                ('content_hash', models.CharField(help_text='Hash of the profile data and sections', max_length=64)),
+                ('text_hash', models.CharField(help_text='Hash of the matcher text, comparable with Resume.content_hash', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resume_versions', to='users.jobseekerprofile')),
+                ('resume', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='versions', to='resumes.resume')),
+            ],
+            options={
+                'unique_together': {('resume', 'content_hash')},
+            },
+        ),
+        migrations.AddField(
+            model_name='resumepdfgeneration',
+            name='resume_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pdf_generations', to='resumes.resumeversion'),
+        ),
+    ]
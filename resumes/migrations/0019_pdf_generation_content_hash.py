@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0018_resume_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumepdfgeneration',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Fingerprint of the resume content the PDF was rendered from', max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='resumepdfgeneration',
+            index=models.Index(fields=['resume', 'content_hash', 'template_name', 'accent_color'], name='resumes_res_resume__e78899_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+import resumes.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0019_pdf_generation_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumepdfgeneration',
+            name='pdf_content',
+            field=models.BinaryField(blank=True, help_text='Legacy: PDFs generated before storage was used; moved to pdf_file on first download', null=True),
+        ),
+        migrations.AlterField(
+            model_name='resumepdfgeneration',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, storage=resumes.models.generated_pdf_storage, upload_to='generated_pdfs/'),
+        ),
+    ]
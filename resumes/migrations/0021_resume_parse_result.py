@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resumes', '0020_generated_pdf_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeParseResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(help_text='SHA-256 of the extracted text', max_length=64, unique=True)),
+                ('file_hash', models.CharField(db_index=True, help_text='SHA-256 of the uploaded file', max_length=64)),
+                ('parsed_data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
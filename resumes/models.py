@@ -1,11 +1,45 @@
+from io import BytesIO
+import logging
 from django.db import models
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.utils import timezone
 from users.models import JobSeekerProfile
 
+logger = logging.getLogger(__name__)
+
+
+def generated_pdf_storage():
+    """Storage for rendered resume PDFs, configured as STORAGES['generated_pdfs']."""
+    return storages['generated_pdfs']
+
+
+def resume_upload_storage():
+    """Storage for uploaded resumes waiting to be parsed, configured as STORAGES['resume_uploads']."""
+    return storages['resume_uploads']
+
+
 class ParsedResumeCache(models.Model):
     profile = models.OneToOneField(JobSeekerProfile, on_delete=models.CASCADE, primary_key=True)
     parsed_data = models.JSONField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+class ResumeParseResult(models.Model):
+    """
+    Gemini's structured parse of an uploaded resume, keyed by the extracted text and the bytes of
+    the last file it came from, so re-uploading the same resume skips the Gemini call.
+    Unlike ParsedResumeCache, rows outlive the upload; least recently used and expired rows
+    are evicted by cleanup_resume_parse_cache_task.
+    """
+    text_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the extracted text")
+    file_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the uploaded file")
+    parsed_data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Parse of {self.text_hash[:12]} (last used {self.last_used_at:%Y-%m-%d %H:%M})"
+
 class Resume(models.Model):
     profile = models.ForeignKey(JobSeekerProfile, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -14,6 +48,17 @@ class Resume(models.Model):
     # New fields for storing AI score and feedback
     score = models.IntegerField(null=True, blank=True)
     feedback = models.JSONField(null=True, blank=True)
+    # Set while a debounced rescore is scheduled, so a burst of edits queues a single task
+    rescore_pending = models.BooleanField(default=False)
+    # Hash of the text built by get_full_resume_text; cleared whenever a section changes
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # content_hash the current score and feedback were calculated from
+    critique_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Denormalized copy of all resume sections, read instead of joining every section table.
+    # Cleared in the same transaction as any section change and rebuilt after commit.
+    snapshot = models.JSONField(null=True, blank=True)
+    # Bumped on every invalidation so a rebuild that raced with a newer edit is discarded
+    snapshot_version = models.PositiveIntegerField(default=0)
 
 
     def __str__(self):
@@ -120,6 +165,28 @@ class Hobby(models.Model):
     def __str__(self):
         return self.name
 
+class ResumeVersion(models.Model):
+    """
+    An immutable copy of a resume's content, pinned to the applications it was submitted with.
+    Versions are copy-on-write: applying again with unchanged content reuses the existing version.
+    """
+    resume = models.ForeignKey(Resume, on_delete=models.SET_NULL, null=True, blank=True, related_name='versions')
+    profile = models.ForeignKey(JobSeekerProfile, on_delete=models.CASCADE, related_name='resume_versions')
+    title = models.CharField(max_length=255)
+    # Contact details and summary as they were when the version was created
+    profile_data = models.JSONField()
+    # Resume sections, in the same format as Resume.snapshot
+    snapshot = models.JSONField()
+    content_hash = models.CharField(max_length=64, help_text="Hash of the profile data and sections")
+    text_hash = models.CharField(max_length=64, help_text="Hash of the matcher text, comparable with Resume.content_hash")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('resume', 'content_hash')
+
+    def __str__(self):
+        return f"{self.title} ({self.created_at:%Y-%m-%d %H:%M})"
+
 class ResumePDFGeneration(models.Model):
     """Tracks async PDF generation tasks for resumes."""
     STATUS_CHOICES = [
@@ -130,13 +197,16 @@ class ResumePDFGeneration(models.Model):
     ]
     
     resume = models.ForeignKey(Resume, on_delete=models.CASCADE, related_name='pdf_generations')
+    # Set for PDFs rendered from a frozen version, e.g. the resume attached to an application
+    resume_version = models.ForeignKey(ResumeVersion, on_delete=models.CASCADE, null=True, blank=True, related_name='pdf_generations')
     template_name = models.CharField(max_length=50)
     accent_color = models.CharField(max_length=50, default='blue')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_id = models.CharField(max_length=255, null=True, blank=True, help_text="Celery task ID")
-    pdf_file = models.FileField(upload_to='generated_pdfs/', null=True, blank=True)
-    pdf_content = models.BinaryField(null=True, blank=True, help_text="PDF content stored in database for Railway compatibility")
+    pdf_file = models.FileField(upload_to='generated_pdfs/', storage=generated_pdf_storage, null=True, blank=True)
+    pdf_content = models.BinaryField(null=True, blank=True, help_text="Legacy: PDFs generated before storage was used; moved to pdf_file on first download")
     error_message = models.TextField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, help_text="Fingerprint of the resume content the PDF was rendered from")
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
@@ -145,9 +215,35 @@ class ResumePDFGeneration(models.Model):
         indexes = [
             models.Index(fields=['resume', 'status']),
             models.Index(fields=['task_id']),
+            models.Index(fields=['resume', 'content_hash', 'template_name', 'accent_color']),
         ]
     
     def __str__(self):
         return f"PDF Generation for {self.resume.title} - {self.status}"
 
+    @property
+    def has_pdf(self):
+        return bool(self.pdf_file or self.pdf_content)
+
+    def store_pdf(self, pdf_bytes):
+        """Writes the rendered PDF to the generated PDFs storage. The row itself is not saved."""
+        filename = f"resume_{self.resume_id}_{self.template_name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        self.pdf_file.save(filename, ContentFile(pdf_bytes), save=False)
+        self.pdf_content = None
+
+    def open_pdf(self):
+        """
+        Opens the PDF for reading. Rows from before PDFs were kept in storage still hold the
+        bytes in the database; they are moved to storage the first time they are read.
+        """
+        if not self.pdf_file and self.pdf_content:
+            pdf_bytes = bytes(self.pdf_content)
+            try:
+                self.store_pdf(pdf_bytes)
+                self.save(update_fields=['pdf_file', 'pdf_content'])
+            except Exception as e:
+                logger.warning(f"Could not move PDF Generation {self.id} to storage: {e}")
+                return BytesIO(pdf_bytes)
+        return self.pdf_file.open('rb')
+
 
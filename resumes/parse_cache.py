@@ -0,0 +1,83 @@
+"""
+Cache of Gemini parses of uploaded resumes.
+
+Users often upload the same file again, e.g. after abandoning the validation step. Parses are
+looked up first by the SHA-256 of the file bytes, which skips text extraction too, and then by
+the SHA-256 of the extracted text, which also catches the same resume exported again.
+"""
+from datetime import timedelta
+import hashlib
+import logging
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from core.utils import compute_content_hash
+from .models import ResumeParseResult
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file_content(content):
+    """Returns the SHA-256 hex digest of an uploaded file's bytes."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_resume_text(text):
+    """Returns the SHA-256 hex digest of a resume's extracted text."""
+    return compute_content_hash(text)
+
+
+def _fresh_results():
+    return ResumeParseResult.objects.filter(
+        created_at__gte=timezone.now() - timedelta(days=settings.RESUME_PARSE_CACHE_TTL_DAYS)
+    )
+
+
+def get_cached_parse(file_hash=None, text_hash=None):
+    """
+    Returns the cached parsed data for a file or text hash, or None. A hit marks the entry as
+    recently used; a text hit also records the file hash so the next upload of that file hits directly.
+    """
+    result = None
+    if file_hash:
+        result = _fresh_results().filter(file_hash=file_hash).order_by('-last_used_at').first()
+    if result is None and text_hash:
+        result = _fresh_results().filter(text_hash=text_hash).first()
+    if result is None:
+        return None
+
+    updates = {'last_used_at': timezone.now()}
+    if file_hash and result.file_hash != file_hash:
+        updates['file_hash'] = file_hash
+    ResumeParseResult.objects.filter(pk=result.pk).update(**updates)
+    return result.parsed_data
+
+
+def store_parse(file_hash, text_hash, parsed_data):
+    """Caches a successful parse, replacing any older parse of the same text."""
+    now = timezone.now()
+    try:
+        ResumeParseResult.objects.update_or_create(
+            text_hash=text_hash,
+            defaults={'file_hash': file_hash, 'parsed_data': parsed_data, 'created_at': now, 'last_used_at': now},
+        )
+    except IntegrityError:
+        # Another worker cached the same text first
+        logger.info(f"Parse of text {text_hash[:12]} was cached concurrently.")
+
+
+def cleanup_parse_cache(ttl_days=None, max_entries=None):
+    """
+    Evicts parses older than `ttl_days`, then the least recently used ones beyond `max_entries`.
+    Returns the number of rows deleted.
+    """
+    ttl_days = settings.RESUME_PARSE_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    max_entries = settings.RESUME_PARSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+
+    deleted, _ = ResumeParseResult.objects.filter(created_at__lt=timezone.now() - timedelta(days=ttl_days)).delete()
+    overflow_ids = list(ResumeParseResult.objects.order_by('-last_used_at', '-id').values_list('id', flat=True)[max_entries:])
+    if overflow_ids:
+        deleted += ResumeParseResult.objects.filter(id__in=overflow_ids).delete()[0]
+
+    logger.info(f"Resume parse cache cleanup removed {deleted} entries")
+    return deleted
@@ -1,15 +1,20 @@
+import io
 import os
-import google.generativeai as genai
 import fitz
 import docx
 import logging
 import re
 import json
 from typing import List, Dict, Any
-import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 
 # --- ADDED: Model imports for helper function ---
-from .models import Experience, Education, Skill, Project, Certification, Achievement, Language, Hobby
+from .documents import load_resume_document
+from .preparser import LOCAL_SECTIONS, preparse_resume_text
+from core.utils import compute_content_hash
+# Module-level names kept so callers and tests can keep patching them here
+from core.ai_gateway import GeminiRateLimited, GeminiUnavailable, call_gemini_with_retry as _call_gemini_with_retry, get_gemini_model as _get_gemini_model
 # --- END ADDITION ---
 
 # --- Configuration ---
@@ -52,71 +57,7 @@ def sanitize_prompt_input(text: str) -> str:
 
 # --- Gemini API Functions ---
 
-def _get_gemini_model(model_name: str = 'models/gemini-2.5-flash'):
-    """
-    Initializes and returns a Gemini model instance.
-    """
-    try:
-        from django.conf import settings
-        api_key = settings.GOOGLE_AI_API_KEY
-        if not api_key:
-            logger.error("GOOGLE_AI_API_KEY not found for scoring.")
-            return None
-        
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel(model_name)
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini model for scoring: {e}")
-        return None
-
-def _call_gemini_with_retry(model, prompt, max_retries=3, base_delay=2, timeout_seconds=60):
-    """Calls the Gemini API with retries and explicit timeout to avoid worker hangs.
-    
-    Args:
-        model: The Gemini model instance
-        prompt: The prompt to send
-        max_retries: Maximum number of retry attempts (default: 3)
-        base_delay: Base delay in seconds for exponential backoff (default: 2)
-        timeout_seconds: Timeout for each API call in seconds (default: 60 for parsing operations)
-    """
-    retriable_exceptions = tuple()
-    try:
-        from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
-        retriable_exceptions = (DeadlineExceeded, ResourceExhausted, ServiceUnavailable)
-    except ImportError:  # Fallback if google api core is unavailable
-        logger.debug("google.api_core.exceptions not available; using generic exception handling for Gemini retries.")
-
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                prompt,
-                request_options={"timeout": timeout_seconds}
-            )
-            return response
-        except Exception as e:
-            if retriable_exceptions and isinstance(e, retriable_exceptions):
-                logger.warning(
-                    "Gemini API timeout/resource error on attempt %s/%s: %s",
-                    attempt + 1,
-                    max_retries,
-                    e,
-                )
-            else:
-                logger.warning(
-                    "Gemini API call failed on attempt %s/%s. Error: %s",
-                    attempt + 1,
-                    max_retries,
-                    e,
-                )
-
-        # Backoff before retrying if we have attempts left
-        if attempt < max_retries - 1:
-            time.sleep(base_delay * (2 ** attempt))
-
-    logger.error("Max retries reached. Gemini API call failed.")
-    return None
-
-def parse_text_with_gemini(text: str) -> Dict[str, Any]:
+def parse_text_with_gemini(text: str, timeout_seconds: int = 60) -> Dict[str, Any]:
     """
     Sends resume text to the Gemini API and asks it to parse the content
     into a structured JSON format. Includes a few-shot example for better accuracy.
@@ -193,8 +134,8 @@ def parse_text_with_gemini(text: str) -> Dict[str, Any]:
     """
 
     try:
-        # Use longer timeout for parsing operations (60 seconds)
-        response = _call_gemini_with_retry(model, prompt, max_retries=3, timeout_seconds=60)
+        # Use longer timeout for parsing operations (60 seconds unless parsing a chunk)
+        response = _call_gemini_with_retry(model, prompt, max_retries=3, timeout_seconds=timeout_seconds)
         if not response:
             logger.error("Gemini API call failed after all retries. Returning None.")
             return None
@@ -213,10 +154,104 @@ def parse_text_with_gemini(text: str) -> Dict[str, Any]:
         logger.error(f"Error decoding Gemini JSON response: {e}")
         logger.error(f"Raw response was: {response.text}")
         return None
+    except GeminiRateLimited:
+        # Let the calling task re-queue itself rather than fall back to a local parse
+        raise
     except Exception as e:
         logger.error(f"Error parsing with Gemini: {e}")
         return None
 
+# Sections of the parsed data, empty when the resume doesn't have them
+PARSED_LIST_SECTIONS = ('experience', 'education', 'skills', 'projects', 'certifications', 'achievements', 'languages', 'hobbies')
+
+def _merge_parsed_chunks(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combines the parses of separate chunks into one result, keeping chunk order."""
+    merged = {'personal_details': {}, 'professional_summary': None}
+    merged.update({key: [] for key in PARSED_LIST_SECTIONS})
+    for result in results:
+        for key, value in (result.get('personal_details') or {}).items():
+            if value and not merged['personal_details'].get(key):
+                merged['personal_details'][key] = value
+        merged['professional_summary'] = merged['professional_summary'] or result.get('professional_summary')
+        for key in PARSED_LIST_SECTIONS:
+            for item in result.get(key) or []:
+                # The header chunk can repeat entries the section chunks also return
+                if item not in merged[key]:
+                    merged[key].append(item)
+    return merged
+
+def parse_text_in_chunks(chunks: List[str]) -> Dict[str, Any]:
+    """
+    Parses chunks of a long resume concurrently with smaller prompts and a shorter timeout, and
+    merges them into parse_text_with_gemini's format. Returns None only if every chunk failed.
+    """
+    timeout_seconds = settings.RESUME_PARSE_CHUNK_TIMEOUT_SECONDS
+    logger.info(f"Parsing resume in {len(chunks)} chunks.")
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.RESUME_PARSE_MAX_WORKERS, len(chunks)))) as executor:
+        results = list(executor.map(lambda chunk: parse_text_with_gemini(chunk, timeout_seconds=timeout_seconds), chunks))
+
+    parsed = [result for result in results if result]
+    if not parsed:
+        return None
+    if len(parsed) < len(chunks):
+        logger.warning(f"{len(chunks) - len(parsed)} of {len(chunks)} resume chunks could not be parsed.")
+    return _merge_parsed_chunks(parsed)
+
+def _local_parse(local_data: Dict[str, Any]) -> Dict[str, Any]:
+    fallback = {key: [] for key in PARSED_LIST_SECTIONS}
+    fallback.update(local_data, parsed_locally=True)
+    fallback['personal_details'].setdefault('address', None)
+    return fallback
+
+def parse_resume_text_locally(text: str) -> Dict[str, Any]:
+    """
+    Returns the rule-based parse of resume text on its own, with 'parsed_locally' set.
+    Only the contact details and the simple sections are filled in.
+    """
+    if not text:
+        return None
+    return _local_parse(preparse_resume_text(text).local_data())
+
+def parse_resume_text(text: str) -> Dict[str, Any]:
+    """
+    Parses resume text into the structure parse_text_with_gemini returns.
+    A rule-based pass extracts the contact details and the simple sections, so Gemini only
+    receives the header and the remaining sections. If Gemini fails or its circuit is open,
+    the rule-based result is returned on its own with 'parsed_locally' set, instead of
+    failing the upload. GeminiRateLimited is raised while only the quota is exhausted.
+    """
+    if not text:
+        return None
+
+    preparsed = preparse_resume_text(text)
+    local_data = preparsed.local_data()
+    model_text = preparsed.text_for_model()
+    logger.info(f"Pre-parser reduced the Gemini input from {len(text)} to {len(model_text)} chars.")
+
+    try:
+        if len(model_text) > settings.RESUME_PARSE_CHUNK_CHARS:
+            structured_data = parse_text_in_chunks(preparsed.chunks_for_model(settings.RESUME_PARSE_CHUNK_CHARS))
+        else:
+            structured_data = parse_text_with_gemini(model_text) if model_text else {}
+    except GeminiUnavailable:
+        # Waiting for the circuit to close would hold the upload for no benefit
+        logger.warning("Gemini circuit is open; using the rule-based parse.")
+        return _local_parse(local_data)
+    if structured_data is None:
+        logger.warning("Gemini parsing failed; falling back to the rule-based parse.")
+        return _local_parse(local_data)
+
+    # Rule-based contact details are exact matches; Gemini is better at telling the name apart
+    personal_details = dict(structured_data.get('personal_details') or {})
+    for key, value in local_data['personal_details'].items():
+        if value and not (key == 'full_name' and personal_details.get(key)):
+            personal_details[key] = value
+    structured_data['personal_details'] = personal_details
+    for key in LOCAL_SECTIONS:
+        if local_data[key]:
+            structured_data[key] = local_data[key]
+    return structured_data
+
 def enhance_text_with_gemini(text_to_enhance: str, context: str) -> str:
     """
     Uses Gemini to rewrite and improve a piece of text from a resume, with more specific contextual instructions.
@@ -263,8 +298,9 @@ def enhance_text_with_gemini(text_to_enhance: str, context: str) -> str:
     ENHANCED TEXT:
     """
     try:
-        # Use shorter timeout for enhancement operations (30 seconds)
-        response = _call_gemini_with_retry(model, prompt, max_retries=2, timeout_seconds=30)
+        # Use shorter timeout for enhancement operations (30 seconds); repeated clicks on the
+        # same text are answered from the response cache
+        response = _call_gemini_with_retry(model, prompt, max_retries=2, timeout_seconds=30, cache_as='enhance_text')
         if not response:
             logger.warning("Gemini API call failed for text enhancement. Returning original text.")
             return text_to_enhance
@@ -343,6 +379,8 @@ def score_and_critique_resume(full_resume_text: str) -> Dict[str, Any]:
         else:
             logger.error(f"Could not find a valid JSON object in the Gemini critique response: {text_response}")
             return None
+    except GeminiRateLimited:
+        raise
     except Exception as e:
         logger.error(f"Error critiquing resume with Gemini: {e}")
         return None
@@ -351,61 +389,82 @@ def score_and_critique_resume(full_resume_text: str) -> Dict[str, Any]:
 
 # --- File Extraction Functions ---
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF file."""
+def _read_capped(source, max_bytes: int) -> bytes:
+    """Returns the bytes of a file-like object or bytes, raising ValueError past max_bytes."""
+    data = source if isinstance(source, (bytes, bytearray, memoryview)) else source.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"file is larger than {max_bytes} bytes")
+    return data
+
+def extract_text_from_pdf(source, max_pages: int = None) -> str:
+    """
+    Extracts text from a PDF given as a path, bytes or a file-like object.
+    Bytes and streams are read in memory, without a temporary file. Only the first
+    `max_pages` pages are read (RESUME_PARSE_MAX_PAGES by default).
+    """
+    max_pages = max_pages or settings.RESUME_PARSE_MAX_PAGES
     try:
-        with fitz.open(file_path) as doc:
-            text = "\n".join(page.get_text() for page in doc)
+        if isinstance(source, (str, os.PathLike)):
+            doc = fitz.open(source)
+        else:
+            doc = fitz.open(stream=_read_capped(source, settings.RESUME_UPLOAD_MAX_BYTES), filetype='pdf')
+        with doc:
+            if doc.page_count > max_pages:
+                logger.warning('PDF has %s pages; only the first %s are read', doc.page_count, max_pages)
+            text = "\n".join(doc[page_number].get_text() for page_number in range(min(doc.page_count, max_pages)))
         return text
     except Exception as e:
         logger.error('Error reading PDF file: %s', e)
         return ""
 
-def extract_text_from_docx(file_path: str) -> str:
-    """Extracts text from a DOCX file."""
+def extract_text_from_docx(source) -> str:
+    """Extracts text from a DOCX given as a path, bytes or a file-like object, without a temporary file."""
     try:
-        doc = docx.Document(file_path)
+        if not isinstance(source, (str, os.PathLike)):
+            source = io.BytesIO(_read_capped(source, settings.RESUME_UPLOAD_MAX_BYTES))
+        doc = docx.Document(source)
         text = "\n".join([para.text for para in doc.paragraphs])
         return text
     except Exception as e:
         logger.error('Error reading DOCX file: %s', e)
         return ""
 
+def extract_text_from_file(source, filename: str) -> str:
+    """
+    Extracts text from an uploaded resume (bytes or a file-like object), choosing the
+    reader by the file extension. Unsupported types return an empty string.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.pdf':
+        return extract_text_from_pdf(source)
+    if extension == '.docx':
+        return extract_text_from_docx(source)
+    logger.error('Unsupported file type: %s', filename)
+    return ""
+
 # --- START: Moved Helper Function ---
 def get_full_resume_text(resume):
     """Helper function to compile all resume information into a single string."""
-    profile = resume.profile
-    full_text = f"Name: {profile.full_name}\n"
-    full_text += f"Summary: {profile.professional_summary or ''}\n\n"
-    
-    experiences = Experience.objects.filter(resume=resume)
-    if experiences:
-        full_text += "Experience:\n" + "\n".join([f"- {e.job_title} at {e.company}: {e.description}" for e in experiences]) + "\n\n"
-    
-    educations = Education.objects.filter(resume=resume)
-    if educations:
-        full_text += "Education:\n" + "\n".join([f"- {e.degree} from {e.institution}" for e in educations]) + "\n\n"
-    
-    projects = Project.objects.filter(resume=resume)
-    if projects:
-        full_text += "Projects:\n" + "\n".join([f"- {p.title}: {p.description or ''}" for p in projects]) + "\n\n"
-    
-    skills = Skill.objects.filter(resume=resume)
-    if skills:
-        full_text += "Skills: " + ", ".join([s.name for s in skills]) + "\n\n"
-    
-    certifications = Certification.objects.filter(resume=resume)
-    if certifications:
-        full_text += "Certifications:\n" + "\n".join([f"- {c.name} from {c.issuing_organization}" for c in certifications]) + "\n\n"
-    
-    achievements = Achievement.objects.filter(resume=resume)
-    if achievements:
-        full_text += "Achievements:\n" + "\n".join([f"- {a.description}" for a in achievements]) + "\n\n"
+    return load_resume_document(resume).text
 
-    languages = Language.objects.filter(resume=resume)
-    if languages:
-        full_text += "Languages: " + ", ".join([f"{l.name} ({l.get_proficiency_display()})" for l in languages]) + "\n"
-    
-    return full_text
+def get_resume_content_hash(resume, resume_text=None):
+    """
+    Returns the hash of the resume's text as built by get_full_resume_text.
+    The stored hash is reused when no text is given; section edits clear it, so it is
+    only recomputed (and stored again) after the resume has actually changed.
+    Pass text built from this resume instance, so its snapshot_version matches the text.
+    """
+    if resume_text is None:
+        if resume.content_hash:
+            return resume.content_hash
+        resume_text = get_full_resume_text(resume)
+
+    content_hash = compute_content_hash(resume_text)
+    if content_hash != resume.content_hash:
+        # A queryset update keeps updated_at unchanged. Like the snapshot, the hash is only stored
+        # if no edit has bumped snapshot_version since the text was read.
+        type(resume).objects.filter(pk=resume.pk, snapshot_version=resume.snapshot_version).update(content_hash=content_hash)
+        resume.content_hash = content_hash
+    return content_hash
 # --- END: Moved Helper Function ---
 
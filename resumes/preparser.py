@@ -0,0 +1,265 @@
+"""
+Rule-based pre-parsing of extracted resume text.
+
+Contact details and section boundaries follow predictable patterns, so they are found with
+regexes before Gemini is called. Sections that are simple lists (summary, skills, hobbies)
+are parsed here too, and only the header and the remaining sections are sent to Gemini,
+which keeps the parse prompt short. When Gemini is unavailable the local result is used
+on its own, so an upload still pre-fills the validation form.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import re
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+PHONE_RE = re.compile(r'(?<![\w/])\+?\d[\d\s().-]{7,}\d(?![\w/])')
+URL_RE = re.compile(r'(?:https?://|www\.)[^\s,;|<>()]+|(?:linkedin\.com|github\.com)/[^\s,;|<>()]+', re.IGNORECASE)
+
+# Heading text (lowercased, without trailing colon) -> section key used by the parsed data
+SECTION_HEADINGS = {
+    'summary': 'professional_summary',
+    'professional summary': 'professional_summary',
+    'profile': 'professional_summary',
+    'objective': 'professional_summary',
+    'career objective': 'professional_summary',
+    'about me': 'professional_summary',
+    'experience': 'experience',
+    'work experience': 'experience',
+    'professional experience': 'experience',
+    'employment history': 'experience',
+    'work history': 'experience',
+    'internships': 'experience',
+    'education': 'education',
+    'academic background': 'education',
+    'qualifications': 'education',
+    'skills': 'skills',
+    'technical skills': 'skills',
+    'key skills': 'skills',
+    'core competencies': 'skills',
+    'projects': 'projects',
+    'personal projects': 'projects',
+    'academic projects': 'projects',
+    'certifications': 'certifications',
+    'certificates': 'certifications',
+    'licenses & certifications': 'certifications',
+    'achievements': 'achievements',
+    'awards': 'achievements',
+    'honors & awards': 'achievements',
+    'accomplishments': 'achievements',
+    'languages': 'languages',
+    'hobbies': 'hobbies',
+    'interests': 'hobbies',
+    'hobbies & interests': 'hobbies',
+}
+# Sections whose structure is simple enough to parse without Gemini
+LOCAL_SECTIONS = ('professional_summary', 'skills', 'hobbies')
+# Common headings of sections the parsed data has no key for; their text is left to the model
+OTHER_SECTION_HEADINGS = {
+    'publications', 'research', 'patents', 'conferences', 'presentations', 'references',
+    'declaration', 'volunteering', 'volunteer experience', 'volunteer work', 'activities',
+    'extracurricular activities', 'extra-curricular activities', 'leadership', 'courses',
+    'coursework', 'relevant coursework', 'training', 'memberships', 'affiliations',
+    'professional memberships', 'personal details', 'personal information',
+}
+# Lowercase words allowed in a title-case heading, e.g. "Honors and Awards"
+_HEADING_MINOR_WORDS = {'&', 'and', 'of', 'the', 'in', 'for', 'to'}
+_HEADING_RE = re.compile(r"[A-Za-z][A-Za-z'/-]*(?: (?:&|[A-Za-z][A-Za-z'/-]*)){0,3}")
+
+# Keywords used to guess a skill's category; anything else is 'Other'
+SKILL_CATEGORY_KEYWORDS = {
+    'Frontend': {'html', 'css', 'javascript', 'typescript', 'react', 'angular', 'vue', 'svelte', 'tailwind', 'bootstrap', 'jquery', 'next.js', 'redux'},
+    'Backend': {'python', 'java', 'django', 'flask', 'fastapi', 'node.js', 'node', 'express', 'spring', 'php', 'laravel', 'ruby', 'rails', 'go', 'golang', 'c#', '.net', 'rust', 'kotlin', 'c++'},
+    'Database': {'sql', 'mysql', 'postgresql', 'postgres', 'sqlite', 'mongodb', 'redis', 'oracle', 'cassandra', 'dynamodb', 'elasticsearch', 'firebase'},
+    'DevOps': {'docker', 'kubernetes', 'aws', 'azure', 'gcp', 'jenkins', 'terraform', 'ansible', 'ci/cd', 'linux', 'nginx', 'github actions'},
+    'Tools': {'git', 'github', 'gitlab', 'jira', 'figma', 'postman', 'vs code', 'excel', 'tableau', 'power bi', 'webpack'},
+}
+
+_LIST_SEPARATORS_RE = re.compile(r'[,;|•·▪●\n]+')
+_BULLET_RE = re.compile(r'^\s*[-*•·▪●◦]\s*')
+
+
+@dataclass
+class PreparsedResume:
+    """What the rule-based pass found in a resume's text."""
+    personal_details: Dict[str, Optional[str]]
+    header: str
+    sections: Dict[str, str] = field(default_factory=dict)
+    # Text under headings that weren't recognised, or everything if no headings were found
+    unassigned: str = ''
+
+    def local_data(self) -> Dict:
+        """Returns the parsed data for the sections handled locally, in parse_text_with_gemini's format."""
+        return {
+            'personal_details': dict(self.personal_details),
+            'professional_summary': ' '.join(self.sections.get('professional_summary', '').split()) or None,
+            'skills': [{'name': name, 'category': guess_skill_category(name)} for name in _split_list(self.sections.get('skills', ''))],
+            'hobbies': _split_list(self.sections.get('hobbies', '')),
+        }
+
+    def text_for_model(self) -> str:
+        """Returns the parts of the resume that still need Gemini: the header and non-local sections."""
+        parts = [self.header]
+        parts += [f"{key.replace('_', ' ').title()}:\n{text}" for key, text in self.sections.items() if key not in LOCAL_SECTIONS]
+        if self.unassigned:
+            parts.append(self.unassigned)
+        return '\n\n'.join(part for part in parts if part.strip())
+
+    def chunks_for_model(self, max_chars) -> List[str]:
+        """
+        Splits text_for_model() into pieces of about `max_chars` that can be parsed separately:
+        the header (with any unassigned text), then each remaining section. Small sections are
+        packed together; long ones are split between entries.
+        """
+        blocks = _split_text('\n\n'.join(part for part in (self.header, self.unassigned) if part.strip()), max_chars)
+        for key, text in self.sections.items():
+            if key in LOCAL_SECTIONS:
+                continue
+            title = key.replace('_', ' ').title()
+            # Every piece of a split section keeps its heading, so the model knows what it is reading
+            blocks += [f"{title}:\n{piece}" for piece in _split_text(text, max_chars - len(title) - 2)]
+
+        chunks = []
+        for block in blocks:
+            if chunks and len(chunks[-1]) + len(block) + 2 <= max_chars:
+                chunks[-1] += '\n\n' + block
+            else:
+                chunks.append(block)
+        return chunks
+
+
+def _split_text(text, max_chars):
+    """Splits text at line boundaries into pieces of at most max_chars, preferring blank lines."""
+    pieces, current, size = [], [], 0
+    for line in text.splitlines():
+        if current and size + len(line) + 1 > max_chars:
+            # End the piece at the last blank line, so an entry isn't split across pieces
+            cut = max((index for index, previous in enumerate(current) if not previous.strip()), default=0) or len(current)
+            pieces.append('\n'.join(current[:cut]))
+            current = current[cut:]
+            size = sum(len(previous) + 1 for previous in current)
+        current.append(line)
+        size += len(line) + 1
+    pieces.append('\n'.join(current))
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def _heading_text(line):
+    cleaned = re.sub(r'\s+', ' ', line.strip().rstrip(':').strip())
+    return cleaned if len(cleaned) <= 40 else ''
+
+
+def _heading_key(line):
+    cleaned = _heading_text(line).lower()
+    if not cleaned:
+        return None
+    return SECTION_HEADINGS.get(cleaned.replace(' and ', ' & '))
+
+
+def _is_other_heading(line, after_blank, in_local_section):
+    """
+    True for the heading of a section not in SECTION_HEADINGS: one of OTHER_SECTION_HEADINGS,
+    or, inside a locally parsed section, a short title-case or uppercase line after a blank line.
+    Elsewhere such lines are usually entry titles (e.g. a job title under Experience).
+    """
+    text = _heading_text(line)
+    if not text:
+        return False
+    if text.lower().replace(' and ', ' & ') in OTHER_SECTION_HEADINGS:
+        return True
+    if not (after_blank and in_local_section and _HEADING_RE.fullmatch(text)):
+        return False
+    return text.isupper() or all(word[0].isupper() for word in text.split() if word.lower() not in _HEADING_MINOR_WORDS)
+
+
+def _split_list(text):
+    items = []
+    for item in _LIST_SEPARATORS_RE.split(text):
+        # "Languages: Python, Java" style category labels are not skills themselves
+        item = _BULLET_RE.sub('', item.split(':', 1)[-1]).strip(' .')
+        if item and len(item) <= 60 and item not in items:
+            items.append(item)
+    return items
+
+
+def guess_skill_category(name):
+    """Returns the skill category for well-known technologies, else 'Other'."""
+    lowered = name.lower()
+    for category, keywords in SKILL_CATEGORY_KEYWORDS.items():
+        if lowered in keywords:
+            return category
+    return 'Other'
+
+
+def extract_personal_details(text):
+    """Finds the email, phone number, LinkedIn and portfolio URLs in resume text."""
+    email = EMAIL_RE.search(text)
+    urls = [url.rstrip('.') for url in URL_RE.findall(text) if '@' not in url]
+    linkedin = next((url for url in urls if 'linkedin.com' in url.lower()), None)
+    portfolio = next((url for url in urls if 'linkedin.com' not in url.lower()), None)
+    phone = None
+    for match in PHONE_RE.finditer(text):
+        candidate = match.group(0).strip()
+        digits = re.sub(r'\D', '', candidate)
+        # Skip date ranges like "2019 - 2021" that also look like digit runs
+        if 9 <= len(digits) <= 15 and not re.fullmatch(r'(?:19|20)\d{2}\s*[-–]\s*(?:19|20)\d{2}', candidate):
+            phone = candidate
+            break
+    return {
+        'email': email.group(0) if email else None,
+        'phone_number': phone,
+        'linkedin_url': linkedin,
+        'portfolio_url': portfolio,
+    }
+
+
+def _guess_full_name(header):
+    for line in header.splitlines():
+        line = line.strip()
+        if not line or EMAIL_RE.search(line) or URL_RE.search(line) or any(char.isdigit() for char in line):
+            continue
+        # Names are a few capitalised words, possibly followed by " - Job Title"
+        candidate = re.split(r'\s+[-–|]\s+', line)[0].strip()
+        words = candidate.split()
+        if 2 <= len(words) <= 4 and all(word[0].isupper() and word.replace('.', '').replace("'", '').isalpha() for word in words):
+            return candidate
+        return None
+    return None
+
+
+def preparse_resume_text(text):
+    """Splits resume text into its header and sections and extracts the contact details."""
+    header_lines, unassigned_lines = [], []
+    sections = {}
+    current = None
+    # Lines under an unrecognised heading go to `unassigned`, never into the section before it
+    in_other = False
+    after_blank = True
+    for line in text.splitlines():
+        key = _heading_key(line)
+        if key:
+            current, in_other = key, False
+            sections.setdefault(current, '')
+        elif current is not None and not in_other and _is_other_heading(line, after_blank, current in LOCAL_SECTIONS):
+            in_other = True
+            unassigned_lines.append(line)
+        elif current is None:
+            header_lines.append(line)
+        elif in_other:
+            unassigned_lines.append(line)
+        else:
+            sections[current] += line + '\n'
+        after_blank = not line.strip()
+
+    if not sections:
+        # No recognisable headings; leave the whole text to the model
+        header_lines, unassigned_lines = [], text.splitlines()
+
+    header = '\n'.join(header_lines).strip()
+    personal_details = extract_personal_details(text)
+    personal_details['full_name'] = _guess_full_name(header or text)
+    return PreparsedResume(
+        personal_details=personal_details,
+        header=header,
+        sections={key: value.strip() for key, value in sections.items()},
+        unassigned='\n'.join(unassigned_lines).strip(),
+    )
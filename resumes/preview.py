@@ -0,0 +1,131 @@
+"""
+Stylesheets and markup for the in-browser resume preview.
+
+The preview shows the PDF templates inside the regular site, so each template's styles are
+rescoped under `.resume-wrapper .resume-content` to override Tailwind. The rewriting only
+depends on the template, so it runs once per template and process; the accent color is
+left as a CSS variable that the preview page sets.
+
+The resume bodies mark their sections with {% preview_section %}. Each section gets a hash
+of the resume data it shows, so the live preview only re-renders sections whose hash the
+browser doesn't have yet.
+"""
+from functools import lru_cache
+import json
+import re
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+from core.utils import compute_content_hash
+from .documents import build_profile_data
+from .templatetags.resume_preview import PreviewSectionNode
+
+PREVIEW_SCOPE = '.resume-wrapper .resume-content'
+# Rendered into the template styles in place of the accent color; the preview sets --resume-accent
+ACCENT_COLOR_VARIABLE = 'var(--resume-accent)'
+
+
+def _scope_class_selector(match):
+    before = match.group(1)  # Everything before the class selector
+    class_name = match.group(2)  # The class name (e.g., .name, .section-title)
+    after = match.group(3)  # Everything after (usually { or whitespace)
+
+    # Don't scope if already scoped
+    if PREVIEW_SCOPE in before:
+        return match.group(0)
+
+    # Don't scope inside an @media block - let it apply naturally
+    check_text = before[-200:] if len(before) > 200 else before
+    if '@media' in check_text and check_text.count('{') > check_text.count('}'):
+        return match.group(0)
+
+    # Don't scope if it's part of a compound selector (e.g., ".contact-info .separator")
+    lines = before.split('\n')
+    if lines and re.search(r'[.#\w-]+\s+$', lines[-1].strip()):
+        return match.group(0)
+
+    return f'{before}{PREVIEW_SCOPE} {class_name}{after}'
+
+
+def scope_preview_css(css):
+    """Rewrites template CSS so its html, body and class rules only apply inside the preview."""
+    # Scope html/body styles for higher specificity, so template styles override Tailwind
+    css = re.sub(r'html\s*,', f'{PREVIEW_SCOPE},', css)
+    css = re.sub(r',\s*html\s*{', f', {PREVIEW_SCOPE} {{', css)
+    css = re.sub(r'body\s*,', f'{PREVIEW_SCOPE},', css)
+    css = re.sub(r',\s*body\s*{', f', {PREVIEW_SCOPE} {{', css)
+    css = re.sub(r'^html\s*{', f'{PREVIEW_SCOPE} {{', css, flags=re.MULTILINE)
+    css = re.sub(r'^body\s*{', f'{PREVIEW_SCOPE} {{', css, flags=re.MULTILINE)
+    # @page rules don't apply on screen; PDF margins are handled when rendering the PDF
+    css = re.sub(r'@page\s*\{[^}]*\}', '', css, flags=re.DOTALL)
+    # Scope class selectors that start a new rule
+    css = re.sub(r'([\s,}]*)(\.[a-zA-Z_][a-zA-Z0-9_-]+)(\s*{)', _scope_class_selector, css, flags=re.MULTILINE)
+    # Clean up any double-scoping
+    return re.sub(rf'{re.escape(PREVIEW_SCOPE)} ({re.escape(PREVIEW_SCOPE)} )+', f'{PREVIEW_SCOPE} ', css)
+
+
+@lru_cache(maxsize=None)
+def _build_preview_css(template_name):
+    html = get_template(f'resumes/partials/resume_pdf_{template_name}_styles.html').render({'accent_color': ACCENT_COLOR_VARIABLE})
+    styles = re.findall(r'<style[^>]*>(.*?)</style>', html, re.DOTALL | re.IGNORECASE)
+    css = scope_preview_css('\n'.join(styles))
+    return css, compute_content_hash(css)[:12]
+
+
+def get_preview_css(template_name):
+    """
+    Returns (scoped CSS, version) for a template's preview stylesheet. Built once per process;
+    in DEBUG it is rebuilt on every call so template edits show up without a restart.
+    """
+    if settings.DEBUG:
+        _build_preview_css.cache_clear()
+    return _build_preview_css(template_name)
+
+
+def _body_template_path(template_name):
+    return f'resumes/partials/resume_pdf_{template_name}_body.html'
+
+
+def render_preview_body(template_name, context, request=None):
+    """Renders only the body of a resume template for the preview."""
+    return render_to_string(_body_template_path(template_name), context, request=request)
+
+
+@lru_cache(maxsize=None)
+def _load_preview_sections(template_name):
+    body = get_template(_body_template_path(template_name)).template
+    sections = tuple((node.name, node.dependencies) for node in body.nodelist.get_nodes_by_type(PreviewSectionNode))
+    return sections, compute_content_hash(body.source)[:12]
+
+
+def get_preview_sections(template_name):
+    """
+    Returns ((section name, dependencies), ...) for a template body and a hash of the body's
+    source, so edited templates invalidate every section.
+    """
+    if settings.DEBUG:
+        _load_preview_sections.cache_clear()
+    return _load_preview_sections(template_name)
+
+
+def get_section_hashes(template_name, document):
+    """Returns {section name: hash of the data it shows} for a resume document."""
+    data = dict(document.resume.snapshot or {})
+    data['profile'] = build_profile_data(document.profile)
+    data['today'] = timezone.localdate().isoformat()
+    sections, body_version = get_preview_sections(template_name)
+    return {
+        name: compute_content_hash(body_version, json.dumps([data.get(key) for key in dependencies], sort_keys=True, default=str))[:16]
+        for name, dependencies in sections
+    }
+
+
+def render_preview_sections(template_name, context, hashes, sections=None, request=None):
+    """
+    Renders the given sections (all of them if `sections` is None) without the rest of the
+    body and returns {section name: html}.
+    """
+    fragments = {}
+    context = dict(context, preview_hashes=hashes, preview_fragments=fragments, preview_sections=sections)
+    render_preview_body(template_name, context, request=request)
+    return fragments
@@ -0,0 +1,245 @@
+"""
+Helpers for rendering resume PDFs with WeasyPrint.
+
+Templates, the per-template @page stylesheets and the font configuration are built once
+per process and reused, so a warm worker only pays for layout on each render.
+
+WeasyPrint resolves images and stylesheets through a URL fetcher. The default one
+downloads /static/ and /media/ assets over HTTP from our own web server, which ties up
+a web worker per asset while another worker is busy rendering. The fetcher here reads
+them from the staticfiles finders and the storage backend instead, and keeps recently
+used assets in memory.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from urllib.parse import unquote, urlsplit
+import logging
+import mimetypes
+import os
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.storage import default_storage
+from django.template.loader import get_template
+from django.utils._os import safe_join
+
+logger = logging.getLogger(__name__)
+
+PDF_TEMPLATES = ['classic', 'modern', 'professional', 'creative']
+
+# Page margins matching each template's own @page rules
+PAGE_CSS = {
+    'modern': '@page { size: A4; margin: 0 }',
+    'creative': '@page { size: A4; margin: 0.5cm }',
+}
+DEFAULT_PAGE_CSS = '@page { size: A4; margin: 1.5cm }'
+
+# Assets larger than this are not cached, so a few big photos can't evict everything else
+ASSET_CACHE_MAX_ITEM_BYTES = 2 * 1024 * 1024
+ASSET_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class _AssetCache:
+    """Thread-safe LRU cache of fetched assets, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        size = len(item['string'])
+        if size > ASSET_CACHE_MAX_ITEM_BYTES:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous['string'])
+            self._items[key] = item
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted['string'])
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+asset_cache = _AssetCache(ASSET_CACHE_MAX_BYTES)
+
+
+def _url_path_prefix(url_setting):
+    path = urlsplit(url_setting or '').path
+    return path if path.startswith('/') else '/' + path
+
+
+def _read_static(relative_path):
+    path = finders.find(relative_path)
+    if not path and settings.STATIC_ROOT:
+        try:
+            path = safe_join(settings.STATIC_ROOT, relative_path)
+        except ValueError:
+            raise FileNotFoundError(f"Static file not found: {relative_path}")
+    if not path or not os.path.isfile(path):
+        raise FileNotFoundError(f"Static file not found: {relative_path}")
+    with open(path, 'rb') as static_file:
+        return static_file.read()
+
+
+def _read_media(name):
+    try:
+        with default_storage.open(name, 'rb') as media_file:
+            return media_file.read()
+    except Exception as e:
+        # Includes SuspiciousFileOperation for names escaping the media root
+        raise FileNotFoundError(f"Media file not readable: {name} ({e})")
+
+
+def _fetch_local(url, base_url):
+    """
+    Returns the bytes of a /static/ or /media/ asset served by this site, or None if the URL
+    isn't one. Missing local assets raise FileNotFoundError rather than being requested over HTTP.
+    """
+    media_url = settings.MEDIA_URL or ''
+    if urlsplit(media_url).netloc:
+        # Media served straight from S3
+        if url.startswith(media_url):
+            return _read_media(unquote(url[len(media_url):]))
+        media_prefix = None
+    else:
+        media_prefix = _url_path_prefix(media_url)
+
+    parsed = urlsplit(url)
+    if parsed.scheme not in ('http', 'https') or (base_url and parsed.netloc != urlsplit(base_url).netloc):
+        return None
+    path = unquote(parsed.path)
+    static_prefix = _url_path_prefix(settings.STATIC_URL)
+    if path.startswith(static_prefix):
+        return _read_static(path[len(static_prefix):])
+    if media_prefix and path.startswith(media_prefix):
+        return _read_media(path[len(media_prefix):])
+    return None
+
+
+def get_url_fetcher(base_url):
+    """
+    Returns a WeasyPrint url_fetcher for documents rendered with the given base_url.
+    Local assets are read from disk or storage; anything else falls back to WeasyPrint's
+    default fetcher. Successful fetches are cached in-process.
+    """
+    def url_fetcher(url, *args, **kwargs):
+        if url.startswith('data:'):
+            from weasyprint import default_url_fetcher
+            return default_url_fetcher(url, *args, **kwargs)
+
+        cached = asset_cache.get(url)
+        if cached is not None:
+            return dict(cached)
+
+        content = _fetch_local(url, base_url)
+        if content is not None:
+            mime_type = mimetypes.guess_type(urlsplit(url).path)[0] or 'application/octet-stream'
+            result = {'string': content, 'mime_type': mime_type, 'redirected_url': url}
+        else:
+            from weasyprint import default_url_fetcher
+            result = default_url_fetcher(url, *args, **kwargs)
+            if 'file_obj' in result:
+                result['string'] = result.pop('file_obj').read()
+
+        asset_cache.put(url, result)
+        return dict(result)
+
+    return url_fetcher
+
+
+@lru_cache(maxsize=None)
+def _load_pdf_template(template_name):
+    return get_template(f'resumes/resume_pdf_{template_name}.html')
+
+
+def get_pdf_template(template_name):
+    """
+    Returns the compiled resume_pdf_<name>.html template, loaded once per process.
+    In DEBUG it is reloaded every time so template edits show up without a restart.
+    """
+    if settings.DEBUG:
+        return get_template(f'resumes/resume_pdf_{template_name}.html')
+    return _load_pdf_template(template_name)
+
+
+@lru_cache(maxsize=None)
+def get_font_config():
+    """Returns the process-wide WeasyPrint font configuration, so fonts are only resolved once."""
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+    except ImportError:
+        # WeasyPrint < 53
+        from weasyprint.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def get_page_stylesheet(template_name):
+    """Returns the parsed @page stylesheet for a template."""
+    from weasyprint import CSS
+    return CSS(string=PAGE_CSS.get(template_name, DEFAULT_PAGE_CSS), font_config=get_font_config())
+
+
+def render_resume_html(template_name, context):
+    """Renders a resume PDF template to HTML."""
+    return get_pdf_template(template_name).render(context)
+
+
+def write_resume_pdf(html, template_name, base_url):
+    """Lays out rendered resume HTML and returns the PDF bytes."""
+    from weasyprint import HTML
+    document = HTML(string=html, base_url=base_url, url_fetcher=get_url_fetcher(base_url))
+    return document.write_pdf(stylesheets=[get_page_stylesheet(template_name)], font_config=get_font_config())
+
+
+def render_resume_pdf(template_name, context, base_url):
+    """Renders a resume template with the given context to PDF bytes."""
+    return write_resume_pdf(render_resume_html(template_name, context), template_name, base_url)
+
+
+_warmed_up = False
+WARM_UP_BASE_URL = 'http://localhost/'
+
+
+def reset_renderer():
+    """Drops everything cached by the renderer, returning the process to a cold state."""
+    global _warmed_up
+    _warmed_up = False
+    _load_pdf_template.cache_clear()
+    get_page_stylesheet.cache_clear()
+    get_font_config.cache_clear()
+    asset_cache.clear()
+
+
+def warm_up_renderer():
+    """
+    Preloads templates, stylesheets and fonts, then renders a small document so WeasyPrint,
+    Pango and fontconfig finish their own lazy initialisation before the first real render.
+    Safe to call more than once; only the first call does any work.
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+    try:
+        for template_name in PDF_TEMPLATES:
+            # An empty context still exercises each template's stylesheet and web fonts
+            render_resume_pdf(template_name, {}, WARM_UP_BASE_URL)
+        _warmed_up = True
+        logger.info("PDF renderer warmed up.")
+    except Exception as e:
+        logger.warning(f"Could not warm up PDF renderer: {e}")
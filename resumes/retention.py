@@ -0,0 +1,91 @@
+"""
+Retention policy for generated resume PDFs.
+
+Generated PDFs are only a cache of what the resume looked like when it was downloaded,
+so old renders can always be dropped and regenerated on demand.
+"""
+from datetime import timedelta
+import logging
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import Length, RowNumber
+from django.utils import timezone
+from .models import ResumePDFGeneration
+
+logger = logging.getLogger(__name__)
+
+
+def expired_pdf_generations(keep=None, max_age_days=None, failed_hours=None, now=None):
+    """
+    Returns the PDF generations the retention policy allows deleting:
+    completed renders beyond the newest `keep` per resume (or resume version) and template,
+    completed renders older than `max_age_days`, and failed or abandoned generations older
+    than `failed_hours`. Recent pending generations are never included.
+    """
+    keep = settings.PDF_RETENTION_KEEP_PER_TEMPLATE if keep is None else keep
+    max_age_days = settings.PDF_RETENTION_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    failed_hours = settings.PDF_RETENTION_FAILED_HOURS if failed_hours is None else failed_hours
+    now = now or timezone.now()
+
+    superseded_ids = ResumePDFGeneration.objects.filter(status='completed').annotate(
+        newest_rank=Window(
+            RowNumber(),
+            partition_by=[F('resume_id'), F('resume_version_id'), F('template_name')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(newest_rank__gt=keep).values('id')
+
+    return ResumePDFGeneration.objects.filter(
+        Q(id__in=superseded_ids)
+        | Q(status='completed', created_at__lt=now - timedelta(days=max_age_days))
+        | Q(status__in=['failed', 'pending', 'processing'], created_at__lt=now - timedelta(hours=failed_hours))
+    )
+
+
+def _stored_file_size(storage, name):
+    try:
+        return storage.size(name)
+    except Exception:
+        # Already gone from storage
+        return 0
+
+
+def cleanup_pdf_generations(keep=None, max_age_days=None, failed_hours=None, batch_size=None, dry_run=False):
+    """
+    Deletes expired PDF generations and their stored files in small batches, so each
+    DELETE holds its row locks only briefly.
+    Returns {'rows': ..., 'files': ..., 'bytes': ...} with what was (or would be) reclaimed.
+    """
+    batch_size = batch_size or settings.PDF_RETENTION_BATCH_SIZE
+    expired = expired_pdf_generations(keep, max_age_days, failed_hours).annotate(
+        db_bytes=Length('pdf_content')
+    ).order_by('id')
+    storage = ResumePDFGeneration._meta.get_field('pdf_file').storage
+    totals = {'rows': 0, 'files': 0, 'bytes': 0}
+
+    last_id = 0
+    while True:
+        batch = list(expired.filter(id__gt=last_id).values_list('id', 'pdf_file', 'db_bytes')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        for _, file_name, db_bytes in batch:
+            totals['bytes'] += db_bytes or 0
+            if file_name:
+                totals['bytes'] += _stored_file_size(storage, file_name)
+                totals['files'] += 1
+                if not dry_run:
+                    try:
+                        storage.delete(file_name)
+                    except Exception as e:
+                        logger.warning(f"Could not delete generated PDF {file_name}: {e}")
+        if not dry_run:
+            ResumePDFGeneration.objects.filter(id__in=[row[0] for row in batch]).delete()
+        totals['rows'] += len(batch)
+
+    logger.info(
+        f"PDF cleanup {'(dry run) ' if dry_run else ''}removed {totals['rows']} generations, "
+        f"{totals['files']} files, {totals['bytes']} bytes"
+    )
+    return totals
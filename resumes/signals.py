@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import JobSeekerProfile
+from .models import Resume, Experience, Education, Skill, Project, Certification, Achievement, Language, Hobby
+
+RESUME_SECTION_MODELS = (Experience, Education, Skill, Project, Certification, Achievement, Language, Hobby)
+
+
+def _clear_content_hash(resumes):
+    # A queryset update leaves updated_at alone; the hash is recomputed the next time it is needed.
+    # Bumping snapshot_version also discards a hash of the old text that is still being stored.
+    resumes.update(content_hash=None, snapshot_version=F('snapshot_version') + 1)
+
+
+def section_changed(sender, instance, **kwargs):
+    """
+    Invalidates the stored content hash and snapshot when a resume section is added, edited
+    or deleted. The invalidation is part of the section write's transaction, so readers never
+    see a snapshot older than the committed sections; the snapshot is rebuilt once it commits.
+    """
+    resume_id = instance.resume_id
+    Resume.objects.filter(pk=resume_id).update(
+        content_hash=None, snapshot=None, snapshot_version=F('snapshot_version') + 1
+    )
+
+    from .documents import refresh_resume_snapshot
+    transaction.on_commit(lambda: refresh_resume_snapshot(resume_id))
+
+
+for section_model in RESUME_SECTION_MODELS:
+    post_save.connect(section_changed, sender=section_model, dispatch_uid=f'resume_section_saved_{section_model.__name__}')
+    post_delete.connect(section_changed, sender=section_model, dispatch_uid=f'resume_section_deleted_{section_model.__name__}')
+
+
+@receiver(post_save, sender=JobSeekerProfile)
+def profile_changed(sender, instance, **kwargs):
+    """The name and summary are part of the resume text, so profile edits invalidate it too."""
+    _clear_content_hash(Resume.objects.filter(profile=instance))
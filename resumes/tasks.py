@@ -1,83 +1,99 @@
 from celery import shared_task
-from django.core.files.storage import FileSystemStorage, default_storage
-from django.core.files.base import ContentFile
-from django.template.loader import get_template
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .parser import extract_text_from_docx, extract_text_from_pdf, parse_text_with_gemini, get_full_resume_text, score_and_critique_resume
-from .models import Resume, ParsedResumeCache, ResumePDFGeneration, Experience, Education, Skill, Project, Certification, Achievement, Language, Hobby
+from .parser import extract_text_from_file, parse_resume_text, parse_resume_text_locally, get_full_resume_text, get_resume_content_hash, score_and_critique_resume
+from .models import Resume, ParsedResumeCache, ResumePDFGeneration, resume_upload_storage
+from .documents import load_resume_document, build_resume_context, get_document_fingerprint
+from .retention import cleanup_pdf_generations
+from .rendering import render_resume_pdf
+from .uploads import delete_resume_upload
+from .parse_cache import cleanup_parse_cache, get_cached_parse, hash_file_content, hash_resume_text, store_parse
+from core.ai_gateway import GeminiRateLimited
 import json
 import logging
-import os
-import base64
-import tempfile
 
 # Use a more specific logger for better debugging
 logger = logging.getLogger(__name__)
 
-@shared_task
-def parse_resume_task(user_id, filename, file_content_b64):
+def _store_parsed_resume(user_id, structured_data):
+    """Hands parsed data to the validation step, which picks it up (and deletes it) on its next poll."""
+    # Use update_or_create to handle existing entries
+    ParsedResumeCache.objects.update_or_create(
+        profile_id=user_id,
+        defaults={'parsed_data': structured_data}
+    )
+
+
+@shared_task(bind=True)
+def parse_resume_task(self, user_id, filename, upload_name):
     """
     Asynchronous task to parse a resume file and store the structured data.
+    Re-queues itself, keeping the upload, while the Gemini quota is exhausted.
     
     Args:
         user_id: The ID of the user uploading the resume
         filename: The original filename (e.g., 'resume.pdf')
-        file_content_b64: Base64-encoded file content as a string
+        upload_name: Name of the uploaded file in STORAGES['resume_uploads']
     """
-    temp_file_path = None
+    requeued = False
     try:
         logger.info(f"Starting resume parse task for user_id: {user_id} and file: {filename}")
         
-        # Decode base64 file content
-        file_content = base64.b64decode(file_content_b64)
-        
-        # Create a temporary file to store the content
-        # This is necessary because PyMuPDF and python-docx require file paths
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
-        logger.info(f"Created temporary file: {temp_file_path} for processing")
-        
-        # Extract text from the file
-        text = ""
-        if filename.lower().endswith('.pdf'):
-            text = extract_text_from_pdf(temp_file_path)
-        elif filename.lower().endswith('.docx'):
-            text = extract_text_from_docx(temp_file_path)
-        else:
-            logger.error(f"Unsupported file type: {filename}")
+        with resume_upload_storage().open(upload_name, 'rb') as upload:
+            content = upload.read(settings.RESUME_UPLOAD_MAX_BYTES + 1)
+
+        # The same file uploaded again reuses the earlier parse
+        content_hash = hash_file_content(content)
+        structured_data = get_cached_parse(file_hash=content_hash)
+        if structured_data:
+            logger.info(f"Reusing cached parse of {filename} for user_id: {user_id}.")
+            _store_parsed_resume(user_id, structured_data)
+            return
+
+        # Extract text from the file in memory; no temporary file is written
+        text = extract_text_from_file(content, filename)
 
         if text:
+            resume_text_hash = hash_resume_text(text)
+            structured_data = get_cached_parse(file_hash=content_hash, text_hash=resume_text_hash)
+            if structured_data:
+                logger.info(f"Reusing cached parse of identical text from {filename} for user_id: {user_id}.")
+                _store_parsed_resume(user_id, structured_data)
+                return
+
             logger.info(f"Extracted text from {filename}. Length: {len(text)} chars. Now calling Gemini for parsing.")
-            structured_data = parse_text_with_gemini(text)
+            structured_data = parse_resume_text(text)
             if structured_data:
                 logger.info(f"Successfully parsed resume data for user_id: {user_id}.")
-                # Use update_or_create to handle existing entries
-                ParsedResumeCache.objects.update_or_create(
-                    profile_id=user_id,
-                    defaults={'parsed_data': structured_data}
-                )
+                # A fallback parse made while Gemini was down isn't reused for later uploads
+                if not structured_data.get('parsed_locally'):
+                    store_parse(content_hash, resume_text_hash, structured_data)
+                _store_parsed_resume(user_id, structured_data)
             else:
                 logger.error(f"Gemini parsing returned no structured data for user_id: {user_id}.")
         else:
             logger.warning(f"No text could be extracted from file {filename} for user_id: {user_id}.")
 
+    except GeminiRateLimited as e:
+        if self.request.retries >= settings.GEMINI_RATE_LIMIT_MAX_REQUEUES:
+            # The text was extracted before Gemini was called; the user still gets the rule-based fields
+            logger.error(f"Gemini quota stayed exhausted; storing the rule-based parse of {filename} for user {user_id}.")
+            _store_parsed_resume(user_id, parse_resume_text_locally(text))
+            return
+        logger.warning(f"Gemini quota exhausted while parsing {filename}; retrying in {e.retry_after}s.")
+        requeued = True
+        raise self.retry(exc=e, countdown=e.retry_after, max_retries=settings.GEMINI_RATE_LIMIT_MAX_REQUEUES)
     except Exception as e:
         logger.error(f"Error in parse_resume_task for user {user_id}: {e}", exc_info=True)
     finally:
-        # Clean up the temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file {temp_file_path}: {e}")
+        # The re-queued task reads the upload again
+        if not requeued:
+            delete_resume_upload(upload_name)
 
 
-@shared_task
-def update_resume_score_task(resume_id):
+@shared_task(bind=True)
+def update_resume_score_task(self, resume_id):
     """
     Asynchronous task to calculate and save the AI score and feedback for a resume.
     """
@@ -85,12 +101,19 @@ def update_resume_score_task(resume_id):
     try:
         resume = Resume.objects.get(id=resume_id)
         full_resume_text = get_full_resume_text(resume)
+        content_hash = get_resume_content_hash(resume, full_resume_text)
+
+        if resume.score is not None and resume.critique_hash == content_hash:
+            logger.info(f"Resume {resume_id} text is unchanged since its last critique. Skipping Gemini call.")
+            return
 
+        # update_fields keeps updated_at unchanged, so saving a score doesn't look like an edit
         if not full_resume_text.strip() or len(full_resume_text.strip()) < 100:
              logger.warning(f"Resume {resume_id} has insufficient content to score. Setting score to 0.")
              resume.score = 0
              resume.feedback = json.dumps(["Resume is too empty to provide a score. Please add more content."])
-             resume.save()
+             resume.critique_hash = content_hash
+             resume.save(update_fields=['score', 'feedback', 'critique_hash'])
              return
 
         logger.info(f"Resume {resume_id} has sufficient content. Calling Gemini for scoring and critique.")
@@ -99,16 +122,65 @@ def update_resume_score_task(resume_id):
         if score_data and 'score' in score_data and 'feedback' in score_data:
             resume.score = score_data.get('score')
             resume.feedback = json.dumps(score_data.get('feedback', []))
-            resume.save()
+            resume.critique_hash = content_hash
+            resume.save(update_fields=['score', 'feedback', 'critique_hash'])
             logger.info(f"Successfully updated score for Resume ID: {resume_id} to {resume.score}")
         else:
             logger.error(f"Failed to get valid score_data from AI for Resume ID: {resume_id}. AI response was: {score_data}")
 
     except Resume.DoesNotExist:
         logger.error(f"Resume with ID {resume_id} not found for scoring.")
+    except GeminiRateLimited as e:
+        logger.warning(f"Gemini quota exhausted while scoring Resume ID: {resume_id}; retrying in {e.retry_after}s.")
+        raise self.retry(exc=e, countdown=e.retry_after, max_retries=settings.GEMINI_RATE_LIMIT_MAX_REQUEUES)
     except Exception as e:
         logger.error(f"An unexpected error occurred in update_resume_score_task for resume {resume_id}: {e}", exc_info=True)
 
+def schedule_resume_rescore(resume_id):
+    """
+    Marks a resume as needing a rescore and schedules one delayed rescore task.
+    Edits made while a rescore is already pending don't queue anything new; the
+    scheduled task waits until the resume has stopped changing.
+    """
+    # The rescore_pending=False filter makes the check-and-set atomic across concurrent requests
+    marked = Resume.objects.filter(pk=resume_id, rescore_pending=False).update(rescore_pending=True)
+    if marked:
+        debounce = getattr(settings, 'RESUME_RESCORE_DEBOUNCE_SECONDS', 15)
+        transaction.on_commit(lambda: rescore_resume_task.apply_async((resume_id,), countdown=debounce))
+
+
+@shared_task
+def rescore_resume_task(resume_id):
+    """
+    Debounced rescore of a resume after builder edits: recalculates its AI score and
+    refreshes its existing job match scores once the edits have settled.
+    """
+    try:
+        resume = Resume.objects.get(id=resume_id)
+    except Resume.DoesNotExist:
+        logger.warning(f"Resume with ID {resume_id} not found for rescoring.")
+        return
+
+    debounce = getattr(settings, 'RESUME_RESCORE_DEBOUNCE_SECONDS', 15)
+    quiet_seconds = (timezone.now() - resume.updated_at).total_seconds()
+    if quiet_seconds < debounce:
+        # Still being edited; check again once the debounce window has passed
+        rescore_resume_task.apply_async((resume_id,), countdown=max(1, debounce - quiet_seconds))
+        return
+
+    # Clear the flag before reading the resume so edits made during scoring schedule another pass
+    Resume.objects.filter(pk=resume_id).update(rescore_pending=False)
+
+    try:
+        update_resume_score_task(resume_id)
+    except GeminiRateLimited as e:
+        # Called directly, the scoring task can't retry itself; queue it so the match scores still refresh now
+        update_resume_score_task.apply_async((resume_id,), countdown=e.retry_after)
+
+    from jobs.tasks import refresh_resume_match_scores
+    refresh_resume_match_scores(resume)
+
+
 @shared_task
 def generate_resume_pdf_task(pdf_generation_id, base_url):
     """
@@ -126,7 +198,7 @@ def generate_resume_pdf_task(pdf_generation_id, base_url):
         
         # Check if WeasyPrint is available
         try:
-            from weasyprint import HTML, CSS
+            import weasyprint  # noqa: F401
         except ImportError:
             pdf_gen.status = 'failed'
             pdf_gen.error_message = 'PDF generation service (WeasyPrint) is not available.'
@@ -134,30 +206,6 @@ def generate_resume_pdf_task(pdf_generation_id, base_url):
             logger.error("WeasyPrint is not available for PDF generation.")
             return
         
-        # Get resume context
-        def process_description(items):
-            processed_items = []
-            for item in items:
-                if item.description:
-                    clean_desc = '\n'.join(line.lstrip('*-• ') for line in item.description.splitlines())
-                    item.description_points = [point.strip() for point in clean_desc.splitlines() if point.strip()]
-                else:
-                    item.description_points = []
-                processed_items.append(item)
-            return processed_items
-
-        experiences = Experience.objects.filter(resume=resume).order_by('-start_date')
-        projects = Project.objects.filter(resume=resume)
-
-        # Group skills by category
-        skills_by_category = {}
-        skills_qs = Skill.objects.filter(resume=resume).order_by('category')
-        for skill in skills_qs:
-            category = skill.get_category_display()
-            if category not in skills_by_category:
-                skills_by_category[category] = []
-            skills_by_category[category].append(skill.name)
-
         # Color mapping
         color_map = {
             'blue': '#3498db',
@@ -169,48 +217,19 @@ def generate_resume_pdf_task(pdf_generation_id, base_url):
         }
         accent_color_hex = color_map.get(pdf_gen.accent_color, '#3498db')
 
-        context = {
-            'resume': resume,
-            'experiences': process_description(experiences),
-            'projects': process_description(projects),
-            'educations': Education.objects.filter(resume=resume).order_by('-start_date'),
-            'skills_by_category': skills_by_category,
-            'certifications': Certification.objects.filter(resume=resume),
-            'achievements': Achievement.objects.filter(resume=resume),
-            'languages': Language.objects.filter(resume=resume),
-            'hobbies': [hobby.name for hobby in Hobby.objects.filter(resume=resume)],
-            'settings': settings,
-            'accent_color': accent_color_hex,
-        }
+        document = load_resume_document(resume)
+        context = build_resume_context(document, accent_color=accent_color_hex)
         
-        # Render template
-        template_path = f'resumes/resume_pdf_{pdf_gen.template_name}.html'
-        template = get_template(template_path)
-        html = template.render(context)
+        # Render with the preloaded template, @page stylesheet and fonts
+        pdf_bytes = render_resume_pdf(pdf_gen.template_name, context, base_url)
         
-        # Generate PDF with template-specific margins
-        html_obj = HTML(string=html, base_url=base_url)
-        # Set template-specific margins to match the template's @page rules
-        if pdf_gen.template_name == 'modern':
-            page_css = '@page { size: A4; margin: 0 }'
-        elif pdf_gen.template_name == 'creative':
-            page_css = '@page { size: A4; margin: 0.5cm }'
-        else:  # classic and professional
-            page_css = '@page { size: A4; margin: 1.5cm }'
-        pdf_bytes = html_obj.write_pdf(stylesheets=[CSS(string=page_css)])
-        
-        # Save PDF file - store in database for Railway compatibility (containers have separate filesystems)
-        filename = f"resume_{resume.id}_{pdf_gen.template_name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        # Store PDF content in database (Railway containers have separate filesystems)
-        pdf_gen.pdf_content = pdf_bytes
-        # Also try to save to file system (for local development)
-        try:
-            pdf_gen.pdf_file.save(filename, ContentFile(pdf_bytes), save=False)
-        except Exception as e:
-            logger.warning(f"Could not save PDF to filesystem (this is normal in Railway): {e}")
+        # Store the PDF in the generated PDFs storage (S3 in production, so web and worker containers share it)
+        pdf_gen.store_pdf(pdf_bytes)
+        # Record the content actually rendered, which may be newer than when the download was requested
+        pdf_gen.content_hash = get_document_fingerprint(document)
         pdf_gen.status = 'completed'
         pdf_gen.completed_at = timezone.now()
-        pdf_gen.save(update_fields=['status', 'pdf_file', 'pdf_content', 'completed_at'])
+        pdf_gen.save(update_fields=['status', 'pdf_file', 'pdf_content', 'content_hash', 'completed_at'])
         
         logger.info(f"Successfully generated PDF for Resume ID: {resume.id}, PDF Generation ID: {pdf_generation_id}")
         
@@ -226,3 +245,18 @@ def generate_resume_pdf_task(pdf_generation_id, base_url):
         except:
             pass
 
+
+@shared_task
+def cleanup_pdf_generations_task():
+    """
+    Periodic task (scheduled with Celery beat) that applies the generated PDF retention policy.
+    """
+    return cleanup_pdf_generations()
+
+
+@shared_task
+def cleanup_resume_parse_cache_task():
+    """
+    Periodic task (scheduled with Celery beat) that evicts expired and least recently used resume parses.
+    """
+    return cleanup_parse_cache()
@@ -0,0 +1,59 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Resume data a preview section can depend on: the profile details, each snapshot section,
+# and the current date for templates that print it
+PREVIEW_SECTION_DEPENDENCIES = {
+    'profile', 'experiences', 'educations', 'skills', 'projects',
+    'certifications', 'achievements', 'languages', 'hobbies', 'today',
+}
+
+
+class PreviewSectionNode(template.Node):
+    """
+    Marks a part of a resume body that the live preview can re-render on its own.
+    Outside the preview (e.g. when rendering PDFs) the content is rendered unchanged.
+    """
+
+    def __init__(self, name, dependencies, nodelist):
+        self.name = name
+        self.dependencies = dependencies
+        self.nodelist = nodelist
+
+    def render(self, context):
+        hashes = context.get('preview_hashes')
+        if hashes is None:
+            return self.nodelist.render(context)
+
+        fragments = context.get('preview_fragments')
+        if fragments is not None:
+            # Fragment mode: collect only the requested sections, output nothing
+            requested = context.get('preview_sections')
+            if requested is None or self.name in requested:
+                fragments[self.name] = self.nodelist.render(context)
+            return ''
+
+        return format_html(
+            '<div data-preview-section="{}" data-preview-hash="{}" style="display: contents;">{}</div>',
+            self.name, hashes.get(self.name, ''), self.nodelist.render(context),
+        )
+
+
+@register.tag
+def preview_section(parser, token):
+    """
+    {% preview_section "experience" "experiences" %}...{% endpreview_section %}
+    The first argument names the section; the rest list the resume data it shows.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a section name and at least one dependency")
+    name, *dependencies = [bit.strip('"\'') for bit in bits[1:]]
+    unknown = set(dependencies) - PREVIEW_SECTION_DEPENDENCIES
+    if unknown:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' got unknown dependencies: {', '.join(sorted(unknown))}")
+    nodelist = parser.parse(('endpreview_section',))
+    parser.delete_first_token()
+    return PreviewSectionNode(name, tuple(dependencies), nodelist)
@@ -0,0 +1,119 @@
+"""
+Tests for the shared resume document loader.
+"""
+import datetime
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from core.utils import compute_content_hash
+from users.models import JobSeekerProfile
+from .models import Resume, Experience, Education, Skill, Language, Hobby
+from .documents import load_resume_document, load_resume_documents, build_resume_context, SECTION_PREFETCHES
+from .parser import get_full_resume_text, get_resume_content_hash
+
+User = get_user_model()
+
+
+class ResumeDocumentTests(TestCase):
+    """Test loading resumes into documents and building text and template context from them."""
+
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', email='test@test.com', password='testpass', user_type='job_seeker')
+        self.profile = JobSeekerProfile.objects.create(user=user, full_name='Test User', professional_summary='Developer')
+        self.resume = Resume.objects.create(profile=self.profile, title='Test Resume')
+        Experience.objects.create(
+            resume=self.resume, job_title='Junior Dev', company='Old Corp',
+            start_date=datetime.date(2018, 1, 1), description='Wrote code'
+        )
+        Experience.objects.create(
+            resume=self.resume, job_title='Senior Dev', company='New Corp',
+            start_date=datetime.date(2021, 1, 1), description='* Led team\n* Shipped APIs'
+        )
+        Education.objects.create(resume=self.resume, institution='State University', degree='B.S.')
+        Skill.objects.create(resume=self.resume, name='Python', category='Backend')
+        Skill.objects.create(resume=self.resume, name='React', category='Frontend')
+        Language.objects.create(resume=self.resume, name='English', proficiency='Fluent')
+        Hobby.objects.create(resume=self.resume, name='Chess')
+
+    def test_document_is_read_from_the_snapshot(self):
+        # Without a snapshot the sections are prefetched once and the snapshot is stored
+        with self.assertNumQueries(1 + len(SECTION_PREFETCHES) + 1):
+            first = load_resume_document(self.resume.id)
+        self.assertIsNotNone(Resume.objects.get(id=self.resume.id).snapshot)
+
+        with self.assertNumQueries(1):
+            document = load_resume_document(self.resume.id)
+            self.assertEqual(document.profile.user.email, 'test@test.com')
+        self.assertEqual(document, first)
+
+    def test_section_change_invalidates_and_rebuilds_snapshot(self):
+        load_resume_document(self.resume.id)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Skill.objects.create(resume=self.resume, name='Django', category='Backend')
+        self.assertIsNone(Resume.objects.get(id=self.resume.id).snapshot)
+
+        for callback in callbacks:
+            callback()
+        snapshot = Resume.objects.get(id=self.resume.id).snapshot
+        self.assertEqual([skill['name'] for skill in snapshot['skills']], ['Python', 'React', 'Django'])
+        self.assertIn('Django', get_full_resume_text(Resume.objects.get(id=self.resume.id)))
+
+    def test_outdated_rebuild_is_discarded(self):
+        stale = Resume.objects.get(id=self.resume.id)
+        Hobby.objects.create(resume=self.resume, name='Go')
+        # The stale row was read before the edit bumped snapshot_version, so its rebuild is not stored
+        from .documents import _store_snapshots
+        _store_snapshots([stale])
+        self.assertIsNone(Resume.objects.get(id=self.resume.id).snapshot)
+
+    def test_outdated_content_hash_is_discarded(self):
+        stale = Resume.objects.get(id=self.resume.id)
+        stale_text = get_full_resume_text(stale)
+        Hobby.objects.create(resume=self.resume, name='Go')
+        self.profile.professional_summary = 'Backend developer'
+        self.profile.save()
+        # The text was read before both edits, so its hash must not be stored as current
+        get_resume_content_hash(stale, stale_text)
+        self.assertIsNone(Resume.objects.get(id=self.resume.id).content_hash)
+
+        fresh = Resume.objects.get(id=self.resume.id)
+        content_hash = get_resume_content_hash(fresh)
+        self.assertNotEqual(content_hash, compute_content_hash(stale_text))
+        self.assertEqual(Resume.objects.get(id=self.resume.id).content_hash, content_hash)
+
+    def test_document_is_memoized_on_the_instance(self):
+        resume = Resume.objects.get(id=self.resume.id)
+        get_full_resume_text(resume)
+        with self.assertNumQueries(0):
+            build_resume_context(load_resume_document(resume))
+            get_full_resume_text(resume)
+
+    def test_text_matches_matcher_format(self):
+        text = get_full_resume_text(self.resume)
+        self.assertEqual(
+            text,
+            "Name: Test User\nSummary: Developer\n\n"
+            "Experience:\n- Junior Dev at Old Corp: Wrote code\n- Senior Dev at New Corp: * Led team\n* Shipped APIs\n\n"
+            "Education:\n- B.S. from State University\n\n"
+            "Skills: Python, React\n\n"
+            "Languages: English (Fluent)\n"
+        )
+
+    def test_context_orders_sections_for_templates(self):
+        context = build_resume_context(load_resume_document(self.resume), accent_color='#123456')
+        self.assertEqual([exp.job_title for exp in context['experiences']], ['Senior Dev', 'Junior Dev'])
+        self.assertEqual(context['experiences'][0].description_points, ('Led team', 'Shipped APIs'))
+        self.assertEqual(context['skills_by_category'], {'Backend': ['Python'], 'Frontend': ['React']})
+        self.assertEqual(context['languages'][0].get_proficiency_display(), 'Fluent')
+        self.assertEqual(context['hobbies'], ['Chess'])
+        self.assertEqual(context['accent_color'], '#123456')
+
+    def test_bulk_loading_uses_a_fixed_number_of_queries(self):
+        other_user = User.objects.create_user(username='other', password='testpass', user_type='job_seeker')
+        other_profile = JobSeekerProfile.objects.create(user=other_user, full_name='Other User')
+        other_resume = Resume.objects.create(profile=other_profile, title='Other Resume')
+        Skill.objects.create(resume=other_resume, name='Go', category='Backend')
+
+        load_resume_documents([self.resume.id, other_resume.id])
+        with self.assertNumQueries(1):
+            documents = load_resume_documents([self.resume.id, other_resume.id])
+        self.assertEqual(documents[other_resume.id].text, "Name: Other User\nSummary: \n\nSkills: Go\n\n")
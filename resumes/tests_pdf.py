@@ -1,11 +1,26 @@
 """
 Tests for PDF generation functionality.
 """
-from django.test import TestCase, Client
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from unittest.mock import patch, MagicMock
-from .models import Resume, Experience, Education, Skill
+from .models import Resume, Experience, Education, Skill, ResumePDFGeneration
+from .retention import cleanup_pdf_generations
+from .preview import get_preview_css, scope_preview_css, _build_preview_css
+from .rendering import (
+    asset_cache, get_url_fetcher, _fetch_local, get_pdf_template, reset_renderer, warm_up_renderer, PDF_TEMPLATES,
+    render_resume_html,
+)
+from .documents import build_resume_context, load_resume_document
 from users.models import JobSeekerProfile
 
 User = get_user_model()
@@ -144,6 +159,189 @@ class PDFGenerationTests(TestCase):
         self.assertNotEqual(response.status_code, 200)
 
 
+
+class PDFCacheTests(TestCase):
+    """Test that identical PDF downloads reuse an earlier render."""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass', user_type='job_seeker')
+        self.profile = JobSeekerProfile.objects.create(user=self.user, full_name='Test User')
+        self.resume = Resume.objects.create(profile=self.profile, title='Test Resume')
+        Skill.objects.create(resume=self.resume, name='Python', category='Backend')
+        self.client.login(username='testuser', password='testpass')
+        self.url = reverse('resumes:download-resume-pdf', args=[self.resume.id, 'classic']) + '?accent_color=teal&format=json'
+    
+    @override_settings(CELERY_BROKER_URL='memory://')
+    @patch('resumes.tasks.generate_resume_pdf_task.delay', return_value=MagicMock(id='task-1'))
+    def test_repeat_download_reuses_generation(self, mock_delay):
+        first = self.client.get(self.url).json()
+        self.assertEqual(first['status'], 'pending')
+        # A second click while the first render is running joins it
+        self.assertEqual(self.client.get(self.url).json()['pdf_generation_id'], first['pdf_generation_id'])
+        
+        ResumePDFGeneration.objects.filter(id=first['pdf_generation_id']).update(status='completed', pdf_content=b'%PDF')
+        cached = self.client.get(self.url).json()
+        self.assertEqual(cached['status'], 'completed')
+        self.assertEqual(cached['download_url'], reverse('resumes:download-generated-pdf', args=[first['pdf_generation_id']]))
+        mock_delay.assert_called_once()
+        
+        # Another color or changed content needs a new render
+        self.client.get(self.url.replace('teal', 'red'))
+        Skill.objects.create(resume=self.resume, name='Django', category='Backend')
+        self.assertEqual(self.client.get(self.url).json()['status'], 'pending')
+        self.assertEqual(mock_delay.call_count, 3)
+    
+    @override_settings(CELERY_BROKER_URL='')
+    @patch('resumes.views.WEASY_AVAILABLE', True)
+    @patch('resumes.views.write_resume_pdf', return_value=b'%PDF-1.4 fake')
+    def test_sync_render_is_cached(self, mock_write):
+        url = reverse('resumes:download-resume-pdf', args=[self.resume.id, 'classic'])
+        
+        self.assertEqual(self.client.get(url).content, b'%PDF-1.4 fake')
+        response = self.client.get(url)
+        
+        self.assertRedirects(response, reverse('resumes:download-generated-pdf', args=[ResumePDFGeneration.objects.get().id]), fetch_redirect_response=False)
+        self.assertEqual(mock_write.call_count, 1)
+    
+    def test_download_streams_from_storage_with_ranges(self):
+        pdf_gen = ResumePDFGeneration(resume=self.resume, template_name='classic', status='completed')
+        pdf_gen.store_pdf(b'%PDF-1.4 0123456789')
+        pdf_gen.save()
+        url = reverse('resumes:download-generated-pdf', args=[pdf_gen.id])
+        
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        
+        partial = self.client.get(url, HTTP_RANGE='bytes=9-')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], 'bytes 9-18/19')
+        self.assertEqual(b''.join(partial.streaming_content), b'0123456789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=50-').status_code, 416)
+    
+    def test_legacy_database_pdf_is_moved_to_storage(self):
+        pdf_gen = ResumePDFGeneration.objects.create(
+            resume=self.resume, template_name='classic', status='completed', pdf_content=b'%PDF-legacy'
+        )
+        response = self.client.get(reverse('resumes:download-generated-pdf', args=[pdf_gen.id]))
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-legacy')
+        
+        pdf_gen.refresh_from_db()
+        self.assertIsNone(pdf_gen.pdf_content)
+        self.assertEqual(pdf_gen.pdf_file.read(), b'%PDF-legacy')
+
+
+class PDFRetentionTests(TestCase):
+    """Test the retention cleanup of generated PDFs."""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = User.objects.create_user(username='testuser', password='testpass', user_type='job_seeker')
+        profile = JobSeekerProfile.objects.create(user=user, full_name='Test User')
+        self.resume = Resume.objects.create(profile=profile, title='Test Resume')
+    
+    def _generation(self, template_name='classic', status='completed', age=timedelta(0)):
+        pdf_gen = ResumePDFGeneration(resume=self.resume, template_name=template_name, status=status)
+        if status == 'completed':
+            pdf_gen.store_pdf(b'%PDF-1.4 1234')
+        pdf_gen.save()
+        ResumePDFGeneration.objects.filter(id=pdf_gen.id).update(created_at=timezone.now() - age)
+        return pdf_gen
+    
+    def test_cleanup_applies_retention_policy(self):
+        old_render = self._generation(age=timedelta(days=40))
+        superseded = self._generation(age=timedelta(hours=3))
+        kept = [self._generation(age=timedelta(hours=2)), self._generation(age=timedelta(hours=1))]
+        other_template = self._generation(template_name='modern', age=timedelta(hours=5))
+        failed = self._generation(status='failed', age=timedelta(days=2))
+        pending = self._generation(status='pending')
+        ResumePDFGeneration.objects.filter(id=superseded.id).update(pdf_content=b'12345')
+        storage = superseded.pdf_file.storage
+        
+        dry_run = cleanup_pdf_generations(keep=2, max_age_days=30, failed_hours=24, dry_run=True)
+        self.assertEqual(dry_run, {'rows': 3, 'files': 2, 'bytes': 2 * 13 + 5})
+        self.assertEqual(ResumePDFGeneration.objects.count(), 7)
+        
+        totals = cleanup_pdf_generations(keep=2, max_age_days=30, failed_hours=24, batch_size=1)
+        self.assertEqual(totals, dry_run)
+        self.assertEqual(
+            set(ResumePDFGeneration.objects.values_list('id', flat=True)),
+            {kept[0].id, kept[1].id, other_template.id, pending.id},
+        )
+        self.assertFalse(storage.exists(old_render.pdf_file.name))
+        self.assertTrue(storage.exists(kept[0].pdf_file.name))
+    
+    def test_management_command_reports_reclaimed_bytes(self):
+        self._generation(status='failed', age=timedelta(days=2))
+        out = StringIO()
+        call_command('cleanup_pdf_generations', stdout=out)
+        self.assertIn('Deleted 1 PDF generations', out.getvalue())
+        self.assertFalse(ResumePDFGeneration.objects.exists())
+
+
+class PDFUrlFetcherTests(TestCase):
+    """Test that WeasyPrint reads our own static and media assets locally."""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        asset_cache.clear()
+        self.addCleanup(asset_cache.clear)
+        self.fetch = get_url_fetcher('http://testserver/')
+    
+    def test_static_asset_is_read_from_finders(self):
+        result = self.fetch('http://testserver/static/img/ai_resume_logo.svg')
+        self.assertEqual(result['mime_type'], 'image/svg+xml')
+        self.assertIn(b'<svg', result['string'])
+    
+    def test_media_asset_is_read_from_storage_and_cached(self):
+        default_storage.save('profile_photos/me.png', ContentFile(b'png-bytes'))
+        with patch('resumes.rendering.default_storage.open', wraps=default_storage.open) as mock_open:
+            self.assertEqual(self.fetch('http://testserver/media/profile_photos/me.png')['string'], b'png-bytes')
+            self.assertEqual(self.fetch('http://testserver/media/profile_photos/me.png')['string'], b'png-bytes')
+        self.assertEqual(mock_open.call_count, 1)
+    
+    def test_missing_or_foreign_assets_are_not_fetched_from_ourselves(self):
+        with self.assertRaises(FileNotFoundError):
+            self.fetch('http://testserver/media/../secrets.txt')
+        with self.assertRaises(FileNotFoundError):
+            self.fetch('http://testserver/static/missing.css')
+        self.assertIsNone(_fetch_local('https://fonts.googleapis.com/css2?family=Inter', 'http://testserver/'))
+
+
+class PDFRendererTests(TestCase):
+    """Test the preloaded renderer used by PDF workers."""
+    
+    def setUp(self):
+        reset_renderer()
+        self.addCleanup(reset_renderer)
+    
+    def test_templates_are_loaded_once(self):
+        with patch('resumes.rendering.get_template') as mock_get_template:
+            get_pdf_template('classic')
+            get_pdf_template('classic')
+            get_pdf_template('modern')
+        self.assertEqual(mock_get_template.call_count, 2)
+    
+    @patch('resumes.rendering.render_resume_pdf')
+    def test_warm_up_renders_each_template_once(self, mock_render):
+        warm_up_renderer()
+        warm_up_renderer()
+        self.assertEqual([call.args[0] for call in mock_render.call_args_list], PDF_TEMPLATES)
+
 class ResumePreviewTests(TestCase):
     """Test resume preview functionality."""
     
@@ -191,4 +389,74 @@ class ResumePreviewTests(TestCase):
         
         # Should not be accessible
         self.assertNotEqual(response.status_code, 200)
-
+    
+    def test_preview_renders_body_and_links_scoped_stylesheet(self):
+        response = self.client.get(reverse('resumes:preview-resume', args=[self.resume.id]) + '?template=classic&accent_color=teal')
+        css, version = get_preview_css('classic')
+        self.assertContains(response, f"{reverse('resumes:preview-css', args=['classic'])}?v={version}")
+        self.assertContains(response, '--resume-accent: #14b8a6;')
+        # Only the template body is embedded, not its document head
+        self.assertNotContains(response, "Test User's Resume</title>")
+        self.assertContains(response, 'Test User')
+    
+    def test_preview_page_marks_sections_for_live_refresh(self):
+        response = self.client.get(reverse('resumes:preview-resume', args=[self.resume.id]) + '?template=classic')
+        hashes = self.client.get(reverse('resumes:get-preview-html', args=[self.resume.id]) + '?template=classic').json()['sections']
+        self.assertContains(response, f'data-preview-section="experience" data-preview-hash="{hashes["experience"]}"')
+        self.assertContains(response, reverse('resumes:get-preview-html', args=[self.resume.id]))
+    
+    def test_preview_stylesheet_is_scoped_and_cacheable(self):
+        css, version = get_preview_css('professional')
+        self.assertIn('.resume-wrapper .resume-content .name', css)
+        self.assertIn('var(--resume-accent)', css)
+        self.assertNotIn('@page', css)
+        
+        url = reverse('resumes:preview-css', args=['professional'])
+        response = self.client.get(f'{url}?v={version}')
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(reverse('resumes:preview-css', args=['unknown'])).status_code, 404)
+    
+    def test_preview_css_is_built_once_per_template(self):
+        with patch('resumes.preview.scope_preview_css', side_effect=scope_preview_css) as mock_scope:
+            _build_preview_css.cache_clear()
+            get_preview_css('modern')
+            get_preview_css('modern')
+        self.assertEqual(mock_scope.call_count, 1)
+    
+    def test_preview_html_returns_only_changed_sections(self):
+        url = reverse('resumes:get-preview-html', args=[self.resume.id])
+        data = self.client.get(url + '?template=classic').json()
+        hashes = data['sections']
+        self.assertIn('experience', hashes)
+        self.assertIn(f'data-preview-section="summary" data-preview-hash="{hashes["summary"]}"', data['preview_html'])
+        
+        known = ','.join(f'{name}:{section_hash}' for name, section_hash in hashes.items())
+        self.assertEqual(self.client.get(f'{url}?template=classic&known={known}').json()['fragments'], {})
+        
+        Experience.objects.create(resume=self.resume, job_title='Engineer', company='Acme')
+        data = self.client.get(f'{url}?template=classic&known={known}').json()
+        self.assertEqual(list(data['fragments']), ['experience'])
+        self.assertIn('Engineer', data['fragments']['experience'])
+        self.assertEqual(data['sections']['summary'], hashes['summary'])
+        self.assertNotEqual(data['sections']['experience'], hashes['experience'])
+    
+    def test_preview_html_unchanged_returns_not_modified(self):
+        url = reverse('resumes:get-preview-html', args=[self.resume.id]) + '?template=modern'
+        response = self.client.get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with patch('resumes.views.render_preview_body') as mock_render:
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        mock_render.assert_not_called()
+        
+        Skill.objects.create(resume=self.resume, name='Python')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+    
+    def test_pdf_html_has_no_preview_markers(self):
+        context = build_resume_context(load_resume_document(self.resume), accent_color='#3498db')
+        for template_name in PDF_TEMPLATES:
+            html = render_resume_html(template_name, context)
+            self.assertNotIn('data-preview-section', html)
+            self.assertIn('Test User', html)
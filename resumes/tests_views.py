@@ -1,12 +1,26 @@
 """
 View tests for resumes app with mocked AI calls.
 """
-from django.test import TestCase, Client
+import re
+import shutil
+import tempfile
+from io import BytesIO
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
+from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
-from .models import Resume, Experience, Education, Skill
+from .models import Resume, Experience, Education, Skill, Hobby, ParsedResumeCache, ResumeParseResult, resume_upload_storage
+from .parse_cache import cleanup_parse_cache, get_cached_parse, hash_file_content, store_parse
+from .tasks import parse_resume_task
+from .parser import extract_text_from_file, parse_resume_text
+from .preparser import preparse_resume_text
 from users.models import JobSeekerProfile
+from core.ai_gateway import GeminiRateLimited
+from core.circuit_breaker import gemini_breaker
 
 User = get_user_model()
 
@@ -260,6 +274,80 @@ class ResumeAJAXTests(TestCase):
         self.assertFalse(self.client.session.get('show_welcome_modal', True))
 
 
+class ResumeRescoreDebounceTests(TestCase):
+    """Test that builder edits are coalesced into a single debounced rescore."""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@test.com', password='testpass', user_type='job_seeker')
+        self.profile = JobSeekerProfile.objects.create(user=self.user)
+        self.resume = Resume.objects.create(profile=self.profile, title='Test Resume', score=70)
+        self.client.login(username='testuser', password='testpass')
+
+    def _add_skill(self, name):
+        return self.client.post(
+            reverse('resumes:resume-builder'),
+            {'action': 'add', 'model_name': 'skill', 'name': name, 'category': 'Tools'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    @patch('resumes.tasks.rescore_resume_task.apply_async')
+    def test_burst_of_edits_schedules_one_rescore(self, mock_apply_async):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ['Python', 'Django', 'SQL']:
+                self.assertEqual(self._add_skill(name).status_code, 200)
+
+        mock_apply_async.assert_called_once()
+        self.resume.refresh_from_db()
+        self.assertTrue(self.resume.rescore_pending)
+        # The previous score is kept, but reported as pending until the rescore runs
+        self.assertEqual(self.resume.score, 70)
+        response = self.client.get(reverse('resumes:check-score-status', args=[self.resume.id]))
+        self.assertEqual(response.json()['status'], 'PENDING')
+
+    @patch('jobs.tasks.refresh_resume_match_scores')
+    @patch('resumes.tasks.update_resume_score_task')
+    @patch('resumes.tasks.rescore_resume_task.apply_async')
+    def test_rescore_waits_for_edits_to_settle(self, mock_apply_async, mock_score, mock_refresh):
+        from .tasks import rescore_resume_task
+        Resume.objects.filter(id=self.resume.id).update(rescore_pending=True, updated_at=timezone.now())
+
+        rescore_resume_task(self.resume.id)
+        mock_apply_async.assert_called_once()
+        mock_score.assert_not_called()
+
+        Resume.objects.filter(id=self.resume.id).update(updated_at=timezone.now() - timedelta(minutes=5))
+        rescore_resume_task(self.resume.id)
+        mock_score.assert_called_once_with(self.resume.id)
+        mock_refresh.assert_called_once()
+        self.assertFalse(Resume.objects.get(id=self.resume.id).rescore_pending)
+
+
+class ResumeScoreTaskTests(TestCase):
+    """Test that the resume critique is skipped when the resume text is unchanged."""
+
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', email='test@test.com', password='testpass', user_type='job_seeker')
+        profile = JobSeekerProfile.objects.create(user=user, full_name='Test User', professional_summary='Backend developer ' * 10)
+        self.resume = Resume.objects.create(profile=profile, title='Test Resume')
+        Skill.objects.create(resume=self.resume, name='Python', category='Backend')
+
+    @patch('resumes.tasks.score_and_critique_resume', return_value={'score': 80, 'feedback': ['Good']})
+    def test_critique_skipped_for_unchanged_text(self, mock_critique):
+        from .tasks import update_resume_score_task
+        update_resume_score_task(self.resume.id)
+        # Hobbies are not part of the scored text
+        Hobby.objects.create(resume=self.resume, name='Chess')
+        update_resume_score_task(self.resume.id)
+        self.assertEqual(mock_critique.call_count, 1)
+
+        Skill.objects.create(resume=self.resume, name='Django', category='Backend')
+        self.assertIsNone(Resume.objects.get(id=self.resume.id).content_hash)
+        update_resume_score_task(self.resume.id)
+        self.assertEqual(mock_critique.call_count, 2)
+        self.assertEqual(Resume.objects.get(id=self.resume.id).score, 80)
+
+
 class ResumePermissionTests(TestCase):
     """Test that users can only access their own resumes."""
     
@@ -294,6 +382,12 @@ class ResumeUploadTests(TestCase):
     """Test resume upload and parsing views with mocked AI calls."""
     
     def setUp(self):
+        # Uploads are written to storage
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', email='test@test.com', password='testpass', user_type='job_seeker')
         self.profile = JobSeekerProfile.objects.create(user=self.user)
@@ -327,6 +421,91 @@ class ResumeUploadTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn('parsing-progress', response.url)
     
+    def test_upload_resume_streams_file_to_storage(self):
+        """Test that the upload is stored and only its name is queued for parsing."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        pdf_file = SimpleUploadedFile('My Resume.PDF', b'%PDF-1.4 fake pdf content', content_type='application/pdf')
+        
+        with patch('resumes.views.parse_resume_task') as mock_task:
+            self.client.post(reverse('resumes:resume-upload'), {'resume_file': pdf_file})
+        
+        user_id, filename, upload_name = mock_task.delay.call_args.args
+        self.assertEqual((user_id, filename), (self.user.id, 'My Resume.PDF'))
+        self.assertTrue(upload_name.startswith(f'resume_uploads/{self.user.id}/'))
+        self.assertTrue(upload_name.endswith('.pdf'))
+        with resume_upload_storage().open(upload_name) as stored_file:
+            self.assertEqual(stored_file.read(), b'%PDF-1.4 fake pdf content')
+    
+    @patch('resumes.tasks.parse_resume_text')
+    @patch('resumes.tasks.extract_text_from_file')
+    def test_parse_task_reads_upload_and_deletes_it(self, mock_extract, mock_parse):
+        """Test that the parse task reads the stored upload and removes it afterwards."""
+        mock_extract.side_effect = lambda content, filename: content.decode()
+        mock_parse.return_value = {'professional_summary': 'Test summary'}
+        storage = resume_upload_storage()
+        upload_name = storage.save('resume_uploads/1/upload.pdf', ContentFile(b'Sample resume text'))
+        
+        parse_resume_task(self.user.id, 'resume.pdf', upload_name)
+        
+        self.assertFalse(storage.exists(upload_name))
+        mock_parse.assert_called_once_with('Sample resume text')
+        self.assertTrue(ParsedResumeCache.objects.filter(profile_id=self.user.id).exists())
+    
+    @override_settings(GEMINI_RATE_LIMIT_MAX_REQUEUES=0)
+    @patch('resumes.tasks.parse_resume_text', side_effect=GeminiRateLimited(60))
+    def test_parse_task_stores_local_parse_once_requeues_run_out(self, mock_parse):
+        """Test that the upload still yields the rule-based parse when the Gemini quota stays exhausted."""
+        storage = resume_upload_storage()
+        upload_name = storage.save('resume_uploads/1/upload.pdf', ContentFile(SAMPLE_RESUME_TEXT.encode()))
+        
+        with patch('resumes.tasks.extract_text_from_file', side_effect=lambda content, filename: content.decode()):
+            parse_resume_task(self.user.id, 'resume.pdf', upload_name)
+        
+        parsed_data = ParsedResumeCache.objects.get(profile_id=self.user.id).parsed_data
+        self.assertTrue(parsed_data['parsed_locally'])
+        self.assertEqual(parsed_data['personal_details']['email'], 'jane.doe@example.com')
+        self.assertFalse(storage.exists(upload_name))
+        # Fallback parses aren't cached for later uploads
+        self.assertFalse(ResumeParseResult.objects.exists())
+    
+    @patch('resumes.tasks.parse_resume_text')
+    def test_duplicate_upload_reuses_cached_parse(self, mock_parse):
+        """Test that re-uploading the same file or the same text skips the Gemini parse."""
+        mock_parse.return_value = {'professional_summary': 'Test summary'}
+        storage = resume_upload_storage()
+        
+        with patch('resumes.tasks.extract_text_from_file', return_value='Sample resume text') as mock_extract:
+            for _ in range(2):
+                upload_name = storage.save('resume_uploads/1/upload.pdf', ContentFile(b'same bytes'))
+                parse_resume_task(self.user.id, 'resume.pdf', upload_name)
+            # The second upload is matched by its bytes, before any text extraction
+            self.assertEqual(mock_extract.call_count, 1)
+            
+            upload_name = storage.save('resume_uploads/1/upload.pdf', ContentFile(b'exported again'))
+            parse_resume_task(self.user.id, 'resume.pdf', upload_name)
+        
+        mock_parse.assert_called_once()
+        self.assertEqual(ParsedResumeCache.objects.get(profile_id=self.user.id).parsed_data, {'professional_summary': 'Test summary'})
+        self.assertEqual(ResumeParseResult.objects.get().file_hash, hash_file_content(b'exported again'))
+    
+    @override_settings(RESUME_PARSE_CACHE_TTL_DAYS=7)
+    def test_parse_cache_expires_and_evicts_least_recently_used(self):
+        """Test TTL expiry and LRU eviction of cached parses."""
+        now = timezone.now()
+        for index, days_ago in enumerate([10, 3, 2, 1]):
+            store_parse(f'file-{index}', f'text-{index}', {'index': index})
+            ResumeParseResult.objects.filter(text_hash=f'text-{index}').update(
+                created_at=now - timedelta(days=days_ago), last_used_at=now - timedelta(days=days_ago)
+            )
+        
+        self.assertIsNone(get_cached_parse(file_hash='file-0'))
+        self.assertEqual(get_cached_parse(text_hash='text-1'), {'index': 1})
+        
+        # text-0 has expired; of the rest, text-2 is now the least recently used
+        self.assertEqual(cleanup_parse_cache(max_entries=2), 2)
+        self.assertEqual(set(ResumeParseResult.objects.values_list('text_hash', flat=True)), {'text-1', 'text-3'})
+    
     def test_upload_resume_invalid_file_type(self):
         """Test that invalid file types are rejected."""
         from django.core.files.uploadedfile import SimpleUploadedFile
@@ -341,3 +520,173 @@ class ResumeUploadTests(TestCase):
         # Should redirect with error message
         self.assertEqual(response.status_code, 302)
 
+
+class ResumeExtractionTests(TestCase):
+    """Test in-memory text extraction from uploaded resumes."""
+    
+    def _pdf_bytes(self, pages):
+        import fitz
+        with fitz.open() as doc:
+            for text in pages:
+                doc.new_page().insert_text((72, 72), text)
+            return doc.tobytes()
+    
+    def test_extracts_pdf_from_bytes_and_stream(self):
+        pdf = self._pdf_bytes(['First page', 'Second page'])
+        self.assertIn('Second page', extract_text_from_file(pdf, 'resume.pdf'))
+        self.assertIn('First page', extract_text_from_file(BytesIO(pdf), 'RESUME.PDF'))
+    
+    @override_settings(RESUME_PARSE_MAX_PAGES=2)
+    def test_pdf_pages_are_capped(self):
+        text = extract_text_from_file(self._pdf_bytes(['Page one', 'Page two', 'Page three']), 'resume.pdf')
+        self.assertIn('Page two', text)
+        self.assertNotIn('Page three', text)
+    
+    def test_extracts_docx_from_stream(self):
+        import docx
+        document = docx.Document()
+        document.add_paragraph('Jane Doe')
+        document.add_paragraph('Software Engineer')
+        buffer = BytesIO()
+        document.save(buffer)
+        buffer.seek(0)
+        self.assertEqual(extract_text_from_file(buffer, 'resume.docx'), 'Jane Doe\nSoftware Engineer')
+    
+    @override_settings(RESUME_UPLOAD_MAX_BYTES=100)
+    def test_oversized_and_unsupported_files_return_no_text(self):
+        self.assertEqual(extract_text_from_file(self._pdf_bytes(['Too big']), 'resume.pdf'), '')
+        self.assertEqual(extract_text_from_file(b'plain text', 'resume.txt'), '')
+
+
+SAMPLE_RESUME_TEXT = """Jane Doe
+Software Engineer | Pune, India
+jane.doe@example.com | +91 98765 43210 | linkedin.com/in/janedoe | https://janedoe.dev
+
+Summary
+Backend developer with five years of experience
+building APIs.
+
+Work Experience
+Lead Developer, TechCorp (2020 - 2023)
+- Built the billing platform
+
+Technical Skills
+Python, Django, React, Docker, Public speaking
+
+Interests
+Chess, Hiking
+"""
+
+
+class ResumePreparserTests(TestCase):
+    """Test the rule-based pre-parser that runs before Gemini."""
+    
+    def test_extracts_contact_details_and_sections(self):
+        preparsed = preparse_resume_text(SAMPLE_RESUME_TEXT)
+        self.assertEqual(preparsed.personal_details, {
+            'email': 'jane.doe@example.com',
+            'phone_number': '+91 98765 43210',
+            'linkedin_url': 'linkedin.com/in/janedoe',
+            'portfolio_url': 'https://janedoe.dev',
+            'full_name': 'Jane Doe',
+        })
+        self.assertEqual(set(preparsed.sections), {'professional_summary', 'experience', 'skills', 'hobbies'})
+        
+        local_data = preparsed.local_data()
+        self.assertEqual(local_data['professional_summary'], 'Backend developer with five years of experience building APIs.')
+        self.assertIn({'name': 'Django', 'category': 'Backend'}, local_data['skills'])
+        self.assertIn({'name': 'Public speaking', 'category': 'Other'}, local_data['skills'])
+        self.assertEqual(local_data['hobbies'], ['Chess', 'Hiking'])
+    
+    @patch('resumes.parser.parse_text_with_gemini')
+    def test_only_remaining_sections_are_sent_to_gemini(self, mock_gemini):
+        mock_gemini.return_value = {
+            'personal_details': {'full_name': 'Jane Doe', 'email': None, 'address': 'Pune, India'},
+            'professional_summary': None,
+            'experience': [{'job_title': 'Lead Developer', 'company': 'TechCorp'}],
+            'skills': [], 'hobbies': [],
+        }
+        data = parse_resume_text(SAMPLE_RESUME_TEXT)
+        
+        model_text = mock_gemini.call_args.args[0]
+        self.assertIn('Lead Developer', model_text)
+        self.assertNotIn('Django', model_text)
+        self.assertNotIn('Chess', model_text)
+        self.assertEqual(data['personal_details']['email'], 'jane.doe@example.com')
+        self.assertEqual(data['personal_details']['address'], 'Pune, India')
+        self.assertEqual(data['experience'], [{'job_title': 'Lead Developer', 'company': 'TechCorp'}])
+        self.assertEqual(data['hobbies'], ['Chess', 'Hiking'])
+        self.assertNotIn('parsed_locally', data)
+    
+    @patch('resumes.parser.parse_text_with_gemini', return_value=None)
+    def test_falls_back_to_local_parse_when_gemini_fails(self, mock_gemini):
+        data = parse_resume_text(SAMPLE_RESUME_TEXT)
+        self.assertTrue(data['parsed_locally'])
+        self.assertEqual(data['personal_details']['full_name'], 'Jane Doe')
+        self.assertEqual(data['experience'], [])
+        self.assertEqual(len(data['skills']), 5)
+    
+    def test_unknown_section_after_skills_is_sent_to_gemini(self):
+        text = SAMPLE_RESUME_TEXT.replace(
+            "Public speaking\n",
+            "Public speaking\n\nPublications\nDoe J. (2021). Deep learning for cats. Journal of Things, 12(3), 45-67\n",
+        )
+        preparsed = preparse_resume_text(text)
+        skills = [skill['name'] for skill in preparsed.local_data()['skills']]
+        self.assertEqual(skills, ['Python', 'Django', 'React', 'Docker', 'Public speaking'])
+        self.assertIn('Publications\nDoe J. (2021). Deep learning for cats', preparsed.unassigned)
+        self.assertIn('Deep learning for cats', preparsed.text_for_model())
+        # The recognised section after it is parsed as before
+        self.assertEqual(preparsed.local_data()['hobbies'], ['Chess', 'Hiking'])
+    
+    def test_unknown_sections_after_hobbies_are_not_hobbies(self):
+        text = SAMPLE_RESUME_TEXT + "\nVOLUNTEER WORK\nTaught coding at a local school\n\nReferences\nAvailable on request\n"
+        preparsed = preparse_resume_text(text)
+        self.assertEqual(preparsed.local_data()['hobbies'], ['Chess', 'Hiking'])
+        model_text = preparsed.text_for_model()
+        self.assertIn('Taught coding at a local school', model_text)
+        self.assertIn('References\nAvailable on request', model_text)
+    
+    @patch('resumes.parser._get_gemini_model', return_value=MagicMock())
+    def test_falls_back_to_local_parse_while_circuit_is_open(self, mock_model):
+        self.addCleanup(gemini_breaker.reset)
+        for _ in range(settings.GEMINI_BREAKER_FAILURE_THRESHOLD):
+            gemini_breaker.record_failure()
+        self.assertTrue(gemini_breaker.is_open())
+        
+        data = parse_resume_text(SAMPLE_RESUME_TEXT)
+        self.assertTrue(data['parsed_locally'])
+        self.assertEqual(data['hobbies'], ['Chess', 'Hiking'])
+        mock_model.return_value.generate_content.assert_not_called()
+    
+    def test_long_sections_are_split_between_entries(self):
+        entries = [f"Engineer {index}, Company {index}\n- Built system {index}" for index in range(12)]
+        text = "Jane Doe\njane.doe@example.com\n\nExperience\n" + '\n\n'.join(entries) + "\n\nSkills\nPython"
+        chunks = preparse_resume_text(text).chunks_for_model(200)
+        
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(len(chunk) <= 200 for chunk in chunks))
+        self.assertTrue(all(chunk.startswith('Experience:') for chunk in chunks[1:]))
+        # Entries stay whole and nothing is lost or sent twice
+        for entry in entries:
+            self.assertEqual(sum(entry in chunk for chunk in chunks), 1)
+        self.assertFalse(any('Python' in chunk for chunk in chunks))
+    
+    @override_settings(RESUME_PARSE_CHUNK_CHARS=200, RESUME_PARSE_CHUNK_TIMEOUT_SECONDS=15)
+    @patch('resumes.parser.parse_text_with_gemini')
+    def test_long_resumes_are_parsed_in_chunks(self, mock_gemini):
+        def parse_chunk(text, timeout_seconds):
+            titles = re.findall(r'Engineer \d+', text)
+            return {
+                'personal_details': {'full_name': 'Jane Doe' if 'Jane Doe' in text else None},
+                'experience': [{'job_title': title} for title in titles],
+            }
+        mock_gemini.side_effect = parse_chunk
+        entries = [f"Engineer {index}, Company {index}\n- Built system {index}" for index in range(12)]
+        data = parse_resume_text("Jane Doe\njane.doe@example.com\n\nExperience\n" + '\n\n'.join(entries))
+        
+        self.assertGreater(mock_gemini.call_count, 2)
+        self.assertTrue(all(call.kwargs['timeout_seconds'] == 15 for call in mock_gemini.call_args_list))
+        self.assertEqual(data['experience'], [{'job_title': f'Engineer {index}'} for index in range(12)])
+        self.assertEqual(data['personal_details']['full_name'], 'Jane Doe')
+        self.assertEqual(data['personal_details']['email'], 'jane.doe@example.com')
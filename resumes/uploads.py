@@ -0,0 +1,29 @@
+"""
+Uploaded resumes waiting to be parsed.
+
+Uploads are streamed to STORAGES['resume_uploads'] and the parse task only receives the
+stored name, so resume files never travel through the Celery broker.
+"""
+import logging
+import os
+import uuid
+from .models import resume_upload_storage
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIRECTORY = 'resume_uploads'
+
+
+def save_resume_upload(user_id, uploaded_file):
+    """Streams an uploaded resume to storage in chunks and returns its stored name."""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    name = f'{UPLOAD_DIRECTORY}/{user_id}/{uuid.uuid4().hex}{extension}'
+    return resume_upload_storage().save(name, uploaded_file)
+
+
+def delete_resume_upload(name):
+    """Removes a stored upload once it has been parsed."""
+    try:
+        resume_upload_storage().delete(name)
+    except Exception as e:
+        logger.warning(f"Failed to delete uploaded resume {name}: {e}")
@@ -2,17 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.template.loader import render_to_string, get_template
+from django.http import JsonResponse, HttpResponse, Http404
+from django.template.loader import render_to_string
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from datetime import timedelta
 import json
 
 # Celery Tasks
-from .tasks import parse_resume_task, update_resume_score_task
+from .tasks import parse_resume_task, update_resume_score_task, schedule_resume_rescore
 
 WEASY_AVAILABLE = False
 try:
@@ -24,9 +26,14 @@ except (ImportError, OSError):
 
 # Models
 from users.models import JobSeekerProfile
+from core.utils import compute_content_hash, ranged_file_response
+from .rendering import render_resume_html, write_resume_pdf
+from .uploads import save_resume_upload
+from .preview import get_preview_css, get_section_hashes, render_preview_body, render_preview_sections
+from .documents import load_resume_document, build_resume_context, get_document_fingerprint
 from .models import (
     Resume, Experience, Education, Skill, Project, Certification,
-    Achievement, Language, Hobby, ParsedResumeCache
+    Achievement, Language, Hobby, ParsedResumeCache, ResumePDFGeneration
 )
 
 # Forms
@@ -38,6 +45,7 @@ from users.forms import ProfileUpdateForm
 
 # AI Parser
 from .parser import enhance_text_with_gemini
+from core.circuit_breaker import gemini_breaker
 
 # --- Main Views ---
 @login_required
@@ -108,6 +116,15 @@ def resume_builder_view(request):
         return redirect('resumes:resume-dashboard')
 
 
+def _mark_resume_changed(resume):
+    """
+    Records a builder edit and schedules a single debounced rescore, instead of queuing
+    a resume score task and one match score task per job for every edit.
+    """
+    resume.save(update_fields=['updated_at'])
+    schedule_resume_rescore(resume.id)
+
+
 def handle_ajax_request(request, resume):
     action = request.POST.get('action')
     model_name = request.POST.get('model_name')
@@ -132,17 +149,7 @@ def handle_ajax_request(request, resume):
         form = Form(request.POST)
         if form.is_valid():
             item = form.save(commit=False); item.resume = resume; item.save()
-            resume.score = None; resume.save()
-            transaction.on_commit(lambda: update_resume_score_task.delay(resume.id))
-            # Trigger match score recalculation for all jobs
-            from jobs.tasks import calculate_and_save_match_score_task
-            from jobs.models import JobPosting
-            job_ids = list(JobPosting.objects.filter(
-                Q(application_deadline__gte=timezone.now()) | Q(application_deadline__isnull=True)
-            ).values_list('id', flat=True))
-            resume_id = resume.id
-            for job_id in job_ids:
-                transaction.on_commit(lambda jid=job_id, rid=resume_id: calculate_and_save_match_score_task.delay(rid, jid))
+            _mark_resume_changed(resume)
             item_html = render_to_string(f'resumes/partials/{model_name}_item.html', {'item': item})
             return JsonResponse({'status': 'success', 'item_html': item_html, 'section': model_name})
         else:
@@ -172,17 +179,7 @@ def handle_ajax_request(request, resume):
         form = Form(**form_kwargs)
         if form.is_valid():
             item = form.save()
-            resume.score = None; resume.save()
-            transaction.on_commit(lambda: update_resume_score_task.delay(resume.id))
-            # Trigger match score recalculation for all jobs
-            from jobs.tasks import calculate_and_save_match_score_task
-            from jobs.models import JobPosting
-            job_ids = list(JobPosting.objects.filter(
-                Q(application_deadline__gte=timezone.now()) | Q(application_deadline__isnull=True)
-            ).values_list('id', flat=True))
-            resume_id = resume.id
-            for job_id in job_ids:
-                transaction.on_commit(lambda jid=job_id, rid=resume_id: calculate_and_save_match_score_task.delay(rid, jid))
+            _mark_resume_changed(resume)
             
             if is_profile:
                 resume.refresh_from_db()
@@ -211,18 +208,7 @@ def handle_ajax_request(request, resume):
         
         try:
             item.delete()
-            resume.score = None
-            resume.save()
-            transaction.on_commit(lambda: update_resume_score_task.delay(resume.id))
-            # Trigger match score recalculation for all jobs
-            from jobs.tasks import calculate_and_save_match_score_task
-            from jobs.models import JobPosting
-            job_ids = list(JobPosting.objects.filter(
-                Q(application_deadline__gte=timezone.now()) | Q(application_deadline__isnull=True)
-            ).values_list('id', flat=True))
-            resume_id = resume.id
-            for job_id in job_ids:
-                transaction.on_commit(lambda jid=job_id, rid=resume_id: calculate_and_save_match_score_task.delay(rid, jid))
+            _mark_resume_changed(resume)
             return JsonResponse({'status': 'success', 'section': model_name})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': f'Failed to delete item: {str(e)}'}, status=500)
@@ -252,20 +238,14 @@ def upload_resume_view(request):
                 return redirect('resumes:resume-dashboard')
             
             # Validate file size (max 10MB for resume files)
-            max_size = 10 * 1024 * 1024  # 10MB
-            if resume_file.size > max_size:
+            if resume_file.size > settings.RESUME_UPLOAD_MAX_BYTES:
                 messages.error(request, "File size exceeds 10MB limit. Please upload a smaller file.")
                 return redirect('resumes:resume-dashboard')
 
-            # Read file content into memory and encode as base64
-            # This allows the file to be passed to Celery worker in a separate container
-            import base64
-            file_content = resume_file.read()
-            file_content_b64 = base64.b64encode(file_content).decode('utf-8')
-            filename = resume_file.name
-
-            # Pass file content and filename to Celery task
-            parse_resume_task.delay(request.user.id, filename, file_content_b64)
+            # Stream the file to storage shared with the Celery workers and only pass its name,
+            # so resume files never go through the broker
+            upload_name = save_resume_upload(request.user.id, resume_file)
+            parse_resume_task.delay(request.user.id, resume_file.name, upload_name)
 
             return redirect('resumes:parsing-progress')
 
@@ -405,6 +385,8 @@ def validate_resume_data_view(request):
             return render(request, 'resumes/validate_resume.html', context)
 
     else:
+        if parsed_data.get('parsed_locally'):
+            messages.warning(request, "Our AI parser is unavailable right now, so only your contact details, summary, skills and hobbies were filled in. Please add the remaining sections manually.")
         initial_profile_data = parsed_data.get('personal_details', {})
         if parsed_data.get('professional_summary'):
             initial_profile_data['professional_summary'] = parsed_data.get('professional_summary')
@@ -465,6 +447,13 @@ def enhance_description_api(request):
             if not text_to_enhance:
                 return JsonResponse({'error': 'No text provided.'}, status=400)
 
+            # Enhancement has no useful local fallback, so answer right away while Gemini is down
+            if gemini_breaker.is_open():
+                return JsonResponse({
+                    'error': 'AI enhancement is temporarily unavailable. Please try again in a minute.',
+                    'degraded': True,
+                }, status=503)
+
             # Define character limits for validation
             char_limits = {
                 'experience_description': 500,
@@ -506,6 +495,7 @@ def download_resume_pdf(request, resume_id, template_name):
     
     # Check if async is enabled (Celery available) and table exists
     use_async = False
+    table_exists = False
     try:
         from .models import ResumePDFGeneration
         from .tasks import generate_resume_pdf_task
@@ -513,7 +503,6 @@ def download_resume_pdf(request, resume_id, template_name):
         
         # Check if table exists (works for both SQLite and PostgreSQL)
         table_name = ResumePDFGeneration._meta.db_table
-        table_exists = False
         
         with connection.cursor() as cursor:
             if 'sqlite' in connection.vendor:
@@ -545,6 +534,15 @@ def download_resume_pdf(request, resume_id, template_name):
         # If any error occurs (ImportError, table doesn't exist, etc.), fall back to sync
         use_async = False
     
+    # The same content, template and color always render the same PDF, so an earlier
+    # render (or one still in progress) is reused instead of running WeasyPrint again
+    content_hash = None
+    if table_exists:
+        content_hash = get_document_fingerprint(load_resume_document(resume))
+        cached_pdf = _find_cached_pdf(resume, content_hash, template_name, accent_color)
+        if cached_pdf:
+            return _cached_pdf_response(request, cached_pdf)
+    
     if use_async:
         try:
             # Create PDF generation record
@@ -552,6 +550,7 @@ def download_resume_pdf(request, resume_id, template_name):
                 resume=resume,
                 template_name=template_name,
                 accent_color=accent_color,
+                content_hash=content_hash,
                 status='pending'
             )
             
@@ -578,12 +577,50 @@ def download_resume_pdf(request, resume_id, template_name):
             import logging
             logger = logging.getLogger(__name__)
             logger.warning(f"Async PDF generation failed, falling back to sync: {e}")
-            return _generate_pdf_sync(request, resume, template_name, accent_color)
+            return _generate_pdf_sync(request, resume, template_name, accent_color, content_hash)
     else:
         # Fallback to synchronous generation for backward compatibility
-        return _generate_pdf_sync(request, resume, template_name, accent_color)
+        return _generate_pdf_sync(request, resume, template_name, accent_color, content_hash)
 
-def _generate_pdf_sync(request, resume, template_name, accent_color):
+def _find_cached_pdf(resume, content_hash, template_name, accent_color):
+    """
+    Returns a finished PDF, or one still being generated, for the same resume content,
+    template and color. Stale in-progress rows are ignored in case their worker died.
+    """
+    in_progress_since = timezone.now() - timedelta(seconds=settings.PDF_GENERATION_STALE_SECONDS)
+    return ResumePDFGeneration.objects.filter(
+        Q(status='completed') | Q(status__in=['pending', 'processing'], created_at__gte=in_progress_since),
+        resume=resume,
+        content_hash=content_hash,
+        template_name=template_name,
+        accent_color=accent_color,
+    ).order_by('-created_at').first()
+
+def _cached_pdf_response(request, pdf_gen):
+    """Responds to a download request with an existing PDF generation, without queueing a new one."""
+    wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('format') == 'json'
+    if pdf_gen.status == 'completed':
+        download_url = reverse('resumes:download-generated-pdf', args=[pdf_gen.id])
+        if wants_json:
+            return JsonResponse({
+                'status': 'completed',
+                'pdf_generation_id': pdf_gen.id,
+                'download_url': download_url,
+                'filename': f"{pdf_gen.resume.profile.full_name}_resume.pdf",
+            })
+        return redirect(download_url)
+    
+    if wants_json:
+        return JsonResponse({
+            'status': 'pending',
+            'task_id': pdf_gen.task_id,
+            'pdf_generation_id': pdf_gen.id,
+            'message': 'PDF generation started. Please wait...'
+        })
+    messages.info(request, 'PDF generation started. You will be notified when it\'s ready.')
+    return redirect('resumes:resume-builder')
+
+def _generate_pdf_sync(request, resume, template_name, accent_color, content_hash=None):
     """Synchronous PDF generation (fallback when async is not available)."""
     # Color mapping
     color_map = {
@@ -600,24 +637,14 @@ def _generate_pdf_sync(request, resume, template_name, accent_color):
     context = _get_resume_context(resume)
     context['accent_color'] = accent_color_hex
     
-    template_path = f'resumes/resume_pdf_{template_name}.html'
-    template = get_template(template_path)
-    html = template.render(context)
+    html = render_resume_html(template_name, context)
 
     if not WEASY_AVAILABLE:
         messages.error(request, 'PDF generation service is currently unavailable. Please try again later.')
         return redirect('resumes:resume-builder')
 
     try:
-        html_obj = HTML(string=html, base_url=request.build_absolute_uri('/'))
-        # Set template-specific margins to match the template's @page rules
-        if template_name == 'modern':
-            page_css = '@page { size: A4; margin: 0 }'
-        elif template_name == 'creative':
-            page_css = '@page { size: A4; margin: 0.5cm }'
-        else:  # classic and professional
-            page_css = '@page { size: A4; margin: 1.5cm }'
-        pdf_bytes = html_obj.write_pdf(stylesheets=[CSS(string=page_css)])
+        pdf_bytes = write_resume_pdf(html, template_name, request.build_absolute_uri('/'))
     except Exception as e:
         # Log the full error for debugging
         import logging
@@ -627,6 +654,24 @@ def _generate_pdf_sync(request, resume, template_name, accent_color):
         messages.error(request, f'An error occurred during PDF generation: {e}')
         return redirect('resumes:resume-builder')
 
+    if content_hash:
+        # Keep the render so the next identical download is served from the cache
+        pdf_gen = ResumePDFGeneration(
+            resume=resume,
+            template_name=template_name,
+            accent_color=accent_color,
+            content_hash=content_hash,
+            status='completed',
+            completed_at=timezone.now(),
+        )
+        try:
+            pdf_gen.store_pdf(pdf_bytes)
+            pdf_gen.save()
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.warning(f'Could not cache generated PDF: {e}')
+
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{resume.profile.full_name}_resume.pdf"'
     return response
@@ -643,13 +688,9 @@ def check_pdf_status(request, pdf_generation_id):
         'pdf_generation_id': pdf_gen.id,
     }
     
-    if pdf_gen.status == 'completed' and (pdf_gen.pdf_content or pdf_gen.pdf_file):
-        # PDF is available (either in database or filesystem)
+    if pdf_gen.status == 'completed' and pdf_gen.has_pdf:
         response_data['download_url'] = reverse('resumes:download-generated-pdf', args=[pdf_generation_id])
-        if pdf_gen.pdf_file:
-            response_data['filename'] = pdf_gen.pdf_file.name.split('/')[-1]
-        else:
-            response_data['filename'] = f"{pdf_gen.resume.profile.full_name}_resume.pdf"
+        response_data['filename'] = f"{pdf_gen.resume.profile.full_name}_resume.pdf"
     elif pdf_gen.status == 'failed':
         response_data['error'] = pdf_gen.error_message or 'PDF generation failed.'
     
@@ -657,78 +698,38 @@ def check_pdf_status(request, pdf_generation_id):
 
 @login_required
 def download_generated_pdf(request, pdf_generation_id):
-    """Download a completed PDF."""
-    from .models import ResumePDFGeneration
-    from django.http import FileResponse
-    
+    """Download a completed PDF, streamed from storage with support for resuming via Range requests."""
     pdf_gen = get_object_or_404(
-        ResumePDFGeneration, 
+        ResumePDFGeneration.objects.select_related('resume__profile'),
         id=pdf_generation_id, 
         resume__profile__user=request.user,
         status='completed'
     )
     
-    # Try to get PDF from database first (Railway compatibility), then fallback to file
-    if pdf_gen.pdf_content:
-        from io import BytesIO
-        pdf_stream = BytesIO(pdf_gen.pdf_content)
-        response = FileResponse(pdf_stream, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{pdf_gen.resume.profile.full_name}_resume.pdf"'
-        return response
-    elif pdf_gen.pdf_file:
-        try:
-            response = FileResponse(pdf_gen.pdf_file.open('rb'), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{pdf_gen.resume.profile.full_name}_resume.pdf"'
-            return response
-        except FileNotFoundError:
-            messages.error(request, 'PDF file not found. Please regenerate the PDF.')
-            return redirect('resumes:resume-builder')
-    else:
+    if not pdf_gen.has_pdf:
         messages.error(request, 'PDF file not found.')
         return redirect('resumes:resume-builder')
+    try:
+        pdf_stream = pdf_gen.open_pdf()
+    except FileNotFoundError:
+        messages.error(request, 'PDF file not found. Please regenerate the PDF.')
+        return redirect('resumes:resume-builder')
+    return ranged_file_response(request, pdf_stream, f"{pdf_gen.resume.profile.full_name}_resume.pdf")
 
 def _get_resume_context(resume):
     """Helper function to prepare resume context for templates."""
-    # Pre-process descriptions to create bullet points
-    def process_description(items):
-        processed_items = []
-        for item in items:
-            if item.description:
-                clean_desc = '\n'.join(line.lstrip('*-• ') for line in item.description.splitlines())
-                item.description_points = [point.strip() for point in clean_desc.splitlines() if point.strip()]
-            else:
-                item.description_points = []
-            processed_items.append(item)
-        return processed_items
-
-    experiences = Experience.objects.filter(resume=resume).select_related('resume').order_by('-start_date')
-    projects = Project.objects.filter(resume=resume)
-
-    # Group skills by category for better presentation
-    skills_by_category = {}
-    skills_qs = Skill.objects.filter(resume=resume).order_by('category')
-    for skill in skills_qs:
-        category = skill.get_category_display()
-        if category not in skills_by_category:
-            skills_by_category[category] = []
-        skills_by_category[category].append(skill.name)
-
-    return {
-        'resume': resume,
-        'experiences': process_description(experiences),
-        'projects': process_description(projects),
-        'educations': Education.objects.filter(resume=resume).select_related('resume').order_by('-start_date'),
-        'skills_by_category': skills_by_category,
-        'certifications': Certification.objects.filter(resume=resume),
-        'achievements': Achievement.objects.filter(resume=resume),
-        'languages': Language.objects.filter(resume=resume),
-        'hobbies': [hobby.name for hobby in Hobby.objects.filter(resume=resume)],
-        'settings': settings,
-    }
+    return build_resume_context(load_resume_document(resume))
 
 @login_required
 def get_preview_html_view(request, resume_id):
-    """Returns HTML preview of resume for live preview panel."""
+    """
+    Returns HTML preview of resume for live preview panel.
+
+    Every section in `preview_html` is wrapped in a [data-preview-section] element with its hash.
+    A client that already shows the preview sends those hashes back as
+    ?known=<section>:<hash>,... and gets only the sections that changed, as `fragments`.
+    Responses carry an ETag, so polling an unchanged preview returns 304 without rendering.
+    """
     resume = get_object_or_404(Resume, id=resume_id, profile__user=request.user)
     
     # Get template and color from query parameters
@@ -751,19 +752,55 @@ def get_preview_html_view(request, resume_id):
     }
     accent_color_hex = color_map.get(accent_color, '#6366f1')
     
+    # Section hashes only need the resume data, so unchanged previews are answered before rendering
+    hashes = get_section_hashes(template_name, load_resume_document(resume))
+    known_param = request.GET.get('known')
+    etag = '"%s"' % compute_content_hash(template_name, json.dumps(hashes, sort_keys=True), known_param)[:16]
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
     context = _get_resume_context(resume)
     context['accent_color'] = accent_color_hex
-    
-    # Use the selected template for preview
-    template_path = f'resumes/resume_pdf_{template_name}.html'
-    preview_html = render_to_string(template_path, context, request=request)
-    
-    return JsonResponse({'status': 'success', 'preview_html': preview_html})
+
+    if known_param is None:
+        data = {
+            'status': 'success',
+            'preview_html': render_preview_body(template_name, dict(context, preview_hashes=hashes), request=request),
+            'sections': hashes,
+            'stylesheet_url': f"{reverse('resumes:preview-css', args=[template_name])}?v={get_preview_css(template_name)[1]}",
+        }
+    else:
+        known = dict(item.split(':', 1) for item in known_param.split(',') if ':' in item)
+        changed = {name for name, section_hash in hashes.items() if known.get(name) != section_hash}
+        fragments = render_preview_sections(template_name, context, hashes, changed, request=request) if changed else {}
+        data = {'status': 'success', 'sections': hashes, 'fragments': fragments}
+
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    # Always revalidate; the ETag makes that cheap
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def preview_css_view(request, template_name):
+    """Serves a template's preview stylesheet. URLs carry the stylesheet version, so it can be cached for long."""
+    if template_name not in ['classic', 'modern', 'professional', 'creative']:
+        raise Http404("Unknown template")
+    css, version = get_preview_css(template_name)
+    etag = f'"{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(css, content_type='text/css; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable' if request.GET.get('v') == version else 'public, max-age=300'
+    return response
 
 @login_required
 def check_score_status_view(request, resume_id):
     resume = get_object_or_404(Resume, id=resume_id, profile__user=request.user)
-    if resume.score is not None:
+    # A score calculated before the latest edits is reported as pending until the rescore runs
+    if resume.score is not None and not resume.rescore_pending:
         feedback = resume.feedback
         if isinstance(feedback, str):
             try:
@@ -816,186 +853,20 @@ def preview_resume_view(request, resume_id):
     }
     accent_color_hex = color_map.get(accent_color, '#6366f1')
     
-    context = _get_resume_context(resume)
+    document = load_resume_document(resume)
+    context = build_resume_context(document)
     context['accent_color'] = accent_color_hex
     context['template_name'] = template_name
     context['selected_color'] = accent_color
     context['color_options'] = list(color_map.keys())
     context['template_options'] = valid_templates
     
-    # Render the resume template content
-    template_path = f'resumes/resume_pdf_{template_name}.html'
-    resume_html = render_to_string(template_path, context, request=request)
-    
-    # Extract styles and body content properly - ensure ALL content is preserved
-    import re
-    
-    try:
-        # Try using BeautifulSoup for better HTML parsing
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(resume_html, 'html.parser')
-        
-        # Extract all style tags from head - preserve ALL styles
-        style_tags = soup.find_all('style')
-        styles_content = ''
-        for style_tag in style_tags:
-            if style_tag.string:
-                style_text = style_tag.string
-                # Scope html/body styles to .resume-wrapper .resume-content for higher specificity
-                # This ensures template styles override Tailwind and other CSS
-                style_text = re.sub(r'html\s*,', '.resume-wrapper .resume-content,', style_text)
-                style_text = re.sub(r',\s*html\s*{', ', .resume-wrapper .resume-content {', style_text)
-                style_text = re.sub(r'body\s*,', '.resume-wrapper .resume-content,', style_text)
-                style_text = re.sub(r',\s*body\s*{', ', .resume-wrapper .resume-content {', style_text)
-                # Handle standalone html and body rules - replace with higher specificity
-                style_text = re.sub(r'^html\s*{', '.resume-wrapper .resume-content {', style_text, flags=re.MULTILINE)
-                style_text = re.sub(r'^body\s*{', '.resume-wrapper .resume-content {', style_text, flags=re.MULTILINE)
-                # Convert @page rules - @page doesn't work in regular CSS, so we'll remove it for screen
-                # But keep the margin/size info for reference (we handle margins in PDF generation)
-                # Remove @page rules entirely for screen preview - they don't apply
-                style_text = re.sub(r'@page\s*\{[^}]*\}', '', style_text, flags=re.DOTALL)
-                # Scope ALL class selectors to .resume-wrapper .resume-content for maximum specificity
-                # This ensures template styles override Tailwind CSS
-                def scope_class_selector(match):
-                    before = match.group(1)  # Everything before the class selector
-                    class_name = match.group(2)  # The class name (e.g., .name, .section-title)
-                    after = match.group(3)  # Everything after (usually { or whitespace)
-                    
-                    # Don't scope if already scoped
-                    if '.resume-wrapper .resume-content' in before:
-                        return match.group(0)
-                    
-                    # Don't scope if inside @media print (we handle @page separately)
-                    # Check if we're inside a @media block
-                    check_text = before[-200:] if len(before) > 200 else before
-                    # Count opening and closing braces to see if we're inside @media
-                    open_braces = check_text.count('{')
-                    close_braces = check_text.count('}')
-                    if '@media' in check_text and (open_braces > close_braces):
-                        # Inside @media, don't scope - let it apply naturally
-                        return match.group(0)
-                    
-                    # Don't scope if it's part of a compound selector (e.g., ".contact-info .separator")
-                    # Check if there's another selector before it on the same line
-                    lines = before.split('\n')
-                    if lines:
-                        last_line = lines[-1].strip()
-                        # If last line has a selector pattern before this class, it's compound
-                        if re.search(r'[.#\w-]+\s+$', last_line):
-                            return match.group(0)
-                    
-                    return f'{before}.resume-wrapper .resume-content {class_name}{after}'
-                
-                # Match class selectors that start a new rule (after whitespace, comma, closing brace, or start of line)
-                style_text = re.sub(r'([\s,}]*)(\.[a-zA-Z_][a-zA-Z0-9_-]+)(\s*{)', scope_class_selector, style_text, flags=re.MULTILINE)
-                
-                # Clean up any double-scoping
-                style_text = re.sub(r'\.resume-wrapper \.resume-content (\.resume-wrapper \.resume-content )+', '.resume-wrapper .resume-content ', style_text)
-                styles_content += style_text + '\n'
-        
-        # Extract body content - preserve ALL HTML structure exactly
-        body_tag = soup.find('body')
-        if body_tag and hasattr(body_tag, 'children'):
-            # Get all content inside body, preserving all tags and structure
-            # Filter out None values that BeautifulSoup might return
-            try:
-                body_content = ''.join(str(child) for child in body_tag.children if child is not None)
-            except (AttributeError, TypeError) as e:
-                # Fallback if children iteration fails
-                logger.warning(f"Error iterating body children: {e}, using innerHTML fallback")
-                body_content = str(body_tag.decode_contents())
-        else:
-            # Fallback: get all content if no body tag - preserve everything
-            body_content = str(soup.decode_contents())
-        
-        # Ensure we have all content - no truncation
-        resume_html = body_content
-        context['resume_styles'] = styles_content
-        
-        # Debug: Log if styles were extracted
-        import logging
-        logger = logging.getLogger(__name__)
-        if styles_content:
-            logger.info(f"Extracted {len(styles_content)} characters of styles for template {template_name}")
-        else:
-            logger.warning(f"No styles extracted for template {template_name}!")
-        
-    except (ImportError, Exception) as e:
-        # Fallback to regex if BeautifulSoup is not available or fails
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"BeautifulSoup not available or failed, using regex fallback: {e}")
-        # Fallback to regex if BeautifulSoup is not available
-        def extract_body_content(html):
-            # Extract ALL styles from head section - preserve all style tags
-            style_matches = re.findall(r'<style[^>]*>(.*?)</style>', html, re.DOTALL | re.IGNORECASE)
-            all_styles = '\n'.join(style_matches) if style_matches else ''
-            
-            # Remove DOCTYPE
-            html = re.sub(r'<!DOCTYPE[^>]*>', '', html, flags=re.IGNORECASE)
-            # Remove html tags
-            html = re.sub(r'<html[^>]*>', '', html, flags=re.IGNORECASE)
-            html = re.sub(r'</html>', '', html, flags=re.IGNORECASE)
-            
-            # Scope html/body styles to .resume-wrapper .resume-content for higher specificity
-            # Replace html, body selectors with higher specificity to override Tailwind
-            all_styles = re.sub(r'html\s*,', '.resume-wrapper .resume-content,', all_styles)
-            all_styles = re.sub(r',\s*html\s*{', ', .resume-wrapper .resume-content {', all_styles)
-            all_styles = re.sub(r'body\s*,', '.resume-wrapper .resume-content,', all_styles)
-            all_styles = re.sub(r',\s*body\s*{', ', .resume-wrapper .resume-content {', all_styles)
-            # Handle standalone html and body rules - replace with higher specificity
-            all_styles = re.sub(r'^html\s*{', '.resume-wrapper .resume-content {', all_styles, flags=re.MULTILINE)
-            all_styles = re.sub(r'^body\s*{', '.resume-wrapper .resume-content {', all_styles, flags=re.MULTILINE)
-            # Remove @page rules - they don't work in regular CSS for screen display
-            all_styles = re.sub(r'@page\s*\{[^}]*\}', '', all_styles, flags=re.DOTALL)
-            # Scope ALL class selectors to .resume-wrapper .resume-content for maximum specificity
-            def scope_class_selector_fallback(match):
-                before = match.group(1)
-                class_name = match.group(2)
-                after = match.group(3)
-                
-                # Don't scope if already scoped
-                if '.resume-wrapper .resume-content' in before:
-                    return match.group(0)
-                
-                # Don't scope if inside @media print
-                check_text = before[-200:] if len(before) > 200 else before
-                open_braces = check_text.count('{')
-                close_braces = check_text.count('}')
-                if '@media' in check_text and (open_braces > close_braces):
-                    return match.group(0)
-                
-                # Don't scope if part of compound selector
-                lines = before.split('\n')
-                if lines:
-                    last_line = lines[-1].strip()
-                    if re.search(r'[.#\w-]+\s+$', last_line):
-                        return match.group(0)
-                
-                return f'{before}.resume-wrapper .resume-content {class_name}{after}'
-            
-            all_styles = re.sub(r'([\s,}]*)(\.[a-zA-Z_][a-zA-Z0-9_-]+)(\s*{)', scope_class_selector_fallback, all_styles, flags=re.MULTILINE)
-            # Clean up any double-scoping
-            all_styles = re.sub(r'\.resume-wrapper \.resume-content (\.resume-wrapper \.resume-content )+', '.resume-wrapper .resume-content ', all_styles)
-            
-            # Remove head section but preserve styles
-            html = re.sub(r'<head>.*?</head>', '', html, flags=re.DOTALL | re.IGNORECASE)
-            # Remove title tag if present
-            html = re.sub(r'<title>.*?</title>', '', html, flags=re.DOTALL | re.IGNORECASE)
-            
-            # Try to extract body content - preserve ALL content
-            body_match = re.search(r'<body[^>]*>(.*)</body>', html, re.DOTALL | re.IGNORECASE)
-            if body_match:
-                context['resume_styles'] = all_styles
-                # Return full body content - no truncation
-                return body_match.group(1)
-            
-            # If no body tag, preserve all remaining HTML content
-            # This ensures nothing is lost
-            context['resume_styles'] = all_styles
-            return html.strip()
-        
-        resume_html = extract_body_content(resume_html)
+    # Only the body is rendered per request; the template's scoped styles are served
+    # as a separate cacheable stylesheet built once per template. Sections carry their hashes
+    # so the page can refresh only the sections that changed (see get_preview_html_view).
+    hashes = get_section_hashes(template_name, document)
+    resume_html = render_preview_body(template_name, dict(context, preview_hashes=hashes), request=request)
+    context['preview_css_version'] = get_preview_css(template_name)[1]
     
     context['resume_html'] = resume_html
     
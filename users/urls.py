@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import register_view, login_view, logout_view, employer_onboarding_view, edit_profile_view, admin_login_view, admin_dashboard_view, admin_bug_detail_view
+from .views import register_view, login_view, logout_view, employer_onboarding_view, edit_profile_view, admin_login_view, admin_dashboard_view, admin_bug_detail_view, admin_ai_health_view
 
 app_name = 'users'
 
@@ -13,4 +13,5 @@ urlpatterns = [
     path('admin-login/', admin_login_view, name='admin-login'),
     path('admin-dashboard/', admin_dashboard_view, name='admin-dashboard'),
     path('admin-dashboard/bugs/<int:bug_id>/', admin_bug_detail_view, name='admin-bug-detail'),
+    path('admin-dashboard/ai-health/', admin_ai_health_view, name='admin-ai-health'),
 ]
@@ -4,8 +4,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils import timezone
 from allauth.socialaccount.models import SocialAccount
+from core.ai_cache import get_cache_stats
+from core.circuit_breaker import gemini_breaker
 from .forms import CustomUserCreationForm, EmployerOnboardingForm, UserCredentialsForm, CustomPasswordChangeForm, SetPasswordForm
 from .models import JobSeekerProfile, EmployerProfile
 
@@ -289,11 +292,23 @@ def admin_dashboard_view(request):
         'total_resumes': total_resumes,
         'recent_resumes': recent_resumes,
         'db_status': db_status,
+        'gemini_circuit': gemini_breaker.get_state(),
     }
     
     return render(request, 'users/admin_dashboard.html', context)
 
 
+@staff_member_required
+def admin_ai_health_view(request):
+    """JSON state of the Gemini circuit breaker and response cache counters, for monitoring."""
+    state = gemini_breaker.get_state()
+    # Monitors can alert on the status code alone
+    return JsonResponse(
+        {'gemini': state, 'response_cache': get_cache_stats()},
+        status=503 if state['state'] == 'open' else 200,
+    )
+
+
 @staff_member_required
 def admin_bug_detail_view(request, bug_id):
     """View detailed bug report."""